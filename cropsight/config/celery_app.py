@@ -1,6 +1,9 @@
 import os
 
 from celery import Celery
+from celery.signals import celeryd_after_setup
+from celery.signals import worker_process_init
+from celery.signals import worker_process_shutdown
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
@@ -15,3 +18,40 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
+
+
+_worker_concurrency = None
+
+
+@celeryd_after_setup.connect
+def remember_worker_concurrency(sender, instance, **kwargs):
+    global _worker_concurrency
+    _worker_concurrency = instance.concurrency
+
+
+@worker_process_init.connect
+def configure_torch_threads(**kwargs):
+    """Split the cores across the prefork pool's child processes before they run any inference."""
+    from cropsight.users.thread_policy import apply_thread_policy
+
+    apply_thread_policy(_worker_concurrency or os.cpu_count())
+
+
+@worker_process_init.connect
+def watch_model_manifest(**kwargs):
+    """Hot-swap models in each pool child when the model manifest changes."""
+    from cropsight.users.model_reload import start_manifest_watcher
+
+    start_manifest_watcher()
+
+
+@worker_process_shutdown.connect
+def flush_prediction_records(**kwargs):
+    """Store queued prediction images, records, embeddings and metrics; pool children skip atexit handlers."""
+    from cropsight.users.embedding_index import flush_embeddings
+    from cropsight.users.image_store import flush_image_uploads
+    from cropsight.users.metrics import write_stage_metrics
+
+    flush_image_uploads()
+    flush_embeddings()
+    write_stage_metrics()
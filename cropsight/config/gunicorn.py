@@ -0,0 +1,80 @@
+"""
+Gunicorn configuration for the production image.
+
+The application and every crop model are loaded once in the master process before
+workers are forked, so all workers share the model weights copy-on-write instead of
+each loading a private copy. Adding workers then costs request-handling memory only.
+
+Run with ``gunicorn -c config/gunicorn.py config.wsgi:application``.
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+# Each worker serves requests on a pool of threads, so concurrent predictions for the same
+# crop reach its batcher together and share forward passes.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+# Import config.wsgi (and with it Django) in the master so when_ready can load the models.
+preload_app = True
+# Set GUNICORN_PRELOAD_MODELS=false to have each worker load models lazily on first use.
+preload_models = os.environ.get("GUNICORN_PRELOAD_MODELS", "true").lower() in ("1", "true", "yes")
+# Workers write their prediction metrics to a directory of this server's own unless one is
+# configured, so a scrape answered by any worker covers all of them. Set before Django reads
+# its settings.
+if "PREDICTION_METRICS_DIR" not in os.environ:
+    os.environ["PREDICTION_METRICS_DIR"] = tempfile.mkdtemp(prefix="cropsight-metrics-")
+
+
+def when_ready(server):
+    """Load the prediction models in the master, after the app is imported and before workers fork."""
+    from cropsight.users.metrics import clear_stage_metrics
+
+    # Histograms left by the previous server's workers would be added to the new ones.
+    clear_stage_metrics()
+    if not preload_models:
+        return
+
+    import torch
+
+    from cropsight.users.model_registry import get_model_registry
+
+    # Keep the master single-threaded so no OpenMP thread pool exists when workers are forked;
+    # each worker sizes its own pool in post_fork.
+    torch.set_num_threads(1)
+    loaded = get_model_registry().preload()
+    server.log.info("Preloaded prediction models for %s", ", ".join(loaded) or "no crops")
+
+
+def post_fork(server, worker):
+    """Give each worker its share of the cores for torch, per the TORCH_NUM_THREADS settings."""
+    from cropsight.users.thread_policy import apply_thread_policy
+
+    apply_thread_policy(server.cfg.workers, server.cfg.threads)
+
+
+def post_worker_init(worker):
+    """Warm the models up before the worker accepts connections, so no request reaches a cold worker."""
+    from django.conf import settings
+
+    from cropsight.users.model_reload import start_manifest_watcher
+    from cropsight.users.warmup import warm_up_models
+
+    if settings.PREDICTION_WARMUP:
+        warm_up_models()
+    start_manifest_watcher()
+
+
+def worker_exit(server, worker):
+    """Store the queued prediction images, write out the prediction records, embeddings and metrics before exiting."""
+    from cropsight.users.embedding_index import flush_embeddings
+    from cropsight.users.image_store import flush_image_uploads
+    from cropsight.users.metrics import write_stage_metrics
+
+    flush_image_uploads()
+    flush_embeddings()
+    write_stage_metrics()
@@ -323,6 +323,23 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
 CELERY_TASK_SEND_SENT_EVENT = True
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-routes
+# Predictions run on a dedicated worker pool sized for inference.
+CELERY_TASK_ROUTES = {
+    "cropsight.users.tasks.predict_disease_task": {"queue": "inference"},
+}
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-schedule
+# Installed into the database scheduler when beat starts.
+CELERY_BEAT_SCHEDULE = {
+    "refresh-product-pools": {
+        "task": "cropsight.users.tasks.refresh_product_pools_task",
+        "schedule": 15 * 60,
+    },
+    "compact-embedding-shards": {
+        "task": "cropsight.users.tasks.compact_embedding_shards_task",
+        "schedule": 60 * 60,
+    },
+}
 # django-allauth
 # ------------------------------------------------------------------------------
 ACCOUNT_ALLOW_REGISTRATION = env.bool("DJANGO_ACCOUNT_ALLOW_REGISTRATION", True)
@@ -380,3 +397,144 @@ SPECTACULAR_SETTINGS = {
 }
 # Your stuff...
 # ------------------------------------------------------------------------------
+
+# Prediction models
+# ------------------------------------------------------------------------------
+# Weights and class names for each crop served by the predict endpoints.
+PREDICTION_MODELS = {
+    "potato": {
+        "path": str(BASE_DIR / "Potato_cnn_model_state_dict.pth"),
+        "class_names": ["Early_Blight", "Healthy", "Late_Blight"],
+    },
+    "wheat": {
+        "path": str(BASE_DIR / "Wheat_cnn_model_state_dict.pth"),
+        "class_names": ["Brown_Rust", "Healthy", "Yellow_Rust"],
+    },
+    "cotton": {
+        "path": str(BASE_DIR / "Cotton_cnn_model_state_dict.pth"),
+        "class_names": ["bacterial_blight", "curl_virus", "fussarium_wilt", "healthy"],
+    },
+    # Serves the crop-agnostic predict endpoint. The shipped weights only identify the crop
+    # (classes in ImageFolder, i.e. sorted, order, checked against the served crops when the
+    # model loads), after which that crop's disease model runs. A model trained on
+    # "<crop>/<disease>" classes is served in a single pass instead.
+    "combined": {
+        "path": str(BASE_DIR / "comb_cnn_model_state_dict.pth"),
+        "class_names": ["cotton", "potato", "wheat"],
+        "architecture": "combined",
+    },
+}
+# Number of crop models kept loaded per process; the least recently used one is evicted.
+# A crop-only combined model stays loaded next to the crop model it routes to, so this
+# should cover every crop plus "combined" (the default holds all four); with fewer, mixed
+# traffic keeps evicting and reloading models.
+PREDICTION_MODEL_CACHE_SIZE = env.int("PREDICTION_MODEL_CACHE_SIZE", default=4)
+# Concurrent predictions for the same crop are coalesced into one forward pass of up to
+# PREDICTION_BATCH_MAX_SIZE images, waiting at most PREDICTION_BATCH_MAX_WAIT_MS for
+# requests that are already being preprocessed. A max size of 1 disables batching.
+PREDICTION_BATCH_MAX_SIZE = env.int("PREDICTION_BATCH_MAX_SIZE", default=8)
+PREDICTION_BATCH_MAX_WAIT_MS = env.float("PREDICTION_BATCH_MAX_WAIT_MS", default=10)
+# Crops whose model runs with INT8 static quantization on CPU. Each one is calibrated on
+# the sample images in PREDICTION_CALIBRATION_DIR/<crop>/ and stays fp32 if none are found.
+PREDICTION_QUANTIZED_CROPS = env.list("PREDICTION_QUANTIZED_CROPS", default=[])
+PREDICTION_CALIBRATION_DIR = env("PREDICTION_CALIBRATION_DIR", default=str(BASE_DIR / "calibration"))
+# Inference backend: "eager", "torchscript" or "onnxruntime". Exported artifacts are created
+# next to the weights by `manage.py export_models`; a crop falls back to eager when its
+# artifact is missing. A "backend" key in PREDICTION_MODELS overrides this per crop.
+PREDICTION_BACKEND = env("PREDICTION_BACKEND", default="eager")
+# Seconds a prediction is cached per uploaded image and model version (0 disables the cache).
+PREDICTION_CACHE_TIMEOUT = env.int("PREDICTION_CACHE_TIMEOUT", default=60 * 60 * 24)
+# Largest accepted image upload, in bytes and in pixels (read from the image header before
+# decoding, which guards against decompression bombs).
+PREDICTION_UPLOAD_MAX_BYTES = env.int("PREDICTION_UPLOAD_MAX_BYTES", default=20 * 1024 * 1024)
+PREDICTION_UPLOAD_MAX_PIXELS = env.int("PREDICTION_UPLOAD_MAX_PIXELS", default=50_000_000)
+# Most images accepted by the batch predict endpoint (as files or inside a zip archive),
+# the most bytes a zip archive's images may decompress to in total, and the number of
+# threads decoding them in parallel.
+PREDICTION_BATCH_UPLOAD_MAX_IMAGES = env.int("PREDICTION_BATCH_UPLOAD_MAX_IMAGES", default=100)
+PREDICTION_BATCH_UPLOAD_MAX_BYTES = env.int("PREDICTION_BATCH_UPLOAD_MAX_BYTES", default=200 * 1024 * 1024)
+PREDICTION_DECODE_WORKERS = env.int("PREDICTION_DECODE_WORKERS", default=4)
+# torch threads per gunicorn/Celery worker process. 0 splits the available cores evenly
+# across the worker processes so busy workers don't oversubscribe the CPU.
+TORCH_NUM_THREADS = env.int("TORCH_NUM_THREADS", default=0)
+TORCH_NUM_INTEROP_THREADS = env.int("TORCH_NUM_INTEROP_THREADS", default=1)
+# Uploads are screened on a thumbnail before inference and rejected with the reason when
+# they are too dark or bright (mean 0-255 luminance), blurry (Laplacian variance) or show
+# too small a fraction of leaf-coloured pixels.
+PREDICTION_QUALITY_CHECK = env.bool("PREDICTION_QUALITY_CHECK", default=True)
+PREDICTION_QUALITY_MIN_BRIGHTNESS = env.float("PREDICTION_QUALITY_MIN_BRIGHTNESS", default=30)
+PREDICTION_QUALITY_MAX_BRIGHTNESS = env.float("PREDICTION_QUALITY_MAX_BRIGHTNESS", default=235)
+PREDICTION_QUALITY_MIN_SHARPNESS = env.float("PREDICTION_QUALITY_MIN_SHARPNESS", default=15)
+PREDICTION_QUALITY_MIN_LEAF_COVERAGE = env.float("PREDICTION_QUALITY_MIN_LEAF_COVERAGE", default=0.05)
+# Each gunicorn worker loads every crop model and runs PREDICTION_WARMUP_ITERATIONS dummy
+# predictions per served batch size before accepting requests; /api/users/health/ready/
+# answers 503 until this process is warm.
+PREDICTION_WARMUP = env.bool("PREDICTION_WARMUP", default=True)
+PREDICTION_WARMUP_ITERATIONS = env.int("PREDICTION_WARMUP_ITERATIONS", default=3)
+# How eager models run: "default" (NCHW fp32), "channels_last", "bf16" or
+# "channels_last_bf16" (bfloat16 autocast, only on CPUs with native bf16 support). "auto"
+# times the options available on the host when a model loads and keeps the fastest.
+PREDICTION_EXECUTION_MODE = env("PREDICTION_EXECUTION_MODE", default="auto")
+# Products recommended with a prediction are sampled from a cached pool per disease class,
+# holding up to PRODUCT_POOL_MAX_SIZE products. Pools are rebuilt when products change and
+# every 15 minutes by Celery beat; PRODUCT_POOL_TIMEOUT (seconds) bounds their staleness.
+PRODUCT_POOL_MAX_SIZE = env.int("PRODUCT_POOL_MAX_SIZE", default=200)
+PRODUCT_POOL_TIMEOUT = env.int("PRODUCT_POOL_TIMEOUT", default=60 * 60)
+# Every prediction is stored as a CropPrediction. Rows are queued in memory and inserted by
+# a background thread in batches of up to PREDICTION_LOG_BATCH_SIZE, at least every
+# PREDICTION_LOG_FLUSH_INTERVAL seconds. Once PREDICTION_LOG_QUEUE_SIZE rows are waiting
+# (the database is slow or down) further predictions are served but not recorded.
+PREDICTION_LOG_ENABLED = env.bool("PREDICTION_LOG_ENABLED", default=True)
+PREDICTION_LOG_BATCH_SIZE = env.int("PREDICTION_LOG_BATCH_SIZE", default=200)
+PREDICTION_LOG_FLUSH_INTERVAL = env.float("PREDICTION_LOG_FLUSH_INTERVAL", default=2.0)
+PREDICTION_LOG_QUEUE_SIZE = env.int("PREDICTION_LOG_QUEUE_SIZE", default=10000)
+# Default and largest number of predictions per page of /api/users/predictions/history/.
+PREDICTION_HISTORY_PAGE_SIZE = env.int("PREDICTION_HISTORY_PAGE_SIZE", default=20)
+PREDICTION_HISTORY_MAX_PAGE_SIZE = env.int("PREDICTION_HISTORY_MAX_PAGE_SIZE", default=100)
+# The image of each recorded prediction is stored once per distinct content, named by its
+# SHA-256, with a PREDICTION_THUMBNAIL_SIZE px JPEG thumbnail. Uploads to the media storage
+# run on PREDICTION_IMAGE_UPLOAD_WORKERS background threads per process; images are
+# skipped while more than PREDICTION_IMAGE_UPLOAD_QUEUE_BYTES are waiting.
+PREDICTION_IMAGE_STORE = env.bool("PREDICTION_IMAGE_STORE", default=True)
+PREDICTION_IMAGE_UPLOAD_WORKERS = env.int("PREDICTION_IMAGE_UPLOAD_WORKERS", default=2)
+PREDICTION_IMAGE_UPLOAD_QUEUE_BYTES = env.int("PREDICTION_IMAGE_UPLOAD_QUEUE_BYTES", default=256 * 1024 * 1024)
+PREDICTION_THUMBNAIL_SIZE = env.int("PREDICTION_THUMBNAIL_SIZE", default=256)
+# Optional JSON manifest of versioned models (path, sha256, class_names and version per
+# crop, see cropsight/users/model_manifest.py) overriding PREDICTION_MODELS. Each worker
+# polls it every PREDICTION_MODEL_MANIFEST_POLL_INTERVAL seconds; a changed model is
+# loaded, checked against its checksum and warmed in the background, then swapped in
+# while requests already running finish on the previous one.
+PREDICTION_MODEL_MANIFEST = env("PREDICTION_MODEL_MANIFEST", default="")
+PREDICTION_MODEL_MANIFEST_POLL_INTERVAL = env.float("PREDICTION_MODEL_MANIFEST_POLL_INTERVAL", default=30)
+# Eager models also emit each image's embedding (the 256-d input of their last layer) for
+# the similar-cases endpoint. Embeddings are buffered per process and written as float16
+# NumPy shards under PREDICTION_EMBEDDING_DIR/<crop>/<model version>/ every
+# PREDICTION_EMBEDDING_SHARD_SIZE embeddings or PREDICTION_EMBEDDING_FLUSH_INTERVAL seconds,
+# and compacted hourly by Celery beat. The directory must be shared by the web and inference
+# workers. Each process maps new shards at most every PREDICTION_EMBEDDING_REFRESH_INTERVAL
+# seconds. Once a partition holds PREDICTION_EMBEDDING_IVF_THRESHOLD vectors, the hourly task
+# trains its k-means centroids, and searches then only scan the vectors of the
+# PREDICTION_EMBEDDING_IVF_PROBES nearest clusters instead of all of them.
+PREDICTION_EMBEDDINGS = env.bool("PREDICTION_EMBEDDINGS", default=True)
+PREDICTION_EMBEDDING_DIR = env("PREDICTION_EMBEDDING_DIR", default=str(BASE_DIR / "embeddings"))
+PREDICTION_EMBEDDING_SHARD_SIZE = env.int("PREDICTION_EMBEDDING_SHARD_SIZE", default=1024)
+PREDICTION_EMBEDDING_FLUSH_INTERVAL = env.float("PREDICTION_EMBEDDING_FLUSH_INTERVAL", default=60)
+PREDICTION_EMBEDDING_REFRESH_INTERVAL = env.float("PREDICTION_EMBEDDING_REFRESH_INTERVAL", default=10)
+PREDICTION_EMBEDDING_IVF_THRESHOLD = env.int("PREDICTION_EMBEDDING_IVF_THRESHOLD", default=200_000)
+PREDICTION_EMBEDDING_IVF_PROBES = env.int("PREDICTION_EMBEDDING_IVF_PROBES", default=8)
+PREDICTION_SIMILAR_CASES_LIMIT = env.int("PREDICTION_SIMILAR_CASES_LIMIT", default=10)
+PREDICTION_SIMILAR_CASES_MAX_LIMIT = env.int("PREDICTION_SIMILAR_CASES_MAX_LIMIT", default=50)
+# Grad-CAM overlays of stored predictions are computed on first request and kept in the
+# media storage, scaled to fit PREDICTION_EXPLANATION_SIZE px.
+PREDICTION_EXPLANATION_SIZE = env.int("PREDICTION_EXPLANATION_SIZE", default=512)
+# Each process keeps latency histograms of the prediction stages (upload read, decode,
+# quality check, transform, queue wait, forward, product lookup, serialization) per crop
+# and model version, served to Prometheus at /api/users/metrics/. With PREDICTION_METRICS_DIR,
+# a directory private to this host (cleared when gunicorn starts, and a fresh temporary one
+# under gunicorn by default), the scrape sums the histograms of every worker, each writing
+# its own every PREDICTION_METRICS_WRITE_INTERVAL seconds. A non-empty PREDICTION_METRICS_TOKEN must be
+# sent by the scraper as a bearer token.
+PREDICTION_METRICS = env.bool("PREDICTION_METRICS", default=True)
+PREDICTION_METRICS_DIR = env("PREDICTION_METRICS_DIR", default="")
+PREDICTION_METRICS_WRITE_INTERVAL = env.float("PREDICTION_METRICS_WRITE_INTERVAL", default=5)
+PREDICTION_METRICS_TOKEN = env("PREDICTION_METRICS_TOKEN", default="")
@@ -34,5 +34,11 @@ TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore[index]
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#media-url
 MEDIA_URL = "http://media.testserver"
+
+# PREDICTIONS
+# ------------------------------------------------------------------------------
+# Keep the background prediction writer out of tests that don't use the database.
+PREDICTION_LOG_ENABLED = False
+PREDICTION_EMBEDDINGS = False
 # Your stuff...
 # ------------------------------------------------------------------------------
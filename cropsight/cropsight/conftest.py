@@ -1,5 +1,14 @@
 import pytest
 
+from cropsight.users import combined_prediction
+from cropsight.users import explanations
+from cropsight.users import model_registry
+from cropsight.users import model_reload
+from cropsight.users import tasks
+from cropsight.users import user_service
+from cropsight.users import warmup
+from cropsight.users.dtos.response.response_dataclass import PredictionResponseData
+from cropsight.users.metrics import observe_stages
 from cropsight.users.models import User
 from cropsight.users.tests.factories import UserFactory
 
@@ -12,3 +21,98 @@ def _media_storage(settings, tmpdir) -> None:
 @pytest.fixture
 def user(db) -> User:
     return UserFactory()
+
+
+class FakePredictionService:
+    """Stands in for PredictionService without loading a model.
+
+    Every image is classified as ``label``, a disease or "<crop>/<disease>" like the joint
+    combined model, with ``confidence``. The images read and calls made are recorded.
+    """
+
+    def __init__(self, model_path="model.pth", class_names=("Healthy",), label="Healthy", confidence=99.0,
+                 model_version=None, version=None, crop=None, **kwargs):
+        self.model_path = model_path
+        self.class_names = list(class_names)
+        self.label = label
+        self.confidence = confidence
+        # Distinct per crop, as the result cache keys on it.
+        self.model_version = model_version or f"{crop or 'model'}-v1"
+        self.version = version
+        self.crop = crop
+        self.images = []
+        self.classifications = 0
+        self.forward_batch_sizes = []
+        self.shared = False
+        self.closed = False
+
+    @property
+    def predictions(self):
+        return len(self.images)
+
+    def classify(self, image_file):
+        self.classifications += 1
+        return self.label, self.confidence
+
+    def predict(self, image_file):
+        self.images.append(image_file.read())
+        image_file.seek(0)
+        observe_stages({"forward": 0.001}, self.crop, self.model_version)
+        return self.build_response(self.label, self.confidence)
+
+    def build_response(self, predicted_class, confidence):
+        crop, _, disease = predicted_class.rpartition("/")
+        return PredictionResponseData.generate_response(
+            disease, confidence, crop=crop or None, model_version=self.model_version,
+        )
+
+    def _request_forward(self, batch):
+        self.forward_batch_sizes.append(batch.shape[0])
+
+    def share_memory(self):
+        self.shared = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeModelRegistry:
+    """Serves the services added to it by crop; an exception added as a service is raised by get()."""
+
+    def __init__(self):
+        self.services = {}
+
+    def add(self, crop, service=None, **kwargs):
+        self.services[crop] = service if service is not None else FakePredictionService(crop=crop, **kwargs)
+        return self.services[crop]
+
+    def crops(self):
+        return list(self.services)
+
+    def get(self, crop):
+        service = self.services[crop]
+        if isinstance(service, Exception):
+            raise service
+        return service
+
+
+@pytest.fixture
+def fake_registry(monkeypatch):
+    """Replace get_model_registry() everywhere with a FakeModelRegistry; tests add the services they need."""
+    registry = FakeModelRegistry()
+    for module in (combined_prediction, explanations, model_reload, tasks, user_service, warmup):
+        monkeypatch.setattr(module, "get_model_registry", lambda: registry)
+    return registry
+
+
+@pytest.fixture
+def loaded_models(monkeypatch):
+    """Have ModelRegistry build FakePredictionServices instead of loading models; returns those it built."""
+    built = []
+
+    def build(*args, **kwargs):
+        built.append(FakePredictionService(*args, **kwargs))
+        return built[-1]
+
+    monkeypatch.setattr(model_registry, "PredictionService", build)
+    return built
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import AddToCartApiView, CartApiView, ClearCartApiView, CottonPredictionApiView, HomeApiView, LoginView, PotatoPredictionApiView, ProductListApiView, ProductdetailApiView, RemoveFromCartApiView, UpdateProfileView, VerifyOTPView, UserProfileView, WheatPredictionApiView
+from .views import AddToCartApiView, BatchPredictionApiView, CartApiView, ClearCartApiView, CombinedPredictionApiView, CottonPredictionApiView, HomeApiView, LoginView, PotatoPredictionApiView, PredictionExplanationApiView, PredictionMetricsApiView, PredictionHistoryApiView, PredictionJobApiView, ProductListApiView, ProductdetailApiView, ReadinessApiView, RemoveFromCartApiView, SimilarCasesApiView, ThreadDiagnosticsApiView, UpdateProfileView, VerifyOTPView, UserProfileView, WheatPredictionApiView
 
 urlpatterns = [
     path('auth/login/', LoginView.as_view(), name='login'),
@@ -9,6 +9,15 @@ urlpatterns = [
     path('potato/predict/', PotatoPredictionApiView.as_view(), name='predict'),
     path('cotton/predict/', CottonPredictionApiView.as_view(), name='predict'),
     path('wheat/predict/', WheatPredictionApiView.as_view(), name='predict'),
+    path('predict/', CombinedPredictionApiView.as_view(), name='predict'),
+    path('<str:crop>/predict/batch/', BatchPredictionApiView.as_view(), name='predict-batch'),
+    path('predict/jobs/<str:job_id>/', PredictionJobApiView.as_view(), name='prediction-job'),
+    path('predictions/history/', PredictionHistoryApiView.as_view(), name='prediction-history'),
+    path('predictions/<int:prediction_id>/similar/', SimilarCasesApiView.as_view(), name='similar-cases'),
+    path('predictions/<int:prediction_id>/explanation/', PredictionExplanationApiView.as_view(), name='prediction-explanation'),
+    path('diagnostics/threads/', ThreadDiagnosticsApiView.as_view(), name='thread-diagnostics'),
+    path('health/ready/', ReadinessApiView.as_view(), name='readiness'),
+    path('metrics/', PredictionMetricsApiView.as_view(), name='prediction-metrics'),
     path('home/', HomeApiView.as_view(), name='home'),
     path('products/list/', ProductListApiView.as_view(), name='product-list'),
     path('products/details/', ProductdetailApiView.as_view(), name='add-to-cart'),
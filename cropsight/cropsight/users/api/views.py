@@ -3,18 +3,32 @@ from rest_framework.decorators import action
 from rest_framework.mixins import ListModelMixin
 from rest_framework.mixins import RetrieveModelMixin
 from rest_framework.mixins import UpdateModelMixin
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.views import APIView
 from rest_framework import status
 from django.conf import settings
-from ..dtos.response.response_dataclass import UserProfileData, OTPData
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from ..dtos.response.response_dataclass import PlotVerdictData, UserProfileData, OTPData
 from ..dtos.response.cs_response import CSResponse
 from ..dtos.request.request_dataclass import UserUpdateData
 from ..user_service import UserService
+from ..combined_prediction import COMBINED_MODEL
+from ..metrics import export_stage_metrics, observe_stage
+from ..thread_policy import get_thread_config
+from ..upload_handlers import add_image_upload_handler
+from ..warmup import ensure_warmup_started, get_readiness
 # from ..services.ml_service import MLService
-from ..exceptions import EmailAlreadyExistsError, InvalidDateFormatError, InvalidPhoneNumberError, OTPValidationError, UserNotFoundError, ImageProcessingError
+from ..exceptions import EmailAlreadyExistsError, InvalidCursorError, InvalidDateFormatError, InvalidPhoneNumberError, OTPValidationError, ExplanationUnavailableError, ImageUploadError, PredictionNotFoundError, UserNotFoundError, ImageProcessingError
+from dataclasses import asdict
 from datetime import datetime
+import json
+import time
 from typing import Tuple
 
 from cropsight.users.models import User
@@ -151,51 +165,180 @@ class UpdateProfileView(APIView):
         
 
 
-class PotatoPredictionApiView(APIView):
-    authentication_classes = []
+class ImageUploadMixin:
+    """Validate uploaded images while they stream in, before Django buffers all of them.
+
+    The body may first be parsed outside the view method, e.g. by the CSRF check of session
+    authentication, so rejected uploads are turned into 400 responses here.
+    """
+
+    def upload_limits(self):
+        return {}
+
+    def initial(self, request, *args, **kwargs):
+        add_image_upload_handler(request, **self.upload_limits())
+        super().initial(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ImageUploadError):
+            return CSResponse.send_response(success=False, error=str(exc), status=status.HTTP_400_BAD_REQUEST)
+        return super().handle_exception(exc)
+
+
+# Predictions hold no database locks worth a transaction, so don't keep one open during inference.
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class CropPredictionApiView(ImageUploadMixin, APIView):
+    # Signing in is optional; authenticated predictions are recorded against the user.
     permission_classes = []
+    crop = None
 
     def __init__(self):
         self.user_service = UserService()
 
-
     def post(self, request):
         try:
-            prediction_result = self.user_service.predict_disease(request, 'potato')
-            return CSResponse.send_response(success=True, data=prediction_result, message='Prediction successful', status=status.HTTP_200_OK)
+            if request.query_params.get('async', '').lower() in ('1', 'true'):
+                job = self.user_service.enqueue_prediction(request, self.crop)
+                return CSResponse.send_response(success=True, data=job, message='Prediction queued', status=status.HTTP_202_ACCEPTED)
+            prediction_result, cache_hit = self.user_service.predict_disease(request, self.crop)
+            start = time.perf_counter()
+            response = CSResponse.send_response(success=True, data=prediction_result, message='Prediction successful', status=status.HTTP_200_OK)
+            observe_stage('serialization', time.perf_counter() - start, self.crop, prediction_result.model_version)
+            response['X-Prediction-Cache'] = 'HIT' if cache_hit else 'MISS'
+            return response
         except Exception as e:
             return CSResponse.send_response(success=False, error=str(e), status=status.HTTP_400_BAD_REQUEST)
 
-class CottonPredictionApiView(APIView):
-    authentication_classes = []
+class PotatoPredictionApiView(CropPredictionApiView):
+    crop = 'potato'
+
+class CottonPredictionApiView(CropPredictionApiView):
+    crop = 'cotton'
+
+class WheatPredictionApiView(CropPredictionApiView):
+    crop = 'wheat'
+
+class CombinedPredictionApiView(CropPredictionApiView):
+    """Predict crop and disease for an image of any supported crop."""
+    crop = COMBINED_MODEL
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class BatchPredictionApiView(ImageUploadMixin, APIView):
+    """Predict many images of one plot, streaming one JSON line per image and a final plot verdict."""
     permission_classes = []
 
     def __init__(self):
         self.user_service = UserService()
 
+    def upload_limits(self):
+        return {'max_files': settings.PREDICTION_BATCH_UPLOAD_MAX_IMAGES, 'archive_fields': ('archive',)}
 
-    def post(self, request):
+    def post(self, request, crop):
         try:
-            prediction_result = self.user_service.predict_disease(request, 'cotton')
-            return CSResponse.send_response(success=True, data=prediction_result, message='Prediction successful', status=status.HTTP_200_OK)
-        
+            items = self.user_service.predict_batch(request, crop)
         except Exception as e:
             return CSResponse.send_response(success=False, error=str(e), status=status.HTTP_400_BAD_REQUEST)
-    
-class WheatPredictionApiView(APIView):
-    authentication_classes = []
+        lines = (
+            json.dumps({'summary' if isinstance(item, PlotVerdictData) else 'image': asdict(item)}, cls=DjangoJSONEncoder) + '\n'
+            for item in items
+        )
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+class PredictionJobApiView(APIView):
+    # Anonymous jobs can be polled without signing in; a user's jobs only by that user.
     permission_classes = []
 
     def __init__(self):
         self.user_service = UserService()
 
+    def get(self, request, job_id):
+        try:
+            job = self.user_service.get_prediction_job(request, job_id)
+        except PredictionNotFoundError as e:
+            return CSResponse.send_response(success=False, error=str(e), status=status.HTTP_404_NOT_FOUND)
+        return CSResponse.send_response(success=job.error is None, data=job, error=job.error, message='Prediction job fetched', status=status.HTTP_200_OK)
 
-    def post(self, request):
+class PredictionHistoryApiView(APIView):
+    """The signed-in user's predictions, newest first; pass ``next_cursor`` back as ``cursor`` for the next page."""
+
+    def __init__(self):
+        self.user_service = UserService()
+
+    def get(self, request):
         try:
-            prediction_result = self.user_service.predict_disease(request, 'wheat')
-            return CSResponse.send_response(success=True, data=prediction_result, message='Prediction successful', status=status.HTTP_200_OK)
-        except Exception as e:
+            history = self.user_service.get_prediction_history(request)
+        except (InvalidCursorError, ValueError) as e:
+            return CSResponse.send_response(success=False, error=str(e), status=status.HTTP_400_BAD_REQUEST)
+        return CSResponse.send_response(success=True, data=history, message='Prediction history fetched', status=status.HTTP_200_OK)
+
+class SimilarCasesApiView(APIView):
+    """Past predictions of the same crop whose images look most like one of the signed-in user's predictions."""
+
+    def __init__(self):
+        self.user_service = UserService()
+
+    def get(self, request, prediction_id):
+        try:
+            cases = self.user_service.get_similar_cases(request, prediction_id)
+        except PredictionNotFoundError as e:
+            return CSResponse.send_response(success=False, error=str(e), status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
             return CSResponse.send_response(success=False, error=str(e), status=status.HTTP_400_BAD_REQUEST)
+        return CSResponse.send_response(success=True, data=cases, message='Similar cases fetched', status=status.HTTP_200_OK)
+
+class PredictionExplanationApiView(APIView):
+    """Grad-CAM overlay showing which parts of the image drove one of the signed-in user's predictions.
+
+    Computed on the first request for a prediction and served from the media storage afterwards.
+    """
+
+    def __init__(self):
+        self.user_service = UserService()
+
+    def get(self, request, prediction_id):
+        try:
+            explanation = self.user_service.get_prediction_explanation(request, prediction_id)
+        except PredictionNotFoundError as e:
+            return CSResponse.send_response(success=False, error=str(e), status=status.HTTP_404_NOT_FOUND)
+        except ExplanationUnavailableError as e:
+            return CSResponse.send_response(success=False, error=str(e), status=status.HTTP_409_CONFLICT)
+        return CSResponse.send_response(success=True, data=explanation, message='Prediction explanation fetched', status=status.HTTP_200_OK)
+
+class ThreadDiagnosticsApiView(APIView):
+    """Report the torch thread configuration of the worker process serving the request."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return CSResponse.send_response(success=True, data=get_thread_config(), message='Thread configuration fetched', status=status.HTTP_200_OK)
+
+# Scrapes never touch the database.
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class PredictionMetricsApiView(APIView):
+    """Prometheus scrape target for the per-stage prediction latency histograms of all workers.
+
+    Open like the readiness probe unless PREDICTION_METRICS_TOKEN is set, in which case the
+    scraper must send it as a bearer token.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        token = settings.PREDICTION_METRICS_TOKEN
+        if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(export_stage_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class ReadinessApiView(APIView):
+    """Load balancer readiness probe: 503 until this worker has loaded and warmed its models."""
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        ensure_warmup_started()
+        readiness = get_readiness()
+        if readiness.ready:
+            return CSResponse.send_response(success=True, data=readiness, message='Ready', status=status.HTTP_200_OK)
+        return CSResponse.send_response(success=False, data=readiness, error='Warming up models', status=status.HTTP_503_SERVICE_UNAVAILABLE)
     
 
 class HomeApiView(APIView):
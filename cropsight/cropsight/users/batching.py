@@ -0,0 +1,132 @@
+import contextlib
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Queued by close() to stop the collector.
+_STOP = object()
+
+
+class BatchingEngine:
+    """Coalesce concurrent single-image requests for one model into batched forward passes.
+
+    Callers wrap their whole request in ``track()`` so the collector knows more images are
+    on their way; a lone request is run immediately instead of waiting for ``max_wait_ms``.
+    """
+
+    def __init__(self, forward, max_batch_size=8, max_wait_ms=10):
+        self.forward = forward
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._worker = None
+        self._worker_pid = None
+        self._closed = False
+
+    @contextlib.contextmanager
+    def track(self):
+        """Mark a request as in flight for the duration of the block."""
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def submit(self, batch, timings=None):
+        """Queue a (1, C, H, W) tensor and block until its row of the batched output is ready.
+
+        Pass a ``timings`` dict to have the time spent queued and in the forward pass stored
+        under "queue_wait" and "forward".
+        """
+        self._ensure_worker()
+        future = Future()
+        timings = {} if timings is None else timings
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._queue.put((batch, future, timings, time.perf_counter()))
+        if closed:
+            start = time.perf_counter()
+            output = self.forward(batch)
+            timings["forward"] = time.perf_counter() - start
+            return output
+        return future.result()
+
+    def close(self):
+        """Stop the collector once the queued requests are served; later submits run unbatched."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so the collector is started lazily per process.
+        if self._closed or self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._closed:
+                return
+            if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name="prediction-batcher", daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def _more_expected(self, collected):
+        with self._lock:
+            return self._in_flight > collected
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._more_expected(len(batch)):
+                        break
+                    try:
+                        item = self._queue.get(timeout=min(remaining, 0.001))
+                    except queue.Empty:
+                        continue
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._process(batch)
+
+    def _process(self, batch):
+        futures = [future for _, future, _, _ in batch]
+        start = time.perf_counter()
+        try:
+            outputs = self.forward(torch.cat([tensor for tensor, _, _, _ in batch]))
+        except Exception as e:
+            logger.exception("Batched forward pass of %d images failed", len(batch))
+            for future in futures:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - start
+        # Written before the results are set, so each caller sees its timings.
+        for _, _, timings, queued in batch:
+            timings["queue_wait"] = start - queued
+            timings["forward"] = elapsed
+        for index, future in enumerate(futures):
+            future.set_result(outputs[index:index + 1])
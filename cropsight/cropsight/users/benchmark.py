@@ -0,0 +1,142 @@
+import io
+import os
+import platform
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+from .execution import run_model
+from .image_quality import check_image_quality
+
+# Stages timed per image (decode, quality, transform) and per batch (forward, softmax, products).
+STAGES = ("decode", "quality", "transform", "forward", "softmax", "products")
+# Phone photos are around 12 MP; a smaller default keeps offline runs quick while still
+# exercising the reduced-size JPEG decode.
+SYNTHETIC_IMAGE_SIZE = (1600, 1200)
+
+
+def synthetic_images(count, size=SYNTHETIC_IMAGE_SIZE, seed=0):
+    """Return ``count`` JPEG-encoded, leaf-coloured noise images that pass the quality check."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    images = []
+    for _ in range(count):
+        pixels = np.empty((height, width, 3), dtype=np.float32)
+        pixels[...] = rng.uniform((40, 110, 20), (90, 170, 60))
+        pixels += rng.normal(0, 25, pixels.shape)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def summarize(seconds):
+    """Summarize a list of durations in milliseconds."""
+    ordered = sorted(seconds)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+    }
+
+
+def _run_batch(service, chunk, stage_times, include_products):
+    tensors = []
+    for data in chunk:
+        start = time.perf_counter()
+        image = service._decode_image(io.BytesIO(data))  # noqa: SLF001
+        decoded = time.perf_counter()
+        if service.check_quality:
+            check_image_quality(image)
+        checked = time.perf_counter()
+        tensors.append(service.transform(image).unsqueeze(0))
+        stage_times["decode"].append(decoded - start)
+        stage_times["quality"].append(checked - decoded)
+        stage_times["transform"].append(time.perf_counter() - checked)
+
+    start = time.perf_counter()
+    with torch.inference_mode():
+        logits = run_model(service.model, torch.cat(tensors).to(service.device), service.execution_mode)
+    forwarded = time.perf_counter()
+    probs = F.softmax(logits, dim=1)
+    _, predicted = probs.max(1)
+    stage_times["forward"].append(forwarded - start)
+    stage_times["softmax"].append(time.perf_counter() - forwarded)
+
+    if include_products:
+        start = time.perf_counter()
+        for class_index in predicted.tolist():
+            # Full confidence so the response is always built, as for an accepted prediction.
+            service.build_response(service.class_names[class_index], 100.0)
+        stage_times["products"].append(time.perf_counter() - start)
+
+
+def benchmark_service(service, images, batch_size=1, runs=3, include_products=True):
+    """Time each prediction stage of a PredictionService over the given encoded images.
+
+    One untimed batch runs first so one-off allocation and kernel selection aren't counted.
+    """
+    _run_batch(service, images[:batch_size], defaultdict(list), include_products)
+    stage_times = defaultdict(list)
+    batch_times = []
+    started = time.perf_counter()
+    for _ in range(runs):
+        for index in range(0, len(images), batch_size):
+            start = time.perf_counter()
+            _run_batch(service, images[index:index + batch_size], stage_times, include_products)
+            batch_times.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    return {
+        "batch_size": batch_size,
+        "images": len(images) * runs,
+        "throughput_per_s": len(images) * runs / elapsed,
+        "batch_latency": summarize(batch_times),
+        "stages": {stage: summarize(stage_times[stage]) for stage in STAGES if stage_times[stage]},
+    }
+
+
+def environment_info():
+    """Describe the machine and library versions a benchmark ran with."""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def result_key(result):
+    execution_mode = result.get("execution_mode", "default")
+    return (result["crop"], result["backend"], execution_mode, result["threads"], result["batch_size"])
+
+
+def compare_results(baseline, current, tolerance=0.1):
+    """Return the configurations whose median batch latency grew by more than ``tolerance`` over the baseline."""
+    baseline_results = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = baseline_results.get(result_key(result))
+        if previous is None:
+            continue
+        before = previous["batch_latency"]["p50_ms"]
+        after = result["batch_latency"]["p50_ms"]
+        if after > before * (1 + tolerance):
+            regressions.append({
+                "crop": result["crop"],
+                "backend": result["backend"],
+                "execution_mode": result.get("execution_mode", "default"),
+                "threads": result["threads"],
+                "batch_size": result["batch_size"],
+                "baseline_p50_ms": before,
+                "p50_ms": after,
+                "change": after / before - 1,
+            })
+    return regressions
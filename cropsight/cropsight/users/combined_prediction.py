@@ -0,0 +1,35 @@
+from dataclasses import replace
+
+from .exceptions import UndefinedDiseaseError
+from .model_registry import get_model_registry
+from .prediction_cache import PredictionResultCache
+from .prediction_cache import predict_with_cache
+
+COMBINED_MODEL = "combined"
+CROP_CONFIDENCE_THRESHOLD = 75
+
+
+def predict_any_crop(image_file, image_digest=None):
+    """Predict the crop and its disease for an image of any supported crop.
+
+    A combined model whose classes are "<crop>/<disease>" answers in one forward pass.
+    A crop-only combined model identifies the crop first, then that crop's disease
+    model runs. Returns the result and whether the disease prediction was cached.
+    """
+    registry = get_model_registry()
+    combined = registry.get(COMBINED_MODEL)
+    if all("/" in class_name for class_name in combined.class_names):
+        return predict_with_cache(combined, image_file, image_digest=image_digest)
+
+    result_cache = PredictionResultCache()
+    image_digest = image_digest or result_cache.image_digest(image_file)
+    crop_key = result_cache.make_key(image_digest, combined.model_version)
+    crop = result_cache.get(crop_key)
+    if crop is None:
+        crop, confidence = combined.classify(image_file)
+        if confidence < CROP_CONFIDENCE_THRESHOLD:
+            raise UndefinedDiseaseError("Cannot identify the crop, please upload a clear image")
+        result_cache.set(crop_key, crop)
+
+    result, cache_hit = predict_with_cache(registry.get(crop.lower()), image_file, result_cache, image_digest)
+    return replace(result, crop=crop.lower()), cache_hit
@@ -109,11 +109,126 @@ class PredictionResponseData:
     confidence: float
     additional_info: Optional[dict] = None
     products : list[ProductData] = None
+    crop: Optional[str] = None
+    model_version: Optional[str] = None
 
-    def generate_response(disease_class, confidence, additional_info=None, products=None):
+    def generate_response(disease_class, confidence, additional_info=None, products=None, crop=None, model_version=None):
         return PredictionResponseData(
             disease_class=disease_class,
             confidence=confidence,
             additional_info=additional_info,
-            products=[ProductData.generate_response(product) for product in products] if products else None
-        )
\ No newline at end of file
+            products=list(products) if products else None,
+            crop=crop,
+            model_version=model_version
+        )
+
+
+@dataclass
+class PredictionJobData:
+    job_id: str
+    status: str
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+
+
+@dataclass
+class BatchPredictionItemData:
+    index: int
+    name: str
+    disease_class: Optional[str] = None
+    confidence: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class PlotVerdictData:
+    total_images: int
+    classified_images: int
+    class_counts: dict
+    verdict: Optional[PredictionResponseData] = None
+
+
+@dataclass
+class ThreadConfigData:
+    pid: int
+    cores: int
+    workers: Optional[int]
+    policy_applied: bool
+    num_threads: int
+    num_interop_threads: int
+    configured_num_threads: Optional[int] = None
+    configured_num_interop_threads: Optional[int] = None
+    omp_num_threads: Optional[str] = None
+    mkl_num_threads: Optional[str] = None
+
+
+@dataclass
+class ReadinessData:
+    ready: bool
+    warmed_models: list
+    warmup_seconds: Optional[float] = None
+
+
+@dataclass
+class PredictionHistoryItemData:
+    id: int
+    crop: str
+    disease_class: str
+    confidence: float
+    predicted_at: datetime
+    thumbnail_url: Optional[str] = None
+
+    def generate_response(prediction):
+        return PredictionHistoryItemData(
+            id=prediction.id,
+            crop=prediction.predicted_crop,
+            disease_class=prediction.disease_class,
+            confidence=float(prediction.confidence),
+            predicted_at=prediction.predicted_at,
+            thumbnail_url=prediction.thumbnail.url if prediction.thumbnail else None,
+        )
+
+
+@dataclass
+class PredictionHistoryPageData:
+    results: list[PredictionHistoryItemData]
+    next_cursor: Optional[str] = None
+
+
+@dataclass
+class SimilarCaseData:
+    id: int
+    crop: str
+    disease_class: str
+    confidence: float
+    predicted_at: datetime
+    similarity: float
+    thumbnail_url: Optional[str] = None
+
+    def generate_response(prediction, similarity):
+        return SimilarCaseData(
+            id=prediction.id,
+            crop=prediction.predicted_crop,
+            disease_class=prediction.disease_class,
+            confidence=float(prediction.confidence),
+            predicted_at=prediction.predicted_at,
+            similarity=round(similarity, 4),
+            thumbnail_url=prediction.thumbnail.url if prediction.thumbnail else None,
+        )
+
+
+@dataclass
+class PredictionExplanationData:
+    id: int
+    crop: str
+    disease_class: str
+    explanation_url: str
+
+    def generate_response(prediction, explanation_url):
+        return PredictionExplanationData(
+            id=prediction.id,
+            crop=prediction.predicted_crop,
+            disease_class=prediction.disease_class,
+            explanation_url=explanation_url,
+        )
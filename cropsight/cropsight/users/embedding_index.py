@@ -0,0 +1,361 @@
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Shards are keyed by the SHA-256 hex digest of the image.
+KEY_DTYPE = "S64"
+# Rows converted to float32 at a time while scanning a shard.
+SEARCH_CHUNK_ROWS = 16384
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 32768
+CENTROIDS_FILE = "centroids.npy"
+
+
+def partition_dir(crop, model_version, root=None):
+    """Return the shard directory of a crop and model version; embeddings of different models don't compare."""
+    root = Path(root or settings.PREDICTION_EMBEDDING_DIR)
+    return root / re.sub(r"[^\w.-]", "_", crop) / re.sub(r"[^\w.-]", "_", model_version)
+
+
+def normalize(vectors):
+    """Scale each row to unit length, so dot products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def shard_stems(directory):
+    return sorted(path.name[:-len(".vectors.npy")] for path in Path(directory).glob("*.vectors.npy"))
+
+
+def write_shard(directory, keys, vectors, centroids=None):
+    """Write keys and normalized float16 vectors as one shard, each file renamed into place when complete.
+
+    With the partition's ``centroids``, the nearest centroid of each vector is stored too,
+    so readers don't have to assign them. Vectors are written last, so a reader that finds
+    a shard's vectors also finds the rest.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = f"{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    vectors = normalize(vectors).astype(np.float16)
+    arrays = [("keys", np.asarray(keys, dtype=KEY_DTYPE))]
+    if centroids is not None:
+        arrays.append(("lists", _assign(vectors, centroids)))
+    arrays.append(("vectors", vectors))
+    for suffix, array in arrays:
+        temporary = directory / f".{stem}.{suffix}.npy.tmp"
+        with open(temporary, "wb") as f:
+            np.save(f, array)
+        os.replace(temporary, directory / f"{stem}.{suffix}.npy")
+    return stem
+
+
+def read_shard(directory, stem):
+    """Memory-map a shard's keys and vectors, and its centroid assignments or None, without reading them in.
+
+    Every process mapping a shard shares the same page cache, and files compacted away stay
+    readable through existing mappings.
+    """
+    directory = Path(directory)
+    lists_path = directory / f"{stem}.lists.npy"
+    return (
+        np.load(directory / f"{stem}.keys.npy", mmap_mode="r"),
+        np.load(directory / f"{stem}.vectors.npy", mmap_mode="r"),
+        np.load(lists_path, mmap_mode="r") if lists_path.exists() else None,
+    )
+
+
+def read_centroids(directory):
+    """Return a partition's trained centroids, or None until train_partition has run."""
+    try:
+        return np.load(Path(directory) / CENTROIDS_FILE)
+    except FileNotFoundError:
+        return None
+
+
+def compact_partition(directory):
+    """Merge a partition's shards into one, keeping the latest vector of each key; returns the merged count.
+
+    A lone shard is rewritten too when it lacks the centroid assignments of a trained partition.
+    """
+    directory = Path(directory)
+    stems = shard_stems(directory)
+    centroids = read_centroids(directory)
+    missing_lists = centroids is not None and any(not (directory / f"{stem}.lists.npy").exists() for stem in stems)
+    if len(stems) < 2 and not missing_lists:  # noqa: PLR2004
+        return 0
+    latest = {}
+    for stem in stems:
+        keys, vectors, _ = read_shard(directory, stem)
+        latest.update(zip(keys.tolist(), vectors))
+    write_shard(directory, list(latest), np.stack(list(latest.values())), centroids)
+    for stem in stems:
+        for suffix in ("vectors", "lists", "keys"):
+            (directory / f"{stem}.{suffix}.npy").unlink(missing_ok=True)
+    return len(stems)
+
+
+def _assign(vectors, centroids):
+    """Return the index of the most similar centroid for each row."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SEARCH_CHUNK_ROWS):
+        chunk = vectors[start:start + SEARCH_CHUNK_ROWS].astype(np.float32)
+        assignments[start:start + len(chunk)] = (chunk @ centroids.T).argmax(axis=1)
+    return assignments
+
+
+def train_centroids(vectors, n_clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means over (a sample of) normalized vectors, returning unit-length float32 centroids."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > KMEANS_SAMPLE_SIZE:
+        vectors = vectors[rng.choice(len(vectors), KMEANS_SAMPLE_SIZE, replace=False)]
+    vectors = vectors.astype(np.float32)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)]
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # An empty cluster keeps its previous centroid.
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return centroids
+
+
+def train_partition(directory, min_vectors):
+    """Train and store a partition's centroids once it holds ``min_vectors`` vectors; returns whether it did.
+
+    Centroids are trained once per partition, off the request path, on about sqrt(n)
+    clusters, then the shards are rewritten with their vectors' assignments.
+    """
+    directory = Path(directory)
+    if read_centroids(directory) is not None:
+        return False
+    shards = [read_shard(directory, stem) for stem in shard_stems(directory)]
+    offsets = np.cumsum([0, *(len(keys) for keys, _, _ in shards)])
+    if offsets[-1] < max(min_vectors, 1):
+        return False
+    # Only the sampled rows of the mapped shards are read in.
+    rng = np.random.default_rng(0)
+    rows = np.sort(rng.choice(offsets[-1], min(offsets[-1], KMEANS_SAMPLE_SIZE), replace=False))
+    sample = np.concatenate([
+        vectors[rows[(rows >= start) & (rows < end)] - start]
+        for (_, vectors, _), start, end in zip(shards, offsets[:-1], offsets[1:])
+    ])
+    centroids = train_centroids(sample, n_clusters=int(np.sqrt(offsets[-1])))
+    temporary = directory / f".{CENTROIDS_FILE}.tmp"
+    with open(temporary, "wb") as f:
+        np.save(f, centroids)
+    os.replace(temporary, directory / CENTROIDS_FILE)
+    compact_partition(directory)
+    return True
+
+
+class EmbeddingIndex:
+    """Nearest-neighbour search over the embedding shards of one crop and model version.
+
+    Shards are memory-mapped as written, float16 and unit-length, and scanned in chunks
+    converted to float32, so a search is a few matrix-vector products. Once the partition's
+    centroids are trained (see train_partition), only the vectors of the ``probes``
+    centroids closest to the query are scanned.
+    """
+
+    def __init__(self, directory, probes=8):
+        self.directory = Path(directory)
+        self.probes = probes
+        self._stems = []
+        # One (keys, vectors, centroid assignments or None) entry per loaded shard.
+        self._shards = []
+        self.centroids = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(keys) for keys, _, _ in self._shards)
+
+    def refresh(self):
+        """Map shards written since the last refresh, or all of them again after compaction or training."""
+        stems = shard_stems(self.directory)
+        centroids = self.centroids if self.centroids is not None else read_centroids(self.directory)
+        with self._lock:
+            if stems == self._stems and centroids is self.centroids:
+                return
+            if stems[:len(self._stems)] != self._stems or centroids is not self.centroids:
+                self._stems, self._shards, self.centroids = [], [], centroids
+            for stem in stems[len(self._stems):]:
+                try:
+                    keys, vectors, assignments = read_shard(self.directory, stem)
+                except FileNotFoundError:
+                    # Compacted away meanwhile; the next refresh reloads.
+                    break
+                if assignments is None and self.centroids is not None:
+                    # Written before the centroids existed; compaction stores its assignments.
+                    assignments = _assign(vectors, self.centroids)
+                self._shards.append((keys, vectors, assignments))
+                self._stems.append(stem)
+
+    def vector(self, key):
+        """Return the latest stored vector of a key as float32, or None."""
+        key = key.encode() if isinstance(key, str) else key
+        with self._lock:
+            shards = list(self._shards)
+        for keys, vectors, _ in reversed(shards):
+            rows = np.flatnonzero(keys == key)
+            if len(rows):
+                return vectors[rows[-1]].astype(np.float32)
+        return None
+
+    def search(self, query, k=10):
+        """Return up to ``k`` (key, cosine similarity) pairs for distinct keys, most similar first."""
+        query = normalize(query)
+        with self._lock:
+            shards, centroids = list(self._shards), self.centroids
+        probed = np.argsort(centroids @ query)[-self.probes:] if centroids is not None else None
+        candidate_keys, candidate_scores = [], []
+        for keys, vectors, assignments in shards:
+            rows = np.flatnonzero(np.isin(assignments, probed)) if probed is not None else None
+            selected = vectors[rows] if rows is not None else vectors
+            selected_keys = keys[rows] if rows is not None else keys
+            for start in range(0, len(selected), SEARCH_CHUNK_ROWS):
+                scores = selected[start:start + SEARCH_CHUNK_ROWS].astype(np.float32) @ query
+                # Extra candidates leave room for keys stored more than once.
+                top = np.argpartition(-scores, min(2 * k, len(scores) - 1))[:2 * k]
+                candidate_keys.append(selected_keys[start:start + SEARCH_CHUNK_ROWS][top])
+                candidate_scores.append(scores[top])
+        if not candidate_scores:
+            return []
+        keys = np.concatenate(candidate_keys)
+        scores = np.concatenate(candidate_scores)
+        results = {}
+        for index in np.argsort(-scores):
+            key = keys[index].decode()
+            if key not in results:
+                results[key] = float(scores[index])
+                if len(results) == k:
+                    break
+        return list(results.items())
+
+
+class EmbeddingWriter:
+    """Buffers the embeddings computed by this process and writes them out as shards.
+
+    A shard is written once ``shard_size`` embeddings are waiting, by the prediction that
+    fills it, at least every ``flush_interval`` seconds by a background thread, and on
+    shutdown.
+    """
+
+    def __init__(self, root=None, shard_size=1024, flush_interval=60):
+        self.root = root
+        self.shard_size = shard_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._timer_pid = None
+        self._stop = threading.Event()
+
+    def add(self, crop, model_version, key, vector):
+        self._ensure_timer()
+        with self._lock:
+            keys, vectors = self._pending.setdefault((crop, model_version), ([], []))
+            keys.append(key)
+            vectors.append(np.asarray(vector, dtype=np.float32))
+            self._count += 1
+            due = self._count >= self.shard_size
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending, self._count = self._pending, {}, 0
+        for (crop, model_version), (keys, vectors) in pending.items():
+            directory = partition_dir(crop, model_version, self.root)
+            try:
+                write_shard(directory, keys, np.stack(vectors), read_centroids(directory))
+            except OSError:
+                logger.exception("Could not write %d %s embeddings", len(keys), crop)
+
+    def _run_timer(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _ensure_timer(self):
+        if self._timer_pid == os.getpid():
+            return
+        with self._lock:
+            # Threads do not survive a fork, so each process starts its own timer.
+            if self._timer_pid != os.getpid():
+                self._timer_pid = os.getpid()
+                threading.Thread(target=self._run_timer, name="embedding-writer", daemon=True).start()
+
+
+_writer = None
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_embedding_writer():
+    """Return the process-wide EmbeddingWriter, creating it on first use."""
+    global _writer
+    if _writer is None:
+        with _lock:
+            if _writer is None:
+                _writer = EmbeddingWriter(
+                    shard_size=settings.PREDICTION_EMBEDDING_SHARD_SIZE,
+                    flush_interval=settings.PREDICTION_EMBEDDING_FLUSH_INTERVAL,
+                )
+                atexit.register(flush_embeddings)
+    return _writer
+
+
+def index_embedding(crop, model_version, image_sha256, embedding):
+    """Queue a prediction's embedding for the similar-case index unless PREDICTION_EMBEDDINGS is off."""
+    if settings.PREDICTION_EMBEDDINGS and crop and model_version:
+        get_embedding_writer().add(crop, model_version, image_sha256, embedding)
+
+
+def flush_embeddings():
+    if _writer is not None:
+        _writer.flush()
+
+
+def get_embedding_index(crop, model_version):
+    """Return this process's index of a crop and model version, refreshed at most every few seconds."""
+    key = (crop, model_version)
+    with _lock:
+        entry = _indexes.get(key)
+        if entry is None:
+            index = EmbeddingIndex(partition_dir(crop, model_version), probes=settings.PREDICTION_EMBEDDING_IVF_PROBES)
+            entry = _indexes[key] = [index, None]
+    index, refreshed = entry
+    if refreshed is None or time.monotonic() - refreshed >= settings.PREDICTION_EMBEDDING_REFRESH_INTERVAL:
+        index.refresh()
+        entry[1] = time.monotonic()
+    return index
+
+
+def _partitions(root=None):
+    root = Path(root or settings.PREDICTION_EMBEDDING_DIR)
+    return [directory for directory in root.glob("*/*") if directory.is_dir()] if root.is_dir() else []
+
+
+def compact_embedding_shards(root=None):
+    """Compact every partition under the embedding directory, returning how many shards were merged."""
+    return sum(compact_partition(directory) for directory in _partitions(root))
+
+
+def train_embedding_centroids(root=None, min_vectors=None):
+    """Train the centroids of every partition past PREDICTION_EMBEDDING_IVF_THRESHOLD vectors that has none yet.
+
+    Returns how many partitions were trained.
+    """
+    min_vectors = min_vectors or settings.PREDICTION_EMBEDDING_IVF_THRESHOLD
+    return sum(train_partition(directory, min_vectors) for directory in _partitions(root))
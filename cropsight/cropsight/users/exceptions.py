@@ -20,4 +20,31 @@ class ProductNotFoundError(Exception):
     pass
 
 class UndefinedDiseaseError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class UnsupportedCropError(Exception):
+    pass
+
+class ModelFusionError(Exception):
+    pass
+
+class ImageQualityError(Exception):
+    pass
+
+class ImageUploadError(Exception):
+    pass
+
+class InvalidCursorError(Exception):
+    pass
+
+class ModelManifestError(Exception):
+    pass
+
+class PredictionNotFoundError(Exception):
+    pass
+
+class ExplanationUnavailableError(Exception):
+    pass
+
+class ModelClassesError(Exception):
+    pass
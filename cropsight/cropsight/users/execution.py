@@ -0,0 +1,93 @@
+import logging
+import statistics
+import time
+
+import torch
+import torch.nn.functional as F
+
+logger = logging.getLogger(__name__)
+
+DEFAULT = "default"
+CHANNELS_LAST = "channels_last"
+BF16 = "bf16"
+CHANNELS_LAST_BF16 = "channels_last_bf16"
+EXECUTION_MODES = (DEFAULT, CHANNELS_LAST, BF16, CHANNELS_LAST_BF16)
+# Benchmark the modes available on this host at startup and keep the fastest.
+AUTO = "auto"
+
+# Largest difference in class probability a reduced-precision mode may introduce.
+BF16_TOLERANCE = 0.05
+
+
+def uses_channels_last(mode):
+    return mode in (CHANNELS_LAST, CHANNELS_LAST_BF16)
+
+
+def uses_bf16(mode):
+    return mode in (BF16, CHANNELS_LAST_BF16)
+
+
+def bf16_supported():
+    """Whether the CPU has native bfloat16 support (AVX512-BF16 or AMX), without which bf16 is emulated and slow."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())  # noqa: SLF001
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def available_modes(model, device, quantized=False):
+    """Return the execution modes that apply to a model on a device.
+
+    Exported backends run their own optimized graph, so only eager models get options;
+    INT8 models already run in reduced precision and skip bfloat16.
+    """
+    if not isinstance(model, torch.nn.Module):
+        return [DEFAULT]
+    modes = [DEFAULT, CHANNELS_LAST]
+    if not quantized and device.type == "cpu" and bf16_supported():
+        modes += [BF16, CHANNELS_LAST_BF16]
+    return modes
+
+
+def prepare_model(model, mode):
+    """Convert an eager model's weights to the memory format a mode expects, in place."""
+    if isinstance(model, torch.nn.Module):
+        model.to(memory_format=torch.channels_last if uses_channels_last(mode) else torch.contiguous_format)
+    return model
+
+
+def run_model(model, batch, mode):
+    """Run a batch through the model in the given execution mode, returning fp32 logits."""
+    if uses_channels_last(mode):
+        batch = batch.contiguous(memory_format=torch.channels_last)
+    if uses_bf16(mode):
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            return model(batch).float()
+    return model(batch)
+
+
+def select_fastest_mode(model, modes, example, iterations=5):
+    """Time each mode on an example batch and return the fastest one with the median time of every mode.
+
+    Modes whose outputs drift from the default mode by more than BF16_TOLERANCE are skipped.
+    The model is left prepared for the selected mode.
+    """
+    timings = {}
+    with torch.inference_mode():
+        prepare_model(model, DEFAULT)
+        reference = F.softmax(run_model(model, example, DEFAULT), dim=1)
+        for mode in modes:
+            prepare_model(model, mode)
+            output = F.softmax(run_model(model, example, mode), dim=1)  # also pays first-call setup
+            if (output - reference).abs().max().item() > BF16_TOLERANCE:
+                logger.warning("Skipping %s execution, its outputs differ from fp32", mode)
+                continue
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                run_model(model, example, mode)
+                samples.append(time.perf_counter() - start)
+            timings[mode] = statistics.median(samples)
+    fastest = min(timings, key=timings.get)
+    prepare_model(model, fastest)
+    return fastest, timings
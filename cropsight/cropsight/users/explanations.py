@@ -0,0 +1,111 @@
+import io
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from .combined_prediction import COMBINED_MODEL
+from .exceptions import ExplanationUnavailableError
+from .model_registry import get_model_registry
+
+EXPLANATION_DIR = "crop_images/explanations"
+# Explanations known to be stored already, so repeat requests skip the object store lookup.
+STORED_EXPLANATIONS_CACHE_SIZE = 4096
+HEATMAP_OPACITY = 0.45
+
+
+def explanation_name(prediction):
+    """Return the storage name of a prediction's overlay, shared by predictions of the same image, model and class."""
+    sha = prediction.image_sha256
+    suffix = re.sub(r"[^\w.-]", "_", f"{prediction.model_version}-{prediction.disease_class}")
+    return f"{EXPLANATION_DIR}/{sha[:2]}/{sha}-{suffix}.jpg"
+
+
+def heatmap_colors(heatmap):
+    """Map values in 0-1 to RGB with a jet-like colormap (blue for cold, red for hot)."""
+    channels = [np.clip(1.5 - np.abs(4 * heatmap - offset), 0, 1) for offset in (3, 2, 1)]
+    return (np.stack(channels, axis=-1) * 255).astype(np.uint8)
+
+
+def render_overlay(image, heatmap, size):
+    """Return a JPEG of the image, scaled to fit ``size`` x ``size`` pixels, with the heatmap blended over it."""
+    image = image.copy()
+    image.thumbnail((size, size))
+    heatmap = Image.fromarray((heatmap * 255).astype(np.uint8)).resize(image.size, Image.BILINEAR)
+    colored = Image.fromarray(heatmap_colors(np.asarray(heatmap) / 255))
+    buffer = io.BytesIO()
+    Image.blend(image, colored, HEATMAP_OPACITY).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def prediction_service_for(prediction):
+    """Return the loaded PredictionService that made a prediction, or raise ExplanationUnavailableError."""
+    registry = get_model_registry()
+    crops = registry.crops()
+    # Predictions from a combined "<crop>/<disease>" model are recorded under the crop.
+    for crop in (prediction.predicted_crop, COMBINED_MODEL):
+        if crop in crops:
+            service = registry.get(crop)
+            if service.model_version == prediction.model_version:
+                return service
+    raise ExplanationUnavailableError("The model that made this prediction is no longer served")
+
+
+def model_class_name(service, prediction):
+    """Return the service's name for the predicted class, which combined models prefix with the crop."""
+    for class_name in service.class_names:
+        crop, _, disease = class_name.rpartition("/")
+        if disease == prediction.disease_class and crop.lower() in ("", prediction.predicted_crop.lower()):
+            return class_name
+    raise ExplanationUnavailableError("The predicted class is not known to the model")
+
+
+_stored = OrderedDict()
+_stored_lock = threading.Lock()
+# Only one explanation is computed at a time per process; they are rare and CPU-heavy.
+_compute_lock = threading.Lock()
+
+
+def _is_stored(name):
+    with _stored_lock:
+        return name in _stored
+
+
+def _remember(name):
+    with _stored_lock:
+        _stored[name] = True
+        _stored.move_to_end(name)
+        while len(_stored) > STORED_EXPLANATIONS_CACHE_SIZE:
+            _stored.popitem(last=False)
+    return name
+
+
+def explain_prediction(prediction, storage=None):
+    """Return the storage name of a prediction's Grad-CAM overlay, computing and storing it on first request.
+
+    The heatmap is computed from the prediction's stored image with the model that made
+    it, and the overlay is kept in the media storage, so later requests only look it up.
+    Raises ExplanationUnavailableError while the image hasn't been stored yet, or when
+    that model is no longer served or can't provide gradients.
+    """
+    storage = storage or default_storage
+    name = explanation_name(prediction)
+    if _is_stored(name) or storage.exists(name):
+        return _remember(name)
+    if not prediction.image or not prediction.disease_class:
+        raise ExplanationUnavailableError("The image of this prediction has not been stored yet")
+    service = prediction_service_for(prediction)
+    class_name = model_class_name(service, prediction)
+    with _compute_lock:
+        # Requests for the same prediction queue up here and then find it stored.
+        if storage.exists(name):
+            return _remember(name)
+        with storage.open(prediction.image.name) as image_file:
+            image, heatmap = service.explain(image_file, class_name)
+        overlay = render_overlay(image, heatmap, settings.PREDICTION_EXPLANATION_SIZE)
+        return _remember(storage.save(name, ContentFile(overlay)))
@@ -0,0 +1,197 @@
+import atexit
+import io
+import logging
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from .prediction_log import attach_prediction_image, flush_prediction_log
+from .upload_handlers import sniff_image_format
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = "crop_images"
+THUMBNAIL_DIR = "crop_images/thumbnails"
+# Uploads waiting for an inference worker; each is deleted once its job has run.
+JOB_IMAGE_DIR = "prediction_jobs"
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+# Digests known to be stored already, so repeat uploads skip the object store entirely.
+STORED_DIGESTS_CACHE_SIZE = 4096
+
+
+def image_name(image_sha256, data):
+    """Return the content-addressed storage name of an image, e.g. crop_images/ab/ab12….jpg."""
+    extension = EXTENSIONS.get(sniff_image_format(data[:12]), "")
+    return f"{IMAGE_DIR}/{image_sha256[:2]}/{image_sha256}{extension}"
+
+
+def thumbnail_name(image_sha256):
+    return f"{THUMBNAIL_DIR}/{image_sha256[:2]}/{image_sha256}.jpg"
+
+
+def make_thumbnail(data, size):
+    """Return a JPEG thumbnail of the encoded image fitting in ``size`` x ``size`` pixels."""
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEGs are decoded straight at a reduced scale.
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB")
+        image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def store_image(image_sha256, data, storage=None):
+    """Save an image and its thumbnail under their content-addressed names unless already stored.
+
+    Returns the (image, thumbnail) storage names. An identical upload stored by another
+    process at the same moment may still get a suffixed name from the storage backend;
+    both copies are valid.
+    """
+    storage = storage or default_storage
+    name = image_name(image_sha256, data)
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(data))
+    thumbnail = thumbnail_name(image_sha256)
+    if not storage.exists(thumbnail):
+        thumbnail = storage.save(thumbnail, ContentFile(make_thumbnail(data, settings.PREDICTION_THUMBNAIL_SIZE)))
+    return name, thumbnail
+
+
+def stage_job_image(image_file, storage=None):
+    """Save an upload for a queued prediction under a random name and return the name.
+
+    Only the name goes through the broker, so image size does not weigh on it.
+    """
+    storage = storage or default_storage
+    image_file.seek(0)
+    return storage.save(f"{JOB_IMAGE_DIR}/{uuid.uuid4().hex}", ContentFile(image_file.read()))
+
+
+class ImageUploader:
+    """Stores prediction images in the background so the object store never delays a response.
+
+    Uploads wait in a queue bounded by total bytes and are saved by a few threads per
+    process; once an image lands, its recorded predictions are pointed at it through the
+    prediction log. When the queue is full the image is skipped and its predictions keep
+    a blank image.
+    """
+
+    def __init__(self, max_queue_bytes=256 * 1024 * 1024, workers=2):
+        self.max_queue_bytes = max_queue_bytes
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._threads_pid = None
+        self._pending = set()
+        self._queued_bytes = 0
+        self._stored = OrderedDict()
+        self.dropped = 0
+
+    def submit(self, image_sha256, data):
+        """Queue an image for storage, returning False if it was dropped because the queue is full."""
+        with self._lock:
+            names = self._stored.get(image_sha256)
+            if names is None:
+                if image_sha256 in self._pending:
+                    return True
+                if self._queued_bytes + len(data) > self.max_queue_bytes:
+                    self.dropped += 1
+                    return False
+                self._pending.add(image_sha256)
+                self._queued_bytes += len(data)
+            else:
+                self._stored.move_to_end(image_sha256)
+        if names is not None:
+            attach_prediction_image(image_sha256, *names)
+            return True
+        self._ensure_workers()
+        self._queue.put((image_sha256, data))
+        return True
+
+    def _ensure_workers(self):
+        # Threads do not survive a fork, so they are started lazily per process.
+        if self._threads_pid == os.getpid():
+            return
+        with self._lock:
+            if self._threads_pid != os.getpid():
+                self._threads = [
+                    threading.Thread(target=self._run, name=f"prediction-image-upload-{index}", daemon=True)
+                    for index in range(self.workers)
+                ]
+                self._threads_pid = os.getpid()
+                for thread in self._threads:
+                    thread.start()
+
+    def _run(self):
+        while True:
+            self._upload(*self._queue.get())
+
+    def _upload(self, image_sha256, data):
+        try:
+            names = store_image(image_sha256, data)
+        except Exception:
+            logger.exception("Could not store prediction image %s", image_sha256)
+            names = None
+        with self._lock:
+            self._pending.discard(image_sha256)
+            self._queued_bytes -= len(data)
+            if names is not None:
+                self._stored[image_sha256] = names
+                if len(self._stored) > STORED_DIGESTS_CACHE_SIZE:
+                    self._stored.popitem(last=False)
+        if names is not None:
+            attach_prediction_image(image_sha256, *names)
+
+    def flush(self):
+        """Store the images still queued in the calling thread, e.g. when the process shuts down."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._upload(*item)
+
+
+_uploader = None
+_uploader_lock = threading.Lock()
+
+
+def get_image_uploader():
+    """Return the process-wide ImageUploader, creating it on first use."""
+    global _uploader
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None:
+                _uploader = ImageUploader(
+                    max_queue_bytes=settings.PREDICTION_IMAGE_UPLOAD_QUEUE_BYTES,
+                    workers=settings.PREDICTION_IMAGE_UPLOAD_WORKERS,
+                )
+                # Registered after the prediction log's handler, so it runs first.
+                atexit.register(flush_image_uploads)
+    return _uploader
+
+
+def store_prediction_image(image_sha256, image_file):
+    """Queue the image of a recorded prediction for deduplicated storage, leaving the file rewound."""
+    if not (settings.PREDICTION_LOG_ENABLED and settings.PREDICTION_IMAGE_STORE):
+        return
+    image_file.seek(0)
+    data = image_file.read()
+    image_file.seek(0)
+    get_image_uploader().submit(image_sha256, data)
+
+
+def flush_image_uploads():
+    """Store queued images, then write out the prediction log so the rows point at them."""
+    if _uploader is not None:
+        _uploader.flush()
+    flush_prediction_log()
@@ -0,0 +1,145 @@
+import hashlib
+import logging
+from pathlib import Path
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+EAGER = "eager"
+TORCHSCRIPT = "torchscript"
+ONNXRUNTIME = "onnxruntime"
+BACKENDS = (EAGER, TORCHSCRIPT, ONNXRUNTIME)
+
+ARTIFACT_SUFFIXES = {
+    TORCHSCRIPT: ".torchscript.pt",
+    ONNXRUNTIME: ".onnx",
+}
+
+
+def file_checksum(path):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_path(model_path, backend):
+    """Return where the exported artifact for a state dict lives, e.g. Potato_cnn.pth -> Potato_cnn.onnx."""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + ARTIFACT_SUFFIXES[backend])
+
+
+def source_checksum_path(path):
+    """Return where the checksum of the weights an artifact was exported from is kept, next to the artifact."""
+    path = Path(path)
+    return path.with_name(path.name + ".sha256")
+
+
+class TorchScriptBackend:
+    """Run a frozen TorchScript export of the model."""
+
+    name = TORCHSCRIPT
+
+    def __init__(self, path, device):
+        self.device = device
+        module = torch.jit.load(str(path), map_location=device)
+        self.module = torch.jit.optimize_for_inference(module)
+
+    def __call__(self, batch):
+        return self.module(batch)
+
+
+class OnnxRuntimeBackend:
+    """Run an ONNX export of the model on ONNX Runtime's CPU execution provider."""
+
+    name = ONNXRUNTIME
+
+    def __init__(self, path, device):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        (logits,) = self.session.run(None, {self.input_name: batch.cpu().numpy()})
+        return torch.from_numpy(logits)
+
+
+BACKEND_CLASSES = {
+    TORCHSCRIPT: TorchScriptBackend,
+    ONNXRUNTIME: OnnxRuntimeBackend,
+}
+
+
+def load_exported_model(backend, model_path, device):
+    """Load the exported artifact for a non-eager backend, or return None so the caller falls back to eager.
+
+    An artifact is only used when it was exported from the current weights, so replacing
+    ``model_path`` in place never leaves a stale export serving under the new model version.
+    """
+    if backend not in BACKEND_CLASSES:
+        if backend != EAGER:
+            logger.warning("Unknown inference backend %r, using eager", backend)
+        return None
+    if backend == ONNXRUNTIME and device.type != "cpu":
+        logger.warning("ONNX Runtime backend only runs on CPU, using eager on %s", device)
+        return None
+    path = artifact_path(model_path, backend)
+    if not path.exists():
+        logger.warning("No %s artifact at %s, using eager. Run `manage.py export_models` to create it.", backend, path)
+        return None
+    try:
+        exported_from = source_checksum_path(path).read_text().strip()
+    except OSError:
+        exported_from = None
+    if exported_from != file_checksum(model_path):
+        logger.warning(
+            "The %s artifact at %s was not exported from %s, using eager. Re-run `manage.py export_models`.",
+            backend, path, model_path,
+        )
+        return None
+    try:
+        return BACKEND_CLASSES[backend](path, device)
+    except ImportError:
+        logger.warning("%s is not installed, using eager", backend)
+        return None
+    except Exception:
+        # A corrupt artifact, or one made by an incompatible torch or ONNX Runtime version.
+        logger.exception("Could not load the %s artifact at %s, using eager", backend, path)
+        return None
+
+
+def export_model(model, model_path, backend):
+    """Export an eval-mode eager model loaded from ``model_path`` to the artifact used by ``backend``.
+
+    The checksum of ``model_path`` is stored next to the artifact, for load_exported_model
+    to check. Returns the artifact's path.
+    """
+    path = artifact_path(model_path, backend)
+    example = torch.randn(1, 3, 224, 224)
+    model = model.eval()
+    if backend == TORCHSCRIPT:
+        with torch.no_grad():
+            scripted = torch.jit.freeze(torch.jit.script(model))
+        scripted.save(str(path))
+    elif backend == ONNXRUNTIME:
+        torch.onnx.export(
+            model,
+            (example,),
+            str(path),
+            input_names=["input"],
+            output_names=["logits"],
+            dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+            dynamo=False,
+        )
+    else:
+        msg = f"Cannot export to the {backend!r} backend"
+        raise ValueError(msg)
+    source_checksum_path(path).write_text(file_checksum(model_path) + "\n")
+    return path
@@ -0,0 +1,113 @@
+import json
+from pathlib import Path
+
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from cropsight.users.benchmark import benchmark_service
+from cropsight.users.benchmark import compare_results
+from cropsight.users.benchmark import environment_info
+from cropsight.users.benchmark import synthetic_images
+from cropsight.users.execution import DEFAULT
+from cropsight.users.execution import EXECUTION_MODES
+from cropsight.users.inference_backends import BACKENDS
+from cropsight.users.inference_backends import EAGER
+from cropsight.users.prediction_service import PredictionService
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",")]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark per-stage and end-to-end prediction latency and throughput on synthetic images, "
+        "for each crop model across batch sizes, thread counts, backends and execution modes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("crops", nargs="*", help="Crops to benchmark (defaults to all configured crops).")
+        parser.add_argument("--backend", dest="backends", action="append", choices=BACKENDS,
+                            help="Backend to benchmark; may be repeated (defaults to eager).")
+        parser.add_argument("--execution-mode", dest="execution_modes", action="append", choices=EXECUTION_MODES,
+                            help="Eager execution mode to benchmark; may be repeated (defaults to default).")
+        parser.add_argument("--batch-sizes", type=_int_list, default=[1, 8], help="Comma-separated, e.g. 1,8,16.")
+        parser.add_argument("--threads", type=_int_list, default=[torch.get_num_threads()],
+                            help="Comma-separated torch intra-op thread counts.")
+        parser.add_argument("--images", type=int, default=16, help="Synthetic images per run.")
+        parser.add_argument("--runs", type=int, default=3)
+        parser.add_argument("--no-products", action="store_true", help="Skip the database product lookup stage.")
+        parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+        parser.add_argument("--compare", help="Baseline JSON results to check for latency regressions.")
+        parser.add_argument("--tolerance", type=float, default=0.1,
+                            help="Allowed median latency increase over the baseline (default 0.1 = 10%%).")
+
+    def handle(self, *args, **options):
+        crops = options["crops"] or sorted(settings.PREDICTION_MODELS)
+        unknown = set(crops) - set(settings.PREDICTION_MODELS)
+        if unknown:
+            msg = f"Unknown crops: {', '.join(sorted(unknown))}"
+            raise CommandError(msg)
+        images = synthetic_images(options["images"])
+        default_threads = torch.get_num_threads()
+
+        results = []
+        for crop in crops:
+            config = settings.PREDICTION_MODELS[crop]
+            for backend in options["backends"] or [EAGER]:
+                for mode in options["execution_modes"] or [DEFAULT]:
+                    service = PredictionService(
+                        config["path"], config["class_names"], device=torch.device("cpu"),
+                        quantize=crop in settings.PREDICTION_QUANTIZED_CROPS,
+                        calibration_dir=Path(settings.PREDICTION_CALIBRATION_DIR) / crop,
+                        backend=backend, architecture=config.get("architecture", "cnn"),
+                        check_quality=settings.PREDICTION_QUALITY_CHECK, execution_mode=mode,
+                    )
+                    if service.backend != backend:
+                        self.stderr.write(f"Skipping {crop} on {backend}: no exported artifact")
+                        break
+                    if service.execution_mode != mode:
+                        self.stderr.write(f"Skipping {crop} {mode} execution: not available on this host")
+                        continue
+                    for threads in options["threads"]:
+                        torch.set_num_threads(threads)
+                        for batch_size in options["batch_sizes"]:
+                            result = benchmark_service(
+                                service, images, batch_size=batch_size, runs=options["runs"],
+                                include_products=not options["no_products"],
+                            )
+                            result.update(
+                                crop=crop, backend=backend, execution_mode=mode, threads=threads,
+                                model_version=service.model_version,
+                            )
+                            results.append(result)
+                            self.stderr.write(
+                                f"{crop} {backend} {mode} threads={threads} batch={batch_size}: "
+                                f"{result['batch_latency']['p50_ms']:.1f} ms/batch, "
+                                f"{result['throughput_per_s']:.1f} images/s"
+                            )
+        torch.set_num_threads(default_threads)
+
+        report = {"environment": environment_info(), "results": results}
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(output)
+        else:
+            self.stdout.write(output)
+
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())
+            regressions = compare_results(baseline, report, options["tolerance"])
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(
+                    f"{regression['crop']} {regression['backend']} {regression['execution_mode']} "
+                    f"threads={regression['threads']} "
+                    f"batch={regression['batch_size']}: {regression['baseline_p50_ms']:.1f} -> "
+                    f"{regression['p50_ms']:.1f} ms ({regression['change']:+.0%})"
+                ))
+            if regressions:
+                msg = f"{len(regressions)} configuration(s) regressed by more than {options['tolerance']:.0%}"
+                raise CommandError(msg)
+            self.stderr.write(self.style.SUCCESS("No latency regressions against the baseline"))
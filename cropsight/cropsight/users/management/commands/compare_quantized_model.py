@@ -0,0 +1,75 @@
+import io
+import statistics
+import time
+from pathlib import Path
+
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from cropsight.users.prediction_service import PredictionService
+from cropsight.users.quantization import load_calibration_batches
+
+
+def _model_size(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def _time_per_image(model, images, runs):
+    timings = []
+    with torch.no_grad():
+        model(images[:1])  # first call pays one-off kernel selection
+        for _ in range(runs):
+            for index in range(images.shape[0]):
+                start = time.perf_counter()
+                model(images[index:index + 1])
+                timings.append(time.perf_counter() - start)
+    return timings
+
+
+class Command(BaseCommand):
+    help = "Compare latency, size and top-1 agreement of the INT8 and fp32 models for a crop."
+
+    def add_arguments(self, parser):
+        parser.add_argument("crop", choices=sorted(settings.PREDICTION_MODELS))
+        parser.add_argument("--images", help="Directory of evaluation images (defaults to the calibration set).")
+        parser.add_argument("--limit", type=int, default=64)
+        parser.add_argument("--runs", type=int, default=3)
+
+    def handle(self, *args, **options):
+        crop = options["crop"]
+        config = settings.PREDICTION_MODELS[crop]
+        calibration_dir = Path(settings.PREDICTION_CALIBRATION_DIR) / crop
+        cpu = torch.device("cpu")
+
+        architecture = config.get("architecture", "cnn")
+        fp32 = PredictionService(config["path"], config["class_names"], device=cpu, architecture=architecture)
+        int8 = PredictionService(
+            config["path"], config["class_names"], device=cpu, architecture=architecture,
+            quantize=True, calibration_dir=calibration_dir,
+        )
+        if not int8.quantized:
+            msg = f"No calibration images found in {calibration_dir}"
+            raise CommandError(msg)
+
+        batches = load_calibration_batches(options["images"] or calibration_dir, fp32.transform, limit=options["limit"])
+        if not batches:
+            msg = "No evaluation images found"
+            raise CommandError(msg)
+        images = torch.cat(batches)
+
+        with torch.no_grad():
+            agreement = (fp32.model(images).argmax(1) == int8.model(images).argmax(1)).float().mean().item()
+        fp32_times = _time_per_image(fp32.model, images, options["runs"])
+        int8_times = _time_per_image(int8.model, images, options["runs"])
+        fp32_ms = statistics.median(fp32_times) * 1000
+        int8_ms = statistics.median(int8_times) * 1000
+
+        self.stdout.write(f"Crop: {crop} ({images.shape[0]} images, {options['runs']} runs)")
+        self.stdout.write(f"fp32 median latency: {fp32_ms:.2f} ms, size: {_model_size(fp32.model) / 1e6:.2f} MB")
+        self.stdout.write(f"int8 median latency: {int8_ms:.2f} ms, size: {_model_size(int8.model) / 1e6:.2f} MB")
+        self.stdout.write(f"Speedup: {fp32_ms / int8_ms:.2f}x")
+        self.stdout.write(f"Top-1 agreement: {agreement * 100:.2f}%")
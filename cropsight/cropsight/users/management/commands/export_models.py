@@ -0,0 +1,35 @@
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cropsight.users.inference_backends import ONNXRUNTIME
+from cropsight.users.inference_backends import TORCHSCRIPT
+from cropsight.users.inference_backends import export_model
+from cropsight.users.prediction_service import PredictionService
+
+
+class Command(BaseCommand):
+    help = "Export crop model weights to TorchScript and ONNX artifacts for the graph-optimized backends."
+
+    def add_arguments(self, parser):
+        parser.add_argument("crops", nargs="*", help="Crops to export (defaults to all configured crops).")
+        parser.add_argument(
+            "--format",
+            dest="formats",
+            action="append",
+            choices=[TORCHSCRIPT, ONNXRUNTIME],
+            help="Artifact format to export; may be repeated (defaults to both).",
+        )
+
+    def handle(self, *args, **options):
+        crops = options["crops"] or sorted(settings.PREDICTION_MODELS)
+        formats = options["formats"] or [TORCHSCRIPT, ONNXRUNTIME]
+        for crop in crops:
+            config = settings.PREDICTION_MODELS[crop]
+            service = PredictionService(
+                config["path"], config["class_names"], device=torch.device("cpu"),
+                architecture=config.get("architecture", "cnn"),
+            )
+            for backend in formats:
+                path = export_model(service.model, config["path"], backend)
+                self.stdout.write(self.style.SUCCESS(f"Exported {crop} model for {backend} to {path}"))
@@ -0,0 +1,190 @@
+import atexit
+import bisect
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+METRIC_NAME = "cropsight_prediction_stage_seconds"
+# Upper bounds in seconds; observations above the last one only count towards +Inf.
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageMetrics:
+    """Latency histograms of prediction stages per stage, crop and model version, kept in this process.
+
+    Each histogram holds a count per bucket (not cumulative, the last one for values above
+    every bucket) followed by the sum of the observed values.
+    """
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, crop="", model_version=""):
+        index = bisect.bisect_left(self.buckets, seconds)
+        key = (stage, crop or "", model_version or "")
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(histogram) for key, histogram in self._histograms.items()}
+
+
+def write_snapshot(path, snapshot, buckets=STAGE_BUCKETS):
+    """Write a process's histograms to ``path``, renaming a complete file into place."""
+    path = Path(path)
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_text(json.dumps({
+        "buckets": list(buckets),
+        "histograms": [[*key, histogram] for key, histogram in snapshot.items()],
+    }))
+    os.replace(temporary, path)
+
+
+def merge_snapshots(directory, buckets=STAGE_BUCKETS):
+    """Sum the histograms written by every process into ``directory``, skipping unreadable files."""
+    merged = {}
+    for path in Path(directory).glob("*.json"):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            logger.warning("Skipping unreadable metrics file %s", path)
+            continue
+        if tuple(data.get("buckets", ())) != tuple(buckets):
+            # Written with other bucket bounds by a previous deployment.
+            continue
+        for stage, crop, model_version, histogram in data["histograms"]:
+            total = merged.setdefault((stage, crop, model_version), [0] * len(histogram[:-1]) + [0.0])
+            for index, value in enumerate(histogram):
+                total[index] += value
+    return merged
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(histograms, buckets=STAGE_BUCKETS):
+    """Render histograms in the Prometheus text exposition format."""
+    lines = [
+        f"# HELP {METRIC_NAME} Time spent in each stage of a prediction.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    for (stage, crop, model_version), histogram in sorted(histograms.items()):
+        labels = ",".join(
+            f'{name}="{_label_value(value)}"'
+            for name, value in (("stage", stage), ("crop", crop), ("model_version", model_version))
+        )
+        cumulative = 0
+        for bound, count in zip([*buckets, "+Inf"], histogram[:-1]):
+            cumulative += count
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{METRIC_NAME}_sum{{{labels}}} {histogram[-1]}")
+        lines.append(f"{METRIC_NAME}_count{{{labels}}} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+_metrics = StageMetrics()
+_writer_pid = None
+_writer_lock = threading.Lock()
+_stop = threading.Event()
+_paused = threading.local()
+# (pid, file name) of this process's snapshot.
+_snapshot_name = None
+
+
+def _snapshot_path():
+    global _snapshot_name
+    if _snapshot_name is None or _snapshot_name[0] != os.getpid():
+        # Keyed by start time as well, so a worker reusing an exited one's pid doesn't overwrite its counts.
+        _snapshot_name = (os.getpid(), f"{os.getpid()}-{time.time_ns()}.json")
+    return Path(settings.PREDICTION_METRICS_DIR) / _snapshot_name[1]
+
+
+def write_stage_metrics():
+    """Write this process's histograms to PREDICTION_METRICS_DIR, if one is configured."""
+    if not settings.PREDICTION_METRICS_DIR:
+        return
+    try:
+        Path(settings.PREDICTION_METRICS_DIR).mkdir(parents=True, exist_ok=True)
+        write_snapshot(_snapshot_path(), _metrics.snapshot())
+    except OSError:
+        logger.exception("Could not write the prediction metrics")
+
+
+def _run_writer(interval):
+    while not _stop.wait(interval):
+        write_stage_metrics()
+
+
+def _ensure_writer():
+    global _writer_pid
+    if not settings.PREDICTION_METRICS_DIR or _writer_pid == os.getpid():
+        return
+    with _writer_lock:
+        # Threads do not survive a fork, so each process starts its own writer.
+        if _writer_pid != os.getpid():
+            _writer_pid = os.getpid()
+            threading.Thread(
+                target=_run_writer, args=(settings.PREDICTION_METRICS_WRITE_INTERVAL,),
+                name="prediction-metrics-writer", daemon=True,
+            ).start()
+            atexit.register(write_stage_metrics)
+
+
+@contextlib.contextmanager
+def metrics_paused():
+    """Leave the predictions this thread makes inside the block, such as warm-up ones, out of the metrics."""
+    _paused.active = True
+    try:
+        yield
+    finally:
+        _paused.active = False
+
+
+def observe_stage(stage, seconds, crop="", model_version=""):
+    """Record the duration of a prediction stage unless PREDICTION_METRICS is off or metrics are paused."""
+    if settings.PREDICTION_METRICS and not getattr(_paused, "active", False):
+        _ensure_writer()
+        _metrics.observe(stage, seconds, crop, model_version)
+
+
+def observe_stages(timings, crop="", model_version=""):
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds, crop, model_version)
+
+
+def clear_stage_metrics():
+    """Remove the histograms written by earlier processes; gunicorn calls this once before forking workers."""
+    if settings.PREDICTION_METRICS_DIR:
+        for path in Path(settings.PREDICTION_METRICS_DIR).glob("*.json"):
+            path.unlink(missing_ok=True)
+
+
+def export_stage_metrics():
+    """Return the stage histograms in Prometheus text format, summed across all worker processes.
+
+    With PREDICTION_METRICS_DIR set, every process writes its histograms there every
+    PREDICTION_METRICS_WRITE_INTERVAL seconds (and on exit), and a scrape adds up the
+    files, so whichever worker serves it reports the whole server. Histograms of exited
+    workers are kept, as Prometheus expects counters to only go up. Without a directory
+    only this process's histograms are reported.
+    """
+    if not settings.PREDICTION_METRICS_DIR:
+        return render_prometheus(_metrics.snapshot())
+    write_stage_metrics()
+    return render_prometheus(merge_snapshots(settings.PREDICTION_METRICS_DIR))
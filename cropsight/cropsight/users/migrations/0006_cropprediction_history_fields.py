@@ -0,0 +1,51 @@
+# Generated by Django 5.0.10 on 2026-10-18 11:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_remove_cart_product_alter_cart_quantity_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cropprediction',
+            name='disease_class',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='cropprediction',
+            name='image_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='cropprediction',
+            name='latency_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cropprediction',
+            name='model_version',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='cropprediction',
+            name='image',
+            field=models.ImageField(blank=True, upload_to='crop_images/'),
+        ),
+        migrations.AlterField(
+            model_name='cropprediction',
+            name='predicted_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='cropprediction',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.10 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_cropprediction_history_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cropprediction',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='crop_images/thumbnails/'),
+        ),
+        migrations.AddIndex(
+            model_name='cropprediction',
+            index=models.Index(fields=['user', '-predicted_at', '-id'], name='cropprediction_user_history'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.10 on 2026-10-18 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_cropprediction_history_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cropprediction',
+            name='image_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.10 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_cropprediction_image_sha256_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cropprediction',
+            name='model_version',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
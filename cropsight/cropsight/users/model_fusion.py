@@ -0,0 +1,64 @@
+import copy
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import fuse_modules
+
+from .exceptions import ModelFusionError
+
+# Layer sequences that eval-mode fusion folds into the first layer's weights.
+FUSION_PATTERNS = (
+    (nn.Conv2d, nn.BatchNorm2d, nn.ReLU),
+    (nn.Conv2d, nn.BatchNorm2d),
+    (nn.Linear, nn.BatchNorm1d),
+)
+DROPOUT_LAYERS = (nn.Dropout, nn.Dropout2d)
+
+
+def _strip_dropout(module):
+    for name, child in module.named_children():
+        if isinstance(child, DROPOUT_LAYERS):
+            setattr(module, name, nn.Identity())
+        else:
+            _strip_dropout(child)
+
+
+def _fusion_groups(model):
+    """Find runs of consecutive Sequential children matching one of FUSION_PATTERNS."""
+    groups = []
+    for prefix, module in model.named_modules():
+        if not isinstance(module, nn.Sequential):
+            continue
+        children = list(module.named_children())
+        index = 0
+        while index < len(children):
+            for pattern in FUSION_PATTERNS:
+                window = children[index:index + len(pattern)]
+                if len(window) == len(pattern) and all(isinstance(m, t) for (_, m), t in zip(window, pattern)):
+                    groups.append([f"{prefix}.{name}" if prefix else name for name, _ in window])
+                    index += len(pattern)
+                    break
+            else:
+                index += 1
+    return groups
+
+
+def fuse_for_inference(model):
+    """Return an eval-mode copy of the model with BatchNorm folded into Conv/Linear and dropout removed."""
+    fused = copy.deepcopy(model).eval()
+    _strip_dropout(fused)
+    groups = _fusion_groups(fused)
+    if groups:
+        fuse_modules(fused, groups, inplace=True)
+    return fused
+
+
+def verify_fusion(reference, fused, example, atol=1e-4, rtol=1e-3):
+    """Raise ModelFusionError unless the fused model reproduces the reference outputs."""
+    with torch.no_grad():
+        expected = reference(example)
+        actual = fused(example)
+    if not torch.allclose(expected, actual, atol=atol, rtol=rtol):
+        max_error = (expected - actual).abs().max().item()
+        msg = f"Fused model output differs from the original by up to {max_error:.2e}"
+        raise ModelFusionError(msg)
@@ -0,0 +1,59 @@
+import json
+import logging
+from pathlib import Path
+
+from django.conf import settings
+
+from .exceptions import ModelManifestError
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_KEYS = ("path", "sha256", "class_names", "version")
+# The model version recorded with predictions (CropPrediction.model_version, 255 characters)
+# is this version followed by up to about 40 characters of checksum and backend.
+MAX_VERSION_LENGTH = 200
+
+
+def load_manifest(path):
+    """Read a model manifest, returning its version and the model configuration per crop.
+
+    A manifest is a JSON file such as::
+
+        {"version": "2026-10-18", "models": {"potato": {
+            "path": "potato-v4.pth", "sha256": "…", "class_names": [...], "version": "v4"}}}
+
+    Each model takes the same keys as PREDICTION_MODELS plus its checksum and version;
+    relative paths are resolved against the manifest's directory. Raises ModelManifestError
+    when the file can't be read, a model entry is incomplete or its version is longer than
+    MAX_VERSION_LENGTH.
+    """
+    path = Path(path)
+    try:
+        manifest = json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        raise ModelManifestError(f"Cannot read the model manifest {path}: {e}") from None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("models"), dict):
+        raise ModelManifestError(f"The model manifest {path} has no models")
+    configs = {}
+    for crop, entry in manifest["models"].items():
+        missing = [key for key in REQUIRED_KEYS if key not in entry]
+        if missing:
+            raise ModelManifestError(f"The {crop} model in {path} is missing {', '.join(missing)}")
+        if len(str(entry["version"])) > MAX_VERSION_LENGTH:
+            raise ModelManifestError(f"The {crop} model in {path} has a version over {MAX_VERSION_LENGTH} characters")
+        configs[crop] = {**entry, "path": str(path.parent / entry["path"])}
+    return str(manifest.get("version", "")), configs
+
+
+def model_configs(manifest_path=None):
+    """Return PREDICTION_MODELS overridden by the models of the manifest, if one is configured and valid."""
+    configs = dict(settings.PREDICTION_MODELS)
+    manifest_path = manifest_path or settings.PREDICTION_MODEL_MANIFEST
+    if manifest_path:
+        try:
+            _, manifest_configs = load_manifest(manifest_path)
+        except ModelManifestError:
+            logger.exception("Ignoring the model manifest, serving the PREDICTION_MODELS defaults")
+        else:
+            configs.update(manifest_configs)
+    return configs
@@ -0,0 +1,201 @@
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+from .exceptions import ModelClassesError, ModelManifestError, UnsupportedCropError
+from .model_manifest import model_configs
+from .prediction_service import PredictionService, file_checksum
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Process-wide LRU cache of loaded PredictionService instances, keyed by crop.
+
+    ``configs`` holds each crop's model configuration (PREDICTION_MODELS by default); a
+    new model version is put in place with ``swap`` without disturbing requests in flight.
+    """
+
+    def __init__(self, max_size, configs=None):
+        self.max_size = max(1, max_size)
+        self._services = OrderedDict()
+        self._configs = dict(settings.PREDICTION_MODELS if configs is None else configs)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.swaps = 0
+
+    def get(self, crop):
+        """Return the PredictionService for a crop, loading it on first use."""
+        service = self._get_resident(crop)
+        if service is not None:
+            return service
+
+        # Only one thread loads a given crop; others wait and then reuse it.
+        with self.load_lock(crop):
+            service = self._get_resident(crop)
+            if service is not None:
+                return service
+
+            service = self._load(crop)
+            with self._lock:
+                self._services[crop] = service
+                self.loads += 1
+                evicted = self._evict()
+        self._close(evicted)
+        return service
+
+    def load_lock(self, crop):
+        """The lock held while a crop's model is being loaded."""
+        with self._lock:
+            return self._load_locks.setdefault(crop, threading.Lock())
+
+    def _evict(self):
+        evicted = []
+        while len(self._services) > self.max_size:
+            evicted_crop, service = self._services.popitem(last=False)
+            evicted.append(service)
+            self.evictions += 1
+            logger.info("Evicted %s model from the registry", evicted_crop)
+        return evicted
+
+    @staticmethod
+    def _close(services):
+        for service in services:
+            service.close()
+
+    def _get_resident(self, crop):
+        with self._lock:
+            service = self._services.get(crop)
+            if service is not None:
+                self._services.move_to_end(crop)
+                self.hits += 1
+            return service
+
+    def crops(self):
+        with self._lock:
+            return list(self._configs)
+
+    def model_config(self, crop):
+        with self._lock:
+            return self._configs.get(crop)
+
+    def is_resident(self, crop):
+        with self._lock:
+            return crop in self._services
+
+    def set_config(self, crop, config):
+        """Use a new configuration for a crop that isn't loaded; it takes effect on first use."""
+        with self._lock:
+            self._configs[crop] = config
+
+    def swap(self, crop, service, config):
+        """Atomically make ``service`` the crop's model; requests already holding the old one finish on it."""
+        with self._lock:
+            previous = self._services.pop(crop, None)
+            self._services[crop] = service
+            self._configs[crop] = config
+            self.swaps += 1
+            evicted = self._evict()
+        self._close([old for old in [previous, *evicted] if old is not None and old is not service])
+
+    def _load(self, crop):
+        config = self.model_config(crop)
+        if config is None:
+            raise UnsupportedCropError(f"Prediction is not supported for '{crop}'")
+        return self.build_service(crop, config)
+
+    def build_service(self, crop, config):
+        """Load a PredictionService from a model configuration, checking its checksum when it has one."""
+        logger.info("Loading %s model %s from %s", crop, config.get("version", ""), config["path"])
+        if config.get("sha256") and file_checksum(config["path"]) != config["sha256"]:
+            raise ModelManifestError(f"The {crop} model at {config['path']} does not match its checksum")
+        if config.get("architecture") == "combined":
+            self.check_crop_classes(crop, config["class_names"])
+        return PredictionService(
+            model_path=config["path"],
+            class_names=config["class_names"],
+            max_batch_size=settings.PREDICTION_BATCH_MAX_SIZE,
+            max_batch_wait_ms=settings.PREDICTION_BATCH_MAX_WAIT_MS,
+            quantize=crop in settings.PREDICTION_QUANTIZED_CROPS,
+            calibration_dir=Path(settings.PREDICTION_CALIBRATION_DIR) / crop,
+            backend=config.get("backend", settings.PREDICTION_BACKEND),
+            architecture=config.get("architecture", "cnn"),
+            check_quality=settings.PREDICTION_QUALITY_CHECK,
+            execution_mode=settings.PREDICTION_EXECUTION_MODE,
+            version=config.get("version"),
+            crop=crop,
+        )
+
+    def check_crop_classes(self, crop, class_names):
+        """Check that a crop-only combined model's classes are the other served crops, in training order.
+
+        Its predictions pick the crop model an image is routed to, so a wrong or misordered
+        class list would send images to the wrong crop model. "<crop>/<disease>" classes
+        aren't routed and pass unchecked.
+        """
+        if all("/" in class_name for class_name in class_names):
+            return
+        unknown = [name for name in class_names if name.lower() == crop or name.lower() not in self.crops()]
+        if unknown:
+            raise ModelClassesError(f"The {crop} model's classes {', '.join(unknown)} are not served crops")
+        if list(class_names) != sorted(class_names):
+            # torchvision's ImageFolder, which the models are trained with, numbers classes in sorted order.
+            raise ModelClassesError(f"The {crop} model's class names must be listed in sorted order")
+
+    def preload(self, crops=None):
+        """Load every configured crop model up front, e.g. in a server process before it forks workers.
+
+        Weights are moved to shared memory so forked workers map the parent's copy instead of
+        loading their own. A crop that fails to load is skipped and retried lazily on first use.
+        """
+        crops = self.crops() if crops is None else list(crops)
+        if len(crops) > self.max_size:
+            logger.warning(
+                "Preloading %d models with PREDICTION_MODEL_CACHE_SIZE=%d, the oldest ones will be evicted",
+                len(crops), self.max_size,
+            )
+        loaded = []
+        for crop in crops:
+            try:
+                service = self.get(crop)
+            except Exception:
+                logger.exception("Could not preload the %s model", crop)
+                continue
+            service.share_memory()
+            loaded.append(crop)
+        return loaded
+
+    def clear(self):
+        with self._lock:
+            self._services.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "swaps": self.swaps,
+                "resident": list(self._services),
+                "max_size": self.max_size,
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    """Return the process-wide ModelRegistry, creating it on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(max_size=settings.PREDICTION_MODEL_CACHE_SIZE, configs=model_configs())
+    return _registry
@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from .exceptions import ModelManifestError
+from .model_manifest import load_manifest
+from .model_registry import get_model_registry
+from .warmup import warm_up_service
+
+logger = logging.getLogger(__name__)
+
+
+def apply_model_configs(configs, registry=None):
+    """Move the registry onto new model configurations, returning the crops whose loaded model was replaced.
+
+    A loaded crop whose configuration changed gets its new model loaded, checked and warmed
+    in the calling thread while the old one keeps serving, then swapped in. If the new model
+    fails to load the old one stays in service. Crops that aren't loaded just pick up the
+    new configuration on first use.
+    """
+    registry = registry or get_model_registry()
+    swapped = []
+    for crop, config in configs.items():
+        if registry.model_config(crop) == config:
+            continue
+        # Hold the crop's load lock so a concurrent first load can't race the replacement.
+        with registry.load_lock(crop):
+            if not registry.is_resident(crop):
+                registry.set_config(crop, config)
+                continue
+            try:
+                service = registry.build_service(crop, config)
+                if settings.PREDICTION_WARMUP:
+                    warm_up_service(service)
+            except Exception:
+                logger.exception("Could not load %s model %s, keeping the current one", crop, config.get("version"))
+                continue
+            registry.swap(crop, service, config)
+        logger.info("Swapped in %s model %s", crop, config.get("version"))
+        swapped.append(crop)
+    return swapped
+
+
+class ModelManifestWatcher:
+    """Polls the model manifest and hot-swaps models whenever it changes.
+
+    Publishing a model means copying its weights next to the manifest and then rewriting
+    the manifest (ideally by renaming a new file over it); every worker process notices the
+    change within ``interval`` seconds, without a restart.
+    """
+
+    def __init__(self, path, interval=30, registry=None):
+        self.path = Path(path)
+        self.interval = interval
+        self.registry = registry
+        self.version = None
+        self._signature = None
+        self._stop = threading.Event()
+
+    def _stat(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def check(self):
+        """Reload the manifest if the file changed since the last check, returning the swapped crops."""
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return []
+        try:
+            version, configs = load_manifest(self.path)
+        except ModelManifestError:
+            # Possibly caught mid-write; the next change of the file triggers another attempt.
+            logger.exception("Could not reload the model manifest")
+            self._signature = signature
+            return []
+        self._signature = signature
+        swapped = apply_model_configs(configs, self.registry)
+        if version != self.version:
+            logger.info("Model manifest version %s is live", version)
+            self.version = version
+        return swapped
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Model manifest check failed")
+
+    def stop(self):
+        self._stop.set()
+
+
+_watcher = None
+_watcher_pid = None
+_watcher_lock = threading.Lock()
+
+
+def start_manifest_watcher():
+    """Start watching PREDICTION_MODEL_MANIFEST in this process, once; a no-op when no manifest is configured."""
+    global _watcher, _watcher_pid
+    if not settings.PREDICTION_MODEL_MANIFEST:
+        return None
+    with _watcher_lock:
+        # Threads do not survive a fork, so each process starts its own watcher.
+        if _watcher is None or _watcher_pid != os.getpid():
+            _watcher = ModelManifestWatcher(
+                settings.PREDICTION_MODEL_MANIFEST, settings.PREDICTION_MODEL_MANIFEST_POLL_INTERVAL,
+            )
+            _watcher_pid = os.getpid()
+            threading.Thread(target=_watcher.run, name="model-manifest-watcher", daemon=True).start()
+    return _watcher
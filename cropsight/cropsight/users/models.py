@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 from django.core.validators import RegexValidator
 from typing import ClassVar
 
@@ -167,13 +168,26 @@ class UserProfile(models.Model):
 
 
 class CropPrediction(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='crop_images/')
+    # Null for predictions made without signing in.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    image = models.ImageField(upload_to='crop_images/', blank=True)
+    thumbnail = models.ImageField(upload_to='crop_images/thumbnails/', blank=True)
+    image_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
     predicted_crop = models.CharField(max_length=100)
+    disease_class = models.CharField(max_length=100, blank=True)
     confidence = models.DecimalField(max_digits=10, decimal_places=2)
-    predicted_at = models.DateTimeField(auto_now_add=True)
+    model_version = models.CharField(max_length=255, blank=True)
+    latency_ms = models.FloatField(null=True, blank=True)
+    # Set when the prediction is made; rows are inserted later in batches.
+    predicted_at = models.DateTimeField(default=timezone.now)
     correct_prediction = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Serves the newest-first, keyset-paginated prediction history of a user.
+            models.Index(fields=['user', '-predicted_at', '-id'], name='cropprediction_user_history'),
+        ]
+
     def __str__(self):
-        return self.user.phone_number
+        return f"{self.predicted_crop}: {self.disease_class}"
     
\ No newline at end of file
@@ -0,0 +1,68 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .embedding_index import index_embedding
+
+
+class PredictionResultCache:
+    """Cache PredictionResponseData by uploaded image content and model version.
+
+    Resubmitting the same photo (mobile retries, reopening the app) returns the
+    stored result without decoding the image or running the model again.
+    """
+
+    key_prefix = "prediction"
+
+    def __init__(self, timeout=None):
+        self.timeout = settings.PREDICTION_CACHE_TIMEOUT if timeout is None else timeout
+
+    @property
+    def enabled(self):
+        return self.timeout > 0
+
+    @staticmethod
+    def image_digest(image_file):
+        """Return the SHA-256 of an uploaded file, leaving it rewound for decoding."""
+        digest = hashlib.sha256()
+        image_file.seek(0)
+        # Uploads read in chunks; plain file objects such as BytesIO are read whole.
+        for chunk in image_file.chunks() if hasattr(image_file, "chunks") else [image_file.read()]:
+            digest.update(chunk)
+        image_file.seek(0)
+        return digest.hexdigest()
+
+    def make_key(self, image_digest, model_version):
+        return f"{self.key_prefix}:{model_version}:{image_digest}"
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        return cache.get(key)
+
+    def set(self, key, result):
+        if self.enabled:
+            cache.set(key, result, self.timeout)
+
+
+def predict_with_cache(service, image_file, result_cache=None, image_digest=None):
+    """Run service.predict through the result cache, returning the result and whether it was a cache hit.
+
+    Pass ``image_digest`` when the caller has already hashed the image. Services that
+    compute embeddings have a freshly computed one added to the similar-case index.
+    """
+    result_cache = result_cache or PredictionResultCache()
+    image_digest = image_digest or result_cache.image_digest(image_file)
+    cache_key = result_cache.make_key(image_digest, service.model_version)
+    result = result_cache.get(cache_key)
+    if result is not None:
+        return result, True
+
+    if getattr(service, "embeddings", False):
+        result, embedding = service.predict_with_embedding(image_file)
+        index_embedding(result.crop or service.crop, result.model_version, image_digest, embedding)
+    else:
+        result = service.predict(image_file)
+    result_cache.set(cache_key, result)
+    return result, False
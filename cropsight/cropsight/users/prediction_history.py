@@ -0,0 +1,50 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+from .dtos.response.response_dataclass import PredictionHistoryItemData, PredictionHistoryPageData
+from .exceptions import InvalidCursorError
+from .models import CropPrediction
+
+# Only the columns a history row shows are read.
+HISTORY_FIELDS = ("id", "predicted_crop", "disease_class", "confidence", "predicted_at", "thumbnail")
+
+
+def encode_cursor(prediction):
+    """Return an opaque cursor pointing just past ``prediction`` in newest-first order."""
+    position = f"{prediction.predicted_at.isoformat()}|{prediction.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Return the (predicted_at, id) position a cursor points past, raising InvalidCursorError if malformed."""
+    try:
+        predicted_at, _, prediction_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode().partition("|")
+        return datetime.fromisoformat(predicted_at), int(prediction_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursorError("Invalid cursor") from None
+
+
+def get_prediction_history(user, cursor=None, limit=20):
+    """Return one page of a user's predictions, newest first, with the cursor of the next page.
+
+    Pages are found by seeking the (user, predicted_at, id) index past the cursor's
+    position, so every page costs the same however far back it is.
+    """
+    predictions = CropPrediction.objects.filter(user=user)
+    if cursor:
+        predicted_at, prediction_id = decode_cursor(cursor)
+        # The plain bound on predicted_at lets the database range-scan the index; the OR
+        # then breaks ties between predictions made at the same instant by id.
+        predictions = predictions.filter(predicted_at__lte=predicted_at).filter(
+            Q(predicted_at__lt=predicted_at) | Q(id__lt=prediction_id)
+        )
+    # One extra row tells whether there is a next page.
+    page = list(predictions.order_by("-predicted_at", "-id").only(*HISTORY_FIELDS)[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return PredictionHistoryPageData(
+        results=[PredictionHistoryItemData.generate_response(prediction) for prediction in page[:limit]],
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,176 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+from .models import CropPrediction
+
+logger = logging.getLogger(__name__)
+
+ImageAttachment = namedtuple("ImageAttachment", ["image_sha256", "image_name", "thumbnail_name"])
+
+
+class PredictionRecorder:
+    """Write-behind buffer that inserts CropPrediction rows in batches off the request path.
+
+    ``record`` only enqueues; a background thread bulk-inserts whatever is queued every
+    ``flush_interval`` seconds, or sooner once ``batch_size`` rows are waiting. The queue is
+    bounded: when the database can't keep up, new records are dropped and counted rather
+    than holding memory or slowing predictions down. Stored images are attached to their
+    rows through the same queue, so the rows they update are always written first.
+    """
+
+    def __init__(self, max_queue_size=10000, batch_size=200, flush_interval=2.0):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def record(self, **fields):
+        """Queue a CropPrediction built from ``fields``, returning False if it had to be dropped."""
+        return self._put(CropPrediction(**fields))
+
+    def attach_image(self, image_sha256, image_name, thumbnail_name):
+        """Queue pointing the predictions of an image at its stored copy, once the rows queued before are written."""
+        return self._put(ImageAttachment(image_sha256, image_name, thumbnail_name))
+
+    def _put(self, item):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # Log the first drop and then every thousandth, not one line per request.
+            if dropped % 1000 == 1:
+                logger.warning("Prediction log queue is full, %d records dropped so far", dropped)
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so the writer is started lazily per process.
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+                if self._worker_pid != os.getpid():
+                    # Rows queued before a fork belong to the parent, which writes them itself.
+                    self._queue = queue.Queue(maxsize=self.max_queue_size)
+                    self._flush_lock = threading.Lock()
+                self._worker = threading.Thread(target=self._run, name="prediction-log-writer", daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Insert everything queued so far, in batches; called by the writer thread and on shutdown."""
+        with self._flush_lock:
+            while True:
+                items = []
+                while len(items) < self.batch_size:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not items:
+                    return
+                # Keep queue order: an attachment must see the rows recorded before it.
+                rows = []
+                for item in items:
+                    if isinstance(item, ImageAttachment):
+                        self._write(rows)
+                        rows = []
+                        self._attach(item)
+                    else:
+                        rows.append(item)
+                self._write(rows)
+
+    def _write(self, rows):
+        if not rows:
+            return
+        close_old_connections()
+        try:
+            CropPrediction.objects.bulk_create(rows)
+        except DatabaseError:
+            with self._lock:
+                self.failed += len(rows)
+            logger.exception("Could not write %d prediction records, discarding them", len(rows))
+        else:
+            with self._lock:
+                self.written += len(rows)
+
+    def _attach(self, attachment):
+        close_old_connections()
+        try:
+            CropPrediction.objects.filter(image_sha256=attachment.image_sha256, image="").update(
+                image=attachment.image_name, thumbnail=attachment.thumbnail_name,
+            )
+        except DatabaseError:
+            logger.exception("Could not attach the stored image %s", attachment.image_name)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_prediction_recorder():
+    """Return the process-wide PredictionRecorder, creating it on first use."""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = PredictionRecorder(
+                    max_queue_size=settings.PREDICTION_LOG_QUEUE_SIZE,
+                    batch_size=settings.PREDICTION_LOG_BATCH_SIZE,
+                    flush_interval=settings.PREDICTION_LOG_FLUSH_INTERVAL,
+                )
+                atexit.register(flush_prediction_log)
+    return _recorder
+
+
+def record_prediction(**fields):
+    """Queue a prediction for the history table unless PREDICTION_LOG_ENABLED is off."""
+    if settings.PREDICTION_LOG_ENABLED:
+        get_prediction_recorder().record(**fields)
+
+
+def flush_prediction_log():
+    """Write out queued predictions, e.g. when a worker process shuts down."""
+    if _recorder is not None:
+        _recorder.flush()
+
+
+def attach_prediction_image(image_sha256, image_name, thumbnail_name):
+    """Point the recorded predictions of an image at its stored copy and thumbnail."""
+    if settings.PREDICTION_LOG_ENABLED:
+        get_prediction_recorder().attach_image(image_sha256, image_name, thumbnail_name)
@@ -1,11 +1,31 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torchvision import transforms
-from PIL import Image
-from .exceptions import UndefinedDiseaseError
+from PIL import Image, ImageOps
+from .batching import BatchingEngine
+from .execution import AUTO, DEFAULT, available_modes, prepare_model, run_model, select_fastest_mode, uses_bf16
+from .exceptions import (
+    ExplanationUnavailableError, ImageQualityError, ModelClassesError, ModelFusionError, UndefinedDiseaseError,
+)
+from .image_quality import check_image_quality
+from .inference_backends import EAGER, file_checksum, load_exported_model
+from .metrics import observe_stage, observe_stages
 from .dtos.response.response_dataclass import PredictionResponseData
-from .models import Products
+from .model_fusion import fuse_for_inference, verify_fusion
+from .quantization import load_calibration_batches, quantize_model
+from .recommendations import recommend_products
+
+logger = logging.getLogger(__name__)
+
+# Height and width the models were trained on.
+INPUT_SIZE = (224, 224)
+# Predictions below this confidence (in percent) are rejected as unclear images.
+CONFIDENCE_THRESHOLD = 75
 
 class CNNModel(nn.Module):
     def __init__(self, n_classes):
@@ -48,50 +68,353 @@ class CNNModel(nn.Module):
         x = self.fc_layers(x)
         return x
 
+class CombinedCNNModel(nn.Module):
+    """Smaller network behind comb_cnn_model_state_dict.pth, trained on images of all crops."""
+
+    def __init__(self, n_classes):
+        super(CombinedCNNModel, self).__init__()
+        self.conv_layers = nn.Sequential(
+            nn.Conv2d(3, 32, kernel_size=3, padding=1),
+            nn.BatchNorm2d(32),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+
+            nn.Conv2d(32, 64, kernel_size=3, padding=1),
+            nn.BatchNorm2d(64),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+
+            nn.Conv2d(64, 64, kernel_size=3, padding=1),
+            nn.BatchNorm2d(64),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+
+            nn.Conv2d(64, 64, kernel_size=3, padding=1),
+            nn.BatchNorm2d(64),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+            nn.AdaptiveAvgPool2d((1, 1))
+        )
+
+        self.fc_layers = nn.Sequential(
+            nn.Flatten(),
+            nn.Linear(64, 64),
+            nn.BatchNorm1d(64),
+            nn.ReLU(),
+            nn.Dropout(0.4),
+            nn.Linear(64, n_classes)
+        )
+
+    def forward(self, x):
+        x = self.conv_layers(x)
+        x = self.fc_layers(x)
+        return x
+
+class EmbeddingModel(nn.Module):
+    """Runs a CNN in two steps, returning its logits followed by its penultimate-layer activations."""
+
+    def __init__(self, model):
+        super().__init__()
+        # Shares the wrapped model's (possibly fused) layers.
+        self.features = nn.Sequential(model.conv_layers, *list(model.fc_layers)[:-1])
+        self.head = model.fc_layers[-1]
+
+    def forward(self, x):
+        embedding = self.features(x)
+        return torch.cat([self.head(embedding), embedding], dim=1)
+
+def split_at_global_pool(model):
+    """Split a CNN into its spatial feature extractor and everything from the global pooling on, or return None."""
+    layers = [*getattr(model, "conv_layers", []), *getattr(model, "fc_layers", [])]
+    for index, layer in enumerate(layers):
+        if isinstance(layer, nn.AdaptiveAvgPool2d):
+            return nn.Sequential(*layers[:index]), nn.Sequential(*layers[index:])
+    return None
+
+MODEL_ARCHITECTURES = {
+    "cnn": CNNModel,
+    "combined": CombinedCNNModel,
+}
+
 class PredictionService:
-    def __init__(self, model_path, class_names, device=None):
+    def __init__(self, model_path, class_names, device=None, max_batch_size=1, max_batch_wait_ms=0,
+                 quantize=False, calibration_dir=None, backend=EAGER, fuse=True, architecture="cnn",
+                 check_quality=False, execution_mode=DEFAULT, version=None, crop=None):
         """Initialize the PredictionService with the model and configurations."""
         self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.crop = crop
         self.class_names = class_names
-        self.model = self._load_model(model_path)
         self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
+            transforms.Resize(INPUT_SIZE),
             transforms.ToTensor(),
             transforms.Normalize([0.5, 0.5, 0.5], [0.5, 0.5, 0.5])
         ])
+        self.backend = backend
+        self.fuse = fuse
+        self.architecture = architecture
+        self.check_quality = check_quality
+        self.model = self._load_model(model_path)
+        self._check_class_count(model_path)
+        self.quantized = False
+        if quantize:
+            self._quantize_model(calibration_dir)
+        self.execution_mode = self._select_execution_mode(execution_mode)
+        # Identifies the weights and execution mode, e.g. for keying cached results, prefixed
+        # with the release version from the model manifest when there is one.
+        self.model_version = (
+            f"{f'{version}-' if version else ''}{file_checksum(model_path)[:12]}-{self.backend}"
+            f"{'-int8' if self.quantized else ''}{'-bf16' if uses_bf16(self.execution_mode) else ''}"
+        )
+        # Eager models also yield the image embedding (the input of the last layer) with each
+        # single-image prediction, for finding similar past cases.
+        self.embeddings = (
+            self.backend == EAGER and not self.quantized
+            and isinstance(getattr(self.model, "fc_layers", None), nn.Sequential)
+        )
+        self._embedding_model = EmbeddingModel(self.model) if self.embeddings else None
+        # Grad-CAM needs gradients through the last spatial feature map, which exported and
+        # quantized models don't provide.
+        self._gradcam_layers = (
+            split_at_global_pool(self.model) if self.backend == EAGER and not self.quantized else None
+        )
+        # Concurrent requests share forward passes when batching is enabled.
+        self.batcher = (
+            BatchingEngine(self._request_forward, max_batch_size, max_batch_wait_ms) if max_batch_size > 1 else None
+        )
+
+    def _check_class_count(self, model_path):
+        """Fail unless the model has one output per class name; exported models skip the state dict's shape check."""
+        with torch.no_grad():
+            outputs = self.model(torch.zeros(1, 3, *INPUT_SIZE, device=self.device)).shape[-1]
+        if outputs != len(self.class_names):
+            msg = f"The model at {model_path} has {outputs} outputs for {len(self.class_names)} class names"
+            raise ModelClassesError(msg)
 
     def _load_model(self, model_path):
-        """Load the trained model from the specified path."""
-        model = CNNModel(n_classes=len(self.class_names))
+        """Load the trained model from the specified path, preferring the configured exported backend."""
+        model = load_exported_model(self.backend, model_path, self.device)
+        if model is not None:
+            return model
+        self.backend = EAGER
+        model = MODEL_ARCHITECTURES[self.architecture](n_classes=len(self.class_names))
 
         model.load_state_dict(torch.load(model_path, map_location=self.device, weights_only=True))
         model.to(self.device)
         model.eval()
+        if self.fuse:
+            model = self._fuse_model(model)
         return model
 
-    def _preprocess_image(self, image_file):
-        """Preprocess the input image for model inference."""
+    def _fuse_model(self, model):
+        """Fold BatchNorm into the preceding Conv/Linear layers, keeping the original model if outputs diverge."""
+        fused = fuse_for_inference(model)
+        try:
+            verify_fusion(model, fused, torch.randn(2, 3, *INPUT_SIZE, device=self.device))
+        except ModelFusionError:
+            logger.exception("BatchNorm fusion changed the model outputs, using the unfused model")
+            return model
+        return fused
+
+    def _quantize_model(self, calibration_dir):
+        """Swap the fp32 model for an INT8 one calibrated on the images in calibration_dir."""
+        if self.backend != EAGER:
+            logger.warning("INT8 quantization only applies to the eager backend, keeping %s", self.backend)
+            return
+        if self.device.type != "cpu":
+            logger.warning("INT8 inference is only supported on CPU, keeping the fp32 model on %s", self.device)
+            return
+        calibration_batches = load_calibration_batches(calibration_dir, self.transform) if calibration_dir else []
+        if not calibration_batches:
+            logger.warning("No calibration images found in %s, keeping the fp32 model", calibration_dir)
+            return
+        self.model = quantize_model(self.model, calibration_batches)
+        self.quantized = True
+
+    def _select_execution_mode(self, requested):
+        """Apply the requested execution mode, or with AUTO time the modes this host supports and keep the fastest."""
+        modes = available_modes(self.model, self.device, quantized=self.quantized)
+        if requested != AUTO:
+            if requested not in modes:
+                logger.warning("%s execution is not available for this model, using %s", requested, DEFAULT)
+                requested = DEFAULT
+            prepare_model(self.model, requested)
+            return requested
+        if len(modes) == 1:
+            return modes[0]
+        mode, timings = select_fastest_mode(self.model, modes, torch.randn(1, 3, *INPUT_SIZE, device=self.device))
+        logger.info(
+            "Selected %s execution for the %s model (%s)", mode, self.architecture,
+            ", ".join(f"{name}: {seconds * 1000:.1f} ms" for name, seconds in timings.items()),
+        )
+        return mode
+
+    def share_memory(self):
+        """Move eager model weights into shared memory so processes forked after loading reuse them.
+
+        Exported backends keep their weights as constants of the frozen graph or ONNX session,
+        which forked processes still share copy-on-write as long as nothing writes to them.
+        """
+        if isinstance(self.model, torch.nn.Module):
+            self.model.share_memory()
+
+    def close(self):
+        """Stop batching once this service has been replaced; requests still holding it run unbatched."""
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def _decode_image(self, image_file):
+        """Decode an uploaded image to an upright RGB image, as close to the model input size as possible."""
         image = Image.open(image_file)
-        image_for_plotting = image.copy()
+        # JPEGs are decoded at 1/2, 1/4 or 1/8 scale when that still covers INPUT_SIZE, which
+        # avoids decoding 12+ MP phone photos at full resolution. Other formats ignore this.
+        image.draft("RGB", INPUT_SIZE)
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return image
+
+    def _preprocess_image(self, image_file, timings=None):
+        """Preprocess the input image for model inference, recording decode and transform time.
+
+        With check_quality, images that are too dark, blurry or leafless raise ImageQualityError
+        here, before any inference is spent on them.
+        """
+        timings = {} if timings is None else timings
+        start = time.perf_counter()
+        image = self._decode_image(image_file)
+        decoded = time.perf_counter()
+        if self.check_quality:
+            check_image_quality(image)
+        checked = time.perf_counter()
         image = self.transform(image).unsqueeze(0)  # Add batch dimension
-        return image, image_for_plotting
+        timings["decode"] = decoded - start
+        timings["quality"] = checked - decoded
+        timings["transform"] = time.perf_counter() - checked
+        return image
+
+    def _forward(self, batch):
+        """Run a batch of preprocessed images through the model and return class probabilities."""
+        with torch.inference_mode():
+            output = run_model(self.model, batch.to(self.device), self.execution_mode)
+            return F.softmax(output, dim=1)
+
+    def _request_forward(self, batch):
+        """Forward pass for single-image requests: class probabilities, followed by the embeddings if enabled."""
+        if not self.embeddings:
+            return self._forward(batch)
+        with torch.inference_mode():
+            output = run_model(self._embedding_model, batch.to(self.device), self.execution_mode)
+        n_classes = len(self.class_names)
+        return torch.cat([F.softmax(output[:, :n_classes], dim=1), output[:, n_classes:]], dim=1)
+
+    def _classify(self, image_file, timings=None):
+        """Preprocess an image and run it through _request_forward, batching with concurrent requests if enabled."""
+        if self.batcher is None:
+            image = self._preprocess_image(image_file, timings)
+            start = time.perf_counter()
+            output = self._request_forward(image)
+            if timings is not None:
+                timings["forward"] = time.perf_counter() - start
+            return output
+        with self.batcher.track():
+            image = self._preprocess_image(image_file, timings)
+            return self.batcher.submit(image, timings)
+
+    def classify_with_embedding(self, image_file):
+        """Return the most likely class name, its confidence as a percentage and the image embedding (or None)."""
+        timings = {}
+        output = self._classify(image_file, timings)
+        logger.debug(
+            "Decoded image in %.1f ms, checked quality in %.1f ms, transformed in %.1f ms",
+            timings["decode"] * 1000, timings["quality"] * 1000, timings["transform"] * 1000,
+        )
+        observe_stages(timings, self.crop, self.model_version)
+        n_classes = len(self.class_names)
+        confidences, predicted = output[:, :n_classes].max(1)
+        embedding = output[0, n_classes:].cpu().numpy() if self.embeddings else None
+        return self.class_names[predicted.item()], confidences.item() * 100, embedding
+
+    def classify(self, image_file):
+        """Return the most likely class name for an image and its confidence as a percentage."""
+        predicted_class, confidence, _ = self.classify_with_embedding(image_file)
+        return predicted_class, confidence
+
+    def predict_batch(self, image_files, batch_size=8, decode_workers=4):
+        """Classify many images, yielding (index, class name, confidence, error) as each batched forward pass completes.
+
+        Images are decoded in parallel threads; ones that fail to decode or the quality check are
+        reported with an error instead.
+        """
+        def preprocess(image_file):
+            try:
+                return self._preprocess_image(image_file)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=decode_workers) as pool:
+            pending = []
+            for index, image in enumerate(pool.map(preprocess, image_files)):
+                if isinstance(image, ImageQualityError):
+                    yield index, None, None, str(image)
+                    continue
+                if isinstance(image, Exception):
+                    yield index, None, None, f"Cannot read image: {image}"
+                    continue
+                pending.append((index, image))
+                if len(pending) == batch_size:
+                    yield from self._classify_pending(pending)
+                    pending = []
+            if pending:
+                yield from self._classify_pending(pending)
+
+    def _classify_pending(self, pending):
+        probs = self._forward(torch.cat([image for _, image in pending]))
+        confidences, predicted = probs.max(1)
+        for (index, _), class_index, confidence in zip(pending, predicted.tolist(), confidences.tolist()):
+            yield index, self.class_names[class_index], confidence * 100, None
+
+    def explain(self, image_file, class_name):
+        """Return the decoded image and its Grad-CAM heatmap for ``class_name``, scaled to 0-1.
+
+        The heatmap has the resolution of the last feature map (14x14 for CNNModel). This takes
+        a backward pass, so it only runs on request for a stored prediction, never while
+        predicting. Raises ExplanationUnavailableError for exported and quantized models.
+        """
+        if self._gradcam_layers is None:
+            raise ExplanationUnavailableError("Explanations are not available for this model")
+        features_model, head = self._gradcam_layers
+        image = self._decode_image(image_file)
+        batch = self.transform(image).unsqueeze(0).to(self.device)
+        with torch.no_grad():
+            features = features_model(batch)
+        features.requires_grad_()
+        with torch.enable_grad():
+            score = head(features)[0, self.class_names.index(class_name)]
+            # Gradients w.r.t. the feature map only; the shared weights' .grad stays untouched.
+            gradients, = torch.autograd.grad(score, features)
+        weights = gradients.mean(dim=(2, 3), keepdim=True)
+        cam = F.relu((weights * features.detach()).sum(dim=1))[0]
+        return image, (cam / cam.max().clamp(min=1e-12)).cpu().numpy()
 
     def predict(self, image_file):
         """Run prediction on the given image file and return results."""
-        image, image_for_plotting = self._preprocess_image(image_file)
-        image = image.to(self.device)
+        return self.predict_with_embedding(image_file)[0]
 
-        with torch.no_grad():
-            output = self.model(image)
-            probs = F.softmax(output, dim=1)
-            confidences, predicted = probs.max(1)
+    def predict_with_embedding(self, image_file):
+        """Return the prediction response for an image together with its embedding, which is None unless enabled."""
+        predicted_class, confidence, embedding = self.classify_with_embedding(image_file)
+        return self.build_response(predicted_class, confidence), embedding
 
-        predicted_class = self.class_names[predicted.item()]
-        confidence = confidences.item() * 100
-        if confidence < 75:
+    def build_response(self, predicted_class, confidence):
+        """Build the prediction response, with care advice and products, for a predicted class."""
+        if confidence < CONFIDENCE_THRESHOLD:
             raise UndefinedDiseaseError("Cannot classify, please upload a clear image")
+        # Models trained on several crops name their classes "<crop>/<disease>".
+        crop, _, predicted_class = predicted_class.rpartition("/")
 
-        products = Products.objects.filter(category__name=predicted_class).order_by('?')[:10]
+        start = time.perf_counter()
+        products = recommend_products(predicted_class)
+        observe_stage("product_lookup", time.perf_counter() - start, self.crop, self.model_version)
         additional_info_message = ''
         # 'Late_Blight'['Brown_Rust', 'Healthy', 'Yellow_Rust']bacterial_blight', 'curl_virus', 'fussarium_wilt', 'healthy'
         if predicted_class == "healthy" or predicted_class == "Healthy":
@@ -172,4 +495,4 @@ class PredictionService:
                 "- Ensure good plant nutrition to improve resistance."
             )
 
-        return PredictionResponseData.generate_response(predicted_class, confidence, additional_info_message, products)
+        return PredictionResponseData.generate_response(predicted_class, confidence, additional_info_message, products, crop=crop or None, model_version=self.model_version)
@@ -0,0 +1,44 @@
+import copy
+import logging
+from pathlib import Path
+
+import torch
+from PIL import Image
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx
+from torch.ao.quantization.quantize_fx import prepare_fx
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def load_calibration_batches(directory, transform, limit=64, batch_size=8):
+    """Load up to ``limit`` images from a directory as preprocessed calibration batches."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    paths = sorted(path for path in directory.rglob("*") if path.suffix.lower() in CALIBRATION_EXTENSIONS)[:limit]
+    images = []
+    for path in paths:
+        with Image.open(path) as image:
+            images.append(transform(image.convert("RGB")))
+    return [torch.stack(images[i:i + batch_size]) for i in range(0, len(images), batch_size)]
+
+
+def quantize_model(model, calibration_batches, engine="x86"):
+    """Return an INT8 copy of an eval-mode model using static post-training quantization.
+
+    FX graph mode fuses the Conv/BN/ReLU stacks and the Linear head before inserting
+    observers, so the calibration passes only need to see representative inputs.
+    """
+    if not calibration_batches:
+        msg = "At least one calibration batch is required to quantize a model"
+        raise ValueError(msg)
+    torch.backends.quantized.engine = engine
+    model = copy.deepcopy(model).eval()
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), example_inputs=(calibration_batches[0],))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
@@ -0,0 +1,54 @@
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .dtos.response.response_dataclass import ProductData
+from .models import Categories, Products
+
+POOL_KEY_PREFIX = "product-pool"
+
+
+def _pool_key(category_name):
+    return f"{POOL_KEY_PREFIX}:{category_name}"
+
+
+def build_product_pool(category_name):
+    """Serialize the products recommended for a disease class, i.e. those in the category of that name.
+
+    Categories with more than PRODUCT_POOL_MAX_SIZE products get a random sample of them,
+    drawn afresh each time the pool is rebuilt, so every product gets recommended.
+    """
+    product_ids = list(Products.objects.filter(category__name=category_name).values_list("id", flat=True))
+    if len(product_ids) > settings.PRODUCT_POOL_MAX_SIZE:
+        product_ids = random.sample(product_ids, settings.PRODUCT_POOL_MAX_SIZE)
+    products = Products.objects.filter(id__in=product_ids).select_related("category")
+    return [ProductData.generate_response(product) for product in products]
+
+
+def refresh_product_pool(category_name):
+    pool = build_product_pool(category_name)
+    cache.set(_pool_key(category_name), pool, settings.PRODUCT_POOL_TIMEOUT)
+    return pool
+
+
+def refresh_product_pools():
+    """Rebuild the cached pool of every category, returning how many were refreshed."""
+    category_names = set(Categories.objects.values_list("name", flat=True))
+    for category_name in category_names:
+        refresh_product_pool(category_name)
+    return len(category_names)
+
+
+def get_product_pool(category_name):
+    """Return the cached pool for a disease class, building it on a miss."""
+    pool = cache.get(_pool_key(category_name))
+    if pool is None:
+        pool = refresh_product_pool(category_name)
+    return pool
+
+
+def recommend_products(category_name, count=10):
+    """Draw up to ``count`` random products for a disease class from its precomputed pool."""
+    pool = get_product_pool(category_name)
+    return random.sample(pool, min(count, len(pool)))
@@ -0,0 +1,65 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Categories, Products
+from .recommendations import refresh_product_pool
+
+
+# Categories whose pools this thread has to rebuild once its transaction commits.
+_pending = threading.local()
+
+
+def _refresh_pending_pools():
+    # The first callback of a commit takes every pending category; later ones find none left.
+    category_names = getattr(_pending, "category_names", set())
+    _pending.category_names = set()
+    for category_name in category_names:
+        refresh_product_pool(category_name)
+
+
+def schedule_pool_refresh(*category_names):
+    """Rebuild the pools of these categories when the current transaction commits (at once outside one).
+
+    Each pool is rebuilt once per transaction however often its category changes. Names
+    left by a rolled-back transaction are rebuilt with the next commit, which is harmless.
+    """
+    category_names = {name for name in category_names if name is not None}
+    if not category_names:
+        return
+    if not hasattr(_pending, "category_names"):
+        _pending.category_names = set()
+    _pending.category_names.update(category_names)
+    transaction.on_commit(_refresh_pending_pools)
+
+
+def _category_name(category_id):
+    return Categories.objects.filter(pk=category_id).values_list("name", flat=True).first()
+
+
+@receiver(pre_save, sender=Products)
+def remember_previous_category(sender, instance, **kwargs):
+    """Note the category a product is moving out of, whose pool also needs rebuilding."""
+    if instance.pk is not None:
+        instance.previous_category_name = (
+            Products.objects.filter(pk=instance.pk).values_list("category__name", flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Products)
+def refresh_pools_on_product_change(sender, instance, **kwargs):
+    schedule_pool_refresh(getattr(instance, "previous_category_name", None), _category_name(instance.category_id))
+
+
+@receiver(pre_save, sender=Categories)
+def remember_previous_name(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance.previous_name = _category_name(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Categories)
+def refresh_pools_on_category_change(sender, instance, **kwargs):
+    # A renamed category's products leave the pool of the old name.
+    schedule_pool_refresh(getattr(instance, "previous_name", None), instance.name)
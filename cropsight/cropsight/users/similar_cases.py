@@ -0,0 +1,36 @@
+from .dtos.response.response_dataclass import SimilarCaseData
+from .embedding_index import get_embedding_index
+from .models import CropPrediction
+
+# Neighbours fetched per requested case, leaving room for images whose predictions aren't recorded yet.
+CANDIDATES_PER_CASE = 4
+CASE_FIELDS = ("id", "image_sha256", "predicted_crop", "disease_class", "confidence", "predicted_at", "thumbnail")
+
+
+def find_similar_cases(prediction, limit=10):
+    """Return up to ``limit`` past predictions whose images look most like this prediction's image.
+
+    Neighbours are searched among the embeddings of the same crop and model version, one
+    case per distinct image, most similar first. Returns an empty list while the
+    prediction's own embedding hasn't reached the index yet.
+    """
+    index = get_embedding_index(prediction.predicted_crop, prediction.model_version)
+    query = index.vector(prediction.image_sha256) if prediction.image_sha256 else None
+    if query is None:
+        return []
+    similarity = {
+        key: score for key, score in index.search(query, k=limit * CANDIDATES_PER_CASE + 1)
+        if key != prediction.image_sha256
+    }
+    cases = {}
+    rows = (
+        CropPrediction.objects.filter(
+            image_sha256__in=similarity, predicted_crop=prediction.predicted_crop,
+        )
+        .order_by("-predicted_at", "-id")
+        .only(*CASE_FIELDS)
+    )
+    for row in rows:
+        cases.setdefault(row.image_sha256, row)
+    ranked = sorted(cases.values(), key=lambda row: similarity[row.image_sha256], reverse=True)[:limit]
+    return [SimilarCaseData.generate_response(row, similarity[row.image_sha256]) for row in ranked]
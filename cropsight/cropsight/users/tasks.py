@@ -1,9 +1,64 @@
+import time
+from dataclasses import asdict
+
 from celery import shared_task
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 
+from .combined_prediction import COMBINED_MODEL, predict_any_crop
+from .embedding_index import compact_embedding_shards, train_embedding_centroids
+from .image_store import store_prediction_image
+from .model_registry import get_model_registry
 from .models import User
+from .prediction_cache import PredictionResultCache, predict_with_cache
+from .prediction_log import record_prediction
+from .recommendations import refresh_product_pools
 
 
 @shared_task()
 def get_users_count():
     """A pointless Celery task to demonstrate usage."""
     return User.objects.count()
+
+
+@shared_task()
+def predict_disease_task(crop, image_name, user_id=None):
+    """Predict the disease in an image staged by stage_job_image; routed to the inference queue.
+
+    The staged file is deleted once the prediction has run, whether or not it succeeded.
+    """
+    try:
+        with default_storage.open(image_name) as staged:
+            image = ContentFile(staged.read())
+    finally:
+        default_storage.delete(image_name)
+    image_digest = PredictionResultCache.image_digest(image)
+    start = time.perf_counter()
+    if crop == COMBINED_MODEL:
+        result, _ = predict_any_crop(image, image_digest)
+    else:
+        result, _ = predict_with_cache(get_model_registry().get(crop), image, image_digest=image_digest)
+    record_prediction(
+        user_id=user_id,
+        image_sha256=image_digest,
+        predicted_crop=result.crop or crop,
+        disease_class=result.disease_class,
+        confidence=result.confidence,
+        model_version=result.model_version or "",
+        latency_ms=(time.perf_counter() - start) * 1000,
+    )
+    store_prediction_image(image_digest, image)
+    return asdict(result)
+
+
+@shared_task()
+def refresh_product_pools_task():
+    """Rebuild the cached product recommendation pools; scheduled periodically by Celery beat."""
+    return refresh_product_pools()
+
+
+@shared_task()
+def compact_embedding_shards_task():
+    """Train the centroids of grown embedding partitions, then merge their shards; scheduled by Celery beat."""
+    train_embedding_centroids()
+    return compact_embedding_shards()
@@ -0,0 +1,110 @@
+import io
+import json
+import zipfile
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from PIL import PngImagePlugin
+from rest_framework.test import APIRequestFactory
+
+from cropsight.users.api.views import BatchPredictionApiView
+from cropsight.users.dtos.response.response_dataclass import PredictionResponseData
+
+
+def labelled(label):
+    """A small PNG carrying its expected prediction, e.g. "Late_Blight 90", as a text chunk."""
+    info = PngImagePlugin.PngInfo()
+    info.add_text("label", label)
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buffer, "PNG", pnginfo=info)
+    return buffer.getvalue()
+
+
+class LabelReadingService:
+    """Classifies each image by its label text chunk."""
+
+    def predict_batch(self, image_files, batch_size, decode_workers):
+        for index, image_file in enumerate(image_files):
+            label, confidence = Image.open(image_file).text["label"].split()
+            yield index, label, float(confidence), None
+
+    def build_response(self, predicted_class, confidence):
+        return PredictionResponseData.generate_response(predicted_class, confidence)
+
+
+@pytest.fixture(autouse=True)
+def _label_reading_model(fake_registry):
+    fake_registry.add("potato", LabelReadingService())
+
+
+def post_batch(data):
+    request = APIRequestFactory().post("/api/users/potato/predict/batch/", data, format="multipart")
+    response = BatchPredictionApiView.as_view()(request, crop="potato")
+    return response, [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+
+def test_images_are_streamed_with_a_plot_verdict():
+    images = [
+        SimpleUploadedFile("a.jpg", labelled("Late_Blight 90")),
+        SimpleUploadedFile("b.jpg", labelled("Healthy 95")),
+        SimpleUploadedFile("c.jpg", labelled("Late_Blight 80")),
+        SimpleUploadedFile("d.jpg", labelled("Healthy 40")),
+    ]
+    response, lines = post_batch({"images": images})
+
+    assert response["Content-Type"] == "application/x-ndjson"
+    assert [line["image"]["name"] for line in lines[:-1]] == ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+    assert lines[3]["image"]["error"]
+    summary = lines[-1]["summary"]
+    assert summary["classified_images"] == 3  # noqa: PLR2004
+    assert summary["class_counts"] == {"Late_Blight": 2, "Healthy": 1}
+    assert summary["verdict"]["disease_class"] == "Late_Blight"
+    assert summary["verdict"]["confidence"] == 85  # noqa: PLR2004
+
+
+def test_zip_archive_is_accepted():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("plot/1.png", labelled("Healthy 90"))
+        archive.writestr("plot/notes.txt", "ignored")
+    archive = SimpleUploadedFile("plot.zip", buffer.getvalue(), content_type="application/zip")
+
+    _, lines = post_batch({"archive": archive})
+
+    assert [line["image"]["name"] for line in lines[:-1]] == ["plot/1.png"]
+    assert lines[-1]["summary"]["verdict"]["disease_class"] == "Healthy"
+
+
+def test_too_many_images_are_rejected(settings):
+    settings.PREDICTION_BATCH_UPLOAD_MAX_IMAGES = 1
+    images = [SimpleUploadedFile(f"{index}.jpg", labelled("Healthy 90")) for index in range(2)]
+    request = APIRequestFactory().post("/api/users/potato/predict/batch/", {"images": images}, format="multipart")
+
+    response = BatchPredictionApiView.as_view()(request, crop="potato")
+
+    assert response.status_code == 400  # noqa: PLR2004
+
+
+def test_archive_decompressing_past_the_total_limit_is_rejected(settings):
+    settings.PREDICTION_BATCH_UPLOAD_MAX_BYTES = 1024
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for index in range(3):
+            archive.writestr(f"{index}.png", labelled("Healthy 90") + bytes(512))
+    archive = SimpleUploadedFile("plot.zip", buffer.getvalue(), content_type="application/zip")
+
+    request = APIRequestFactory().post("/api/users/potato/predict/batch/", {"archive": archive}, format="multipart")
+    response = BatchPredictionApiView.as_view()(request, crop="potato")
+
+    assert response.status_code == 400  # noqa: PLR2004
+    assert "in total" in json.loads(response.content)["error"]
+
+
+def test_combined_model_is_rejected():
+    images = [SimpleUploadedFile("a.jpg", labelled("Healthy 90"))]
+    request = APIRequestFactory().post("/api/users/combined/predict/batch/", {"images": images}, format="multipart")
+
+    response = BatchPredictionApiView.as_view()(request, crop="combined")
+
+    assert response.status_code == 400  # noqa: PLR2004
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+import torch
+
+from cropsight.users.batching import BatchingEngine
+
+
+class RecordingForward:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, batch):
+        self.batch_sizes.append(batch.shape[0])
+        return batch.sum(dim=(2, 3))
+
+
+def test_single_request_is_not_delayed():
+    forward = RecordingForward()
+    engine = BatchingEngine(forward, max_batch_size=8, max_wait_ms=10_000)
+    image = torch.ones(1, 3, 2, 2)
+    with engine.track():
+        result = engine.submit(image)
+    assert forward.batch_sizes == [1]
+    assert torch.equal(result, torch.full((1, 3), 4.0))
+
+
+def test_concurrent_requests_share_a_forward_pass():
+    forward = RecordingForward()
+    engine = BatchingEngine(forward, max_batch_size=4, max_wait_ms=1_000)
+    ready = threading.Barrier(4)
+    results = {}
+
+    def request(value):
+        with engine.track():
+            ready.wait()
+            results[value] = engine.submit(torch.full((1, 1, 1, 1), float(value)))
+
+    threads = [threading.Thread(target=request, args=(value,)) for value in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert forward.batch_sizes == [4]
+    assert all(results[value].item() == value for value in range(4))
+
+
+def test_forward_errors_are_raised_to_every_caller():
+    def failing_forward(batch):
+        msg = "boom"
+        raise RuntimeError(msg)
+
+    engine = BatchingEngine(failing_forward, max_batch_size=2, max_wait_ms=1)
+    with engine.track(), pytest.raises(RuntimeError, match="boom"):
+        engine.submit(torch.ones(1, 1, 1, 1))
+
+
+def test_closed_engine_stops_its_collector_and_runs_directly():
+    forward = RecordingForward()
+    engine = BatchingEngine(forward, max_batch_size=8, max_wait_ms=10)
+    with engine.track():
+        engine.submit(torch.ones(1, 1, 1, 1))
+    worker = engine._worker  # noqa: SLF001
+    engine.close()
+    worker.join(timeout=5)
+    assert not worker.is_alive()
+
+    with engine.track():
+        result = engine.submit(torch.ones(1, 1, 2, 2))
+    assert forward.batch_sizes == [1, 1]
+    assert torch.equal(result, torch.full((1, 1), 4.0))
+
+
+def test_queue_wait_and_forward_times_are_reported():
+    engine = BatchingEngine(lambda batch: batch * 2, max_batch_size=4, max_wait_ms=1)
+    timings = {}
+    engine.submit(torch.ones(1, 1, 1, 1), timings)
+    assert set(timings) == {"queue_wait", "forward"}
+    assert all(seconds >= 0 for seconds in timings.values())
@@ -0,0 +1,38 @@
+import pytest
+import torch
+
+from cropsight.users.benchmark import benchmark_service
+from cropsight.users.benchmark import compare_results
+from cropsight.users.benchmark import synthetic_images
+from cropsight.users.prediction_service import CNNModel
+from cropsight.users.prediction_service import PredictionService
+
+
+@pytest.fixture
+def prediction_service(tmp_path):
+    weights = tmp_path / "model.pth"
+    torch.save(CNNModel(n_classes=3).state_dict(), weights)
+    return PredictionService(weights, ["a", "b", "c"], device=torch.device("cpu"), check_quality=True)
+
+
+def test_benchmark_times_every_stage(prediction_service):
+    images = synthetic_images(3, size=(320, 240))
+    result = benchmark_service(prediction_service, images, batch_size=2, runs=2, include_products=False)
+    assert result["images"] == 6
+    assert result["batch_latency"]["count"] == 4
+    assert set(result["stages"]) == {"decode", "quality", "transform", "forward", "softmax"}
+    assert result["stages"]["decode"]["count"] == 6
+    assert result["throughput_per_s"] > 0
+
+
+def _report(p50_ms):
+    return {"results": [
+        {"crop": "potato", "backend": "eager", "threads": 2, "batch_size": 1, "batch_latency": {"p50_ms": p50_ms}},
+    ]}
+
+
+def test_compare_results_flags_regressions():
+    assert compare_results(_report(10.0), _report(10.5), tolerance=0.1) == []
+    (regression,) = compare_results(_report(10.0), _report(12.0), tolerance=0.1)
+    assert regression["crop"] == "potato"
+    assert regression["change"] == pytest.approx(0.2)
@@ -0,0 +1,42 @@
+import pytest
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+from cropsight.users.combined_prediction import predict_any_crop
+from cropsight.users.exceptions import UndefinedDiseaseError
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+
+
+def test_crop_is_identified_then_routed(fake_registry):
+    combined = fake_registry.add("combined", class_names=["cotton", "potato", "wheat"], label="wheat")
+    wheat = fake_registry.add("wheat", class_names=["Brown_Rust", "Healthy", "Yellow_Rust"], label="Yellow_Rust")
+
+    result, cache_hit = predict_any_crop(ContentFile(b"leaf"))
+    assert (result.crop, result.disease_class, cache_hit) == ("wheat", "Yellow_Rust", False)
+
+    result, cache_hit = predict_any_crop(ContentFile(b"leaf"))
+    assert cache_hit
+    assert combined.classifications == 1
+    assert wheat.predictions == 1
+
+
+def test_joint_model_answers_in_one_pass(fake_registry):
+    combined = fake_registry.add(
+        "combined", class_names=["potato/Healthy", "potato/Late_Blight"], label="potato/Late_Blight",
+    )
+
+    result, _ = predict_any_crop(ContentFile(b"leaf"))
+
+    assert (result.crop, result.disease_class) == ("potato", "Late_Blight")
+    assert combined.classifications == 0
+
+
+def test_unrecognised_crop_is_rejected(fake_registry):
+    fake_registry.add("combined", class_names=["cotton", "potato", "wheat"], label="potato", confidence=40.0)
+
+    with pytest.raises(UndefinedDiseaseError):
+        predict_any_crop(ContentFile(b"leaf"))
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import time
+
+import numpy as np
+import pytest
+from rest_framework.test import APIClient
+
+from cropsight.users import embedding_index
+from cropsight.users.embedding_index import EmbeddingIndex
+from cropsight.users.embedding_index import EmbeddingWriter
+from cropsight.users.embedding_index import compact_partition
+from cropsight.users.embedding_index import partition_dir
+from cropsight.users.embedding_index import shard_stems
+from cropsight.users.embedding_index import train_partition
+from cropsight.users.embedding_index import write_shard
+from cropsight.users.models import CropPrediction
+from cropsight.users.tests.factories import UserFactory
+
+
+def digest(index):
+    return hashlib.sha256(str(index).encode()).hexdigest()
+
+
+def random_vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, 256)).astype(np.float32)
+
+
+def test_search_returns_the_nearest_vectors(tmp_path):
+    vectors = random_vectors(300)
+    write_shard(tmp_path, [digest(i) for i in range(200)], vectors[:200])
+    write_shard(tmp_path, [digest(i) for i in range(200, 300)], vectors[200:])
+    index = EmbeddingIndex(tmp_path)
+    index.refresh()
+
+    query = vectors[250] + 0.1 * random_vectors(1, seed=1)[0]
+    results = index.search(query, k=5)
+    assert results[0][0] == digest(250)
+    assert results[0][1] > 0.9  # noqa: PLR2004
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    assert np.allclose(index.vector(digest(250)), vectors[250] / np.linalg.norm(vectors[250]), atol=1e-3)
+
+
+def test_keys_stored_twice_are_returned_once(tmp_path):
+    vectors = random_vectors(3)
+    write_shard(tmp_path, [digest(0), digest(1)], vectors[:2])
+    write_shard(tmp_path, [digest(0), digest(2)], np.stack([vectors[0], vectors[2]]))
+    index = EmbeddingIndex(tmp_path)
+    index.refresh()
+    assert sorted(key for key, _ in index.search(vectors[0], k=10)) == sorted(digest(i) for i in range(3))
+
+
+def test_compaction_merges_shards_and_readers_reload(tmp_path):
+    vectors = random_vectors(30)
+    for start in range(0, 30, 10):
+        write_shard(tmp_path, [digest(i) for i in range(start, start + 10)], vectors[start:start + 10])
+    index = EmbeddingIndex(tmp_path)
+    index.refresh()
+
+    assert compact_partition(tmp_path) == 3  # noqa: PLR2004
+    assert len(shard_stems(tmp_path)) == 1
+    index.refresh()
+    assert len(index) == 30  # noqa: PLR2004
+    assert index.search(vectors[7], k=1)[0][0] == digest(7)
+
+
+def test_large_index_searches_the_nearest_clusters(tmp_path):
+    # Well separated clusters, so probing a few lists finds the exact neighbour.
+    centers = random_vectors(16, seed=2) * 10
+    vectors = np.repeat(centers, 100, axis=0) + random_vectors(1600, seed=3)
+    write_shard(tmp_path, [digest(i) for i in range(1000)], vectors[:1000])
+    index = EmbeddingIndex(tmp_path, probes=4)
+    index.refresh()
+    assert not train_partition(tmp_path, min_vectors=1600)
+    write_shard(tmp_path, [digest(i) for i in range(1000, 1600)], vectors[1000:])
+
+    assert train_partition(tmp_path, min_vectors=1600)
+    assert not train_partition(tmp_path, min_vectors=1600)
+    (stem,) = shard_stems(tmp_path)
+    assert (tmp_path / f"{stem}.lists.npy").exists()
+    index.refresh()
+    assert index.centroids is not None
+    assert len(index) == 1600  # noqa: PLR2004
+    assert index.search(vectors[1234], k=1)[0][0] == digest(1234)
+
+
+def test_writer_flushes_a_shard_per_partition(tmp_path):
+    writer = EmbeddingWriter(tmp_path, shard_size=3)
+    vectors = random_vectors(3)
+    writer.add("potato", "v1-abc", digest(0), vectors[0])
+    writer.add("wheat", "v1-def", digest(1), vectors[1])
+    assert not list(tmp_path.iterdir())
+    writer.add("potato", "v1-abc", digest(2), vectors[2])
+
+    assert len(shard_stems(partition_dir("potato", "v1-abc", tmp_path))) == 1
+    assert len(shard_stems(partition_dir("wheat", "v1-def", tmp_path))) == 1
+
+
+def test_writer_flushes_waiting_embeddings_on_a_timer(tmp_path):
+    writer = EmbeddingWriter(tmp_path, shard_size=100, flush_interval=0.05)
+    writer.add("potato", "v1-abc", digest(0), random_vectors(1)[0])
+    directory = partition_dir("potato", "v1-abc", tmp_path)
+    deadline = time.monotonic() + 5
+    while not shard_stems(directory):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.django_db
+def test_similar_cases_are_predictions_of_the_same_crop(settings, tmp_path, monkeypatch):
+    settings.PREDICTION_EMBEDDING_DIR = str(tmp_path)
+    monkeypatch.setattr(embedding_index, "_indexes", {})
+    vectors = random_vectors(4)
+    vectors[1] = vectors[0] + 0.05
+    vectors[2] = vectors[0] + 0.1
+    write_shard(partition_dir("potato", "v1-abc"), [digest(i) for i in range(4)], vectors)
+
+    user = UserFactory(phone_number="+923001234567")
+    rows = {
+        index: CropPrediction.objects.create(
+            user=user if index == 0 else None, image_sha256=digest(index), predicted_crop="potato",
+            disease_class="Late_Blight", confidence=90, model_version="v1-abc",
+        )
+        for index in range(4)
+    }
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get(f"/api/users/predictions/{rows[0].id}/similar/", {"limit": 2})
+    cases = json.loads(response.content)["data"]
+    assert response.status_code == 200  # noqa: PLR2004
+    assert [case["id"] for case in cases] == [rows[1].id, rows[2].id]
+    assert "user" not in cases[0]
+
+    response = client.get(f"/api/users/predictions/{rows[1].id}/similar/")
+    assert response.status_code == 404  # noqa: PLR2004
@@ -0,0 +1,56 @@
+import pytest
+import torch
+
+from cropsight.users import execution
+from cropsight.users.execution import AUTO
+from cropsight.users.execution import BF16
+from cropsight.users.execution import CHANNELS_LAST
+from cropsight.users.execution import DEFAULT
+from cropsight.users.execution import available_modes
+from cropsight.users.execution import run_model
+from cropsight.users.execution import select_fastest_mode
+from cropsight.users.prediction_service import CNNModel
+from cropsight.users.prediction_service import PredictionService
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return CNNModel(n_classes=3).eval()
+
+
+def test_channels_last_matches_default(model):
+    example = torch.randn(2, 3, 64, 64)
+    with torch.inference_mode():
+        expected = run_model(model, example, DEFAULT)
+        model.to(memory_format=torch.channels_last)
+        actual = run_model(model, example, CHANNELS_LAST)
+    torch.testing.assert_close(actual, expected, atol=1e-4, rtol=1e-3)
+
+
+def test_bf16_is_only_offered_where_supported(model, monkeypatch):
+    cpu = torch.device("cpu")
+    monkeypatch.setattr(execution, "bf16_supported", lambda: False)
+    assert available_modes(model, cpu) == [DEFAULT, CHANNELS_LAST]
+    monkeypatch.setattr(execution, "bf16_supported", lambda: True)
+    assert BF16 in available_modes(model, cpu)
+    assert BF16 not in available_modes(model, cpu, quantized=True)
+    assert available_modes(object(), cpu) == [DEFAULT]
+
+
+def test_select_fastest_mode_prepares_the_winner(model):
+    mode, timings = select_fastest_mode(model, [DEFAULT, CHANNELS_LAST], torch.randn(1, 3, 64, 64), iterations=2)
+    assert set(timings) == {DEFAULT, CHANNELS_LAST}
+    assert mode == min(timings, key=timings.get)
+    weight = model.conv_layers[0].weight
+    assert weight.is_contiguous(memory_format=torch.channels_last) == (mode == CHANNELS_LAST)
+
+
+def test_service_auto_selects_and_versions_execution_mode(model, tmp_path, monkeypatch):
+    monkeypatch.setattr(execution, "bf16_supported", lambda: False)
+    weights = tmp_path / "model.pth"
+    torch.save(model.state_dict(), weights)
+    service = PredictionService(weights, ["a", "b", "c"], device=torch.device("cpu"), execution_mode=AUTO)
+    assert service.execution_mode in (DEFAULT, CHANNELS_LAST)
+    assert not service.model_version.endswith("-bf16")
+    assert service._forward(torch.randn(2, 3, 224, 224)).shape == (2, 3)  # noqa: SLF001
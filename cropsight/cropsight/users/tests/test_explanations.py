@@ -0,0 +1,103 @@
+import io
+import json
+
+import pytest
+import torch
+from django.core.files.storage import FileSystemStorage
+from PIL import Image
+from rest_framework.test import APIClient
+
+from cropsight.users import explanations
+from cropsight.users.exceptions import ExplanationUnavailableError
+from cropsight.users.explanations import explain_prediction
+from cropsight.users.models import CropPrediction
+from cropsight.users.prediction_service import CNNModel
+from cropsight.users.prediction_service import CombinedCNNModel
+from cropsight.users.prediction_service import PredictionService
+from cropsight.users.tests.factories import UserFactory
+
+CLASS_NAMES = ["Early_Blight", "Healthy", "Late_Blight"]
+
+
+def make_service(tmp_path, architecture="cnn", model_class=CNNModel):
+    torch.manual_seed(0)
+    weights = tmp_path / f"{architecture}.pth"
+    torch.save(model_class(n_classes=len(CLASS_NAMES)).state_dict(), weights)
+    return PredictionService(weights, CLASS_NAMES, device=torch.device("cpu"), architecture=architecture)
+
+
+def jpeg_bytes(size=(400, 300)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (60, 140, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(("architecture", "model_class"), [("cnn", CNNModel), ("combined", CombinedCNNModel)])
+def test_heatmap_covers_the_last_feature_map(tmp_path, architecture, model_class):
+    service = make_service(tmp_path, architecture, model_class)
+    image, heatmap = service.explain(io.BytesIO(jpeg_bytes()), "Late_Blight")
+    assert image.size == (400, 300)
+    assert heatmap.shape == (14, 14)
+    assert heatmap.min() >= 0
+    assert heatmap.max() <= 1
+    assert all(parameter.grad is None for parameter in service.model.parameters())
+
+
+@pytest.fixture
+def storage(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return FileSystemStorage(location=tmp_path)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch, fake_registry):
+    service = fake_registry.add("potato", make_service(tmp_path))
+    monkeypatch.setattr(explanations, "_stored", explanations.OrderedDict())
+    return service
+
+
+def create_prediction(storage, service, **fields):
+    image = storage.save("crop_images/ab/leaf.jpg", io.BytesIO(jpeg_bytes()))
+    return CropPrediction.objects.create(
+        image=image, image_sha256="ab" * 32, predicted_crop="potato", disease_class="Late_Blight",
+        confidence=90, model_version=service.model_version, **fields,
+    )
+
+
+@pytest.mark.django_db
+def test_explanation_is_computed_once_and_then_served_from_storage(storage, service, monkeypatch):
+    prediction = create_prediction(storage, service)
+    calls = []
+    explain = service.explain
+    monkeypatch.setattr(service, "explain", lambda *args: calls.append(args) or explain(*args))
+
+    name = explain_prediction(prediction, storage)
+    assert name == explain_prediction(prediction, storage)
+    assert len(calls) == 1
+    assert name.startswith(f"crop_images/explanations/ab/{'ab' * 32}-")
+    with storage.open(name) as stored, Image.open(stored) as overlay:
+        assert overlay.format == "JPEG"
+        assert overlay.size == (400, 300)
+
+
+@pytest.mark.django_db
+def test_replaced_model_cannot_explain(storage, service):
+    prediction = create_prediction(storage, service)
+    prediction.model_version = "v0-retired"
+    with pytest.raises(ExplanationUnavailableError, match="no longer served"):
+        explain_prediction(prediction, storage)
+
+
+@pytest.mark.django_db
+def test_endpoint_waits_for_the_stored_image(service):
+    user = UserFactory(phone_number="+923001234568")
+    prediction = CropPrediction.objects.create(
+        user=user, image_sha256="cd" * 32, predicted_crop="potato", disease_class="Late_Blight",
+        confidence=90, model_version=service.model_version,
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get(f"/api/users/predictions/{prediction.id}/explanation/")
+    assert response.status_code == 409  # noqa: PLR2004
+    assert "not been stored" in json.loads(response.content)["error"]
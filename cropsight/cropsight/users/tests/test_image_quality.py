@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from PIL import Image
+from PIL import ImageFilter
+
+from cropsight.users.exceptions import ImageQualityError
+from cropsight.users.image_quality import check_image_quality
+from cropsight.users.image_quality import image_quality_issue
+
+
+@pytest.fixture
+def leaf():
+    """A textured green image with pale veins, standing in for a leaf photo."""
+    rng = np.random.default_rng(0)
+    pixels = np.empty((300, 400, 3), dtype=np.float32)
+    pixels[...] = (60, 140, 40)
+    pixels += rng.normal(0, 25, pixels.shape)
+    pixels[:, ::40] = (200, 200, 120)
+    return Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+
+
+def test_clear_leaf_passes(leaf):
+    assert image_quality_issue(leaf) is None
+    check_image_quality(leaf)
+
+
+def test_dark_image_is_rejected(leaf):
+    dark = Image.fromarray((np.asarray(leaf) * 0.1).astype(np.uint8))
+    assert "too dark" in image_quality_issue(dark)
+
+
+def test_overexposed_image_is_rejected():
+    assert "overexposed" in image_quality_issue(Image.new("RGB", (300, 300), (250, 250, 250)))
+
+
+def test_blurred_image_is_rejected(leaf):
+    assert "blurry" in image_quality_issue(leaf.filter(ImageFilter.GaussianBlur(12)))
+
+
+def test_image_without_leaf_colours_is_rejected(leaf):
+    assert "No leaf" in image_quality_issue(leaf.convert("L").convert("RGB"))
+
+
+def test_thresholds_come_from_settings(settings, leaf):
+    settings.PREDICTION_QUALITY_MIN_SHARPNESS = 10_000
+    with pytest.raises(ImageQualityError, match="blurry"):
+        check_image_quality(leaf)
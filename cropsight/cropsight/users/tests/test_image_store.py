@@ -0,0 +1,70 @@
+import hashlib
+import io
+
+import pytest
+from django.core.files.storage import FileSystemStorage
+from PIL import Image
+
+from cropsight.users import image_store
+from cropsight.users.image_store import ImageUploader
+from cropsight.users.image_store import store_image
+from cropsight.users.models import CropPrediction
+from cropsight.users.prediction_log import PredictionRecorder
+
+
+def png_bytes(size=(640, 480), color=(60, 140, 40)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def storage(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return FileSystemStorage(location=tmp_path)
+
+
+def test_identical_images_are_stored_once(storage, settings):
+    settings.PREDICTION_THUMBNAIL_SIZE = 64
+    data = png_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+
+    name, thumbnail = store_image(digest, data, storage)
+    assert (name, thumbnail) == store_image(digest, data, storage)
+    assert name == f"crop_images/{digest[:2]}/{digest}.png"
+    assert storage.listdir(f"crop_images/{digest[:2]}")[1] == [f"{digest}.png"]
+    with storage.open(thumbnail) as stored, Image.open(stored) as image:
+        assert image.format == "JPEG"
+        assert max(image.size) == 64  # noqa: PLR2004
+
+
+@pytest.mark.django_db
+def test_stored_image_is_attached_to_recorded_predictions(storage, monkeypatch):
+    recorder = PredictionRecorder()
+    recorder._ensure_worker = lambda: None  # noqa: SLF001
+    monkeypatch.setattr(
+        image_store, "attach_prediction_image", lambda *names: recorder.attach_image(*names),
+    )
+    uploader = ImageUploader()
+    uploader._ensure_workers = lambda: None  # noqa: SLF001
+    data = png_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+
+    recorder.record(predicted_crop="potato", disease_class="Healthy", confidence=90, image_sha256=digest)
+    assert uploader.submit(digest, data)
+    uploader.flush()
+    # Already stored: attached again without another upload.
+    recorder.record(predicted_crop="potato", disease_class="Healthy", confidence=95, image_sha256=digest)
+    assert uploader.submit(digest, data)
+    recorder.flush()
+
+    images = set(CropPrediction.objects.values_list("image", "thumbnail"))
+    assert images == {(f"crop_images/{digest[:2]}/{digest}.png", f"crop_images/thumbnails/{digest[:2]}/{digest}.jpg")}
+
+
+def test_full_upload_queue_drops_images():
+    uploader = ImageUploader(max_queue_bytes=10)
+    uploader._ensure_workers = lambda: None  # noqa: SLF001
+    assert uploader.submit("a" * 64, b"12345")
+    assert not uploader.submit("b" * 64, b"1234567890")
+    assert uploader.dropped == 1
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import torch
+
+from cropsight.users.inference_backends import EAGER
+from cropsight.users.inference_backends import ONNXRUNTIME
+from cropsight.users.inference_backends import TORCHSCRIPT
+from cropsight.users.inference_backends import artifact_path
+from cropsight.users.inference_backends import export_model
+from cropsight.users.inference_backends import load_exported_model
+from cropsight.users.prediction_service import CNNModel
+
+
+def test_artifact_path_sits_next_to_weights():
+    weights = Path("/models/Potato_cnn_model_state_dict.pth")
+    assert artifact_path(weights, TORCHSCRIPT) == Path("/models/Potato_cnn_model_state_dict.torchscript.pt")
+    assert artifact_path(weights, ONNXRUNTIME) == Path("/models/Potato_cnn_model_state_dict.onnx")
+
+
+def test_missing_artifact_falls_back_to_eager(tmp_path):
+    cpu = torch.device("cpu")
+    assert load_exported_model(TORCHSCRIPT, tmp_path / "model.pth", cpu) is None
+    assert load_exported_model(EAGER, tmp_path / "model.pth", cpu) is None
+
+
+def test_torchscript_export_round_trip(tmp_path):
+    torch.manual_seed(0)
+    model = CNNModel(n_classes=3).eval()
+    weights = tmp_path / "model.pth"
+    torch.save(model.state_dict(), weights)
+
+    export_model(model, weights, TORCHSCRIPT)
+    backend = load_exported_model(TORCHSCRIPT, weights, torch.device("cpu"))
+
+    batch = torch.randn(2, 3, 64, 64)
+    with torch.no_grad():
+        assert torch.allclose(backend(batch), model(batch), atol=1e-4)
+
+
+def test_artifact_of_replaced_weights_is_not_loaded(tmp_path):
+    model = CNNModel(n_classes=3).eval()
+    weights = tmp_path / "model.pth"
+    torch.save(model.state_dict(), weights)
+    export_model(model, weights, TORCHSCRIPT)
+
+    torch.save(CNNModel(n_classes=3).state_dict(), weights)
+    assert load_exported_model(TORCHSCRIPT, weights, torch.device("cpu")) is None
+
+
+def test_corrupt_artifact_falls_back_to_eager(tmp_path):
+    model = CNNModel(n_classes=3).eval()
+    weights = tmp_path / "model.pth"
+    torch.save(model.state_dict(), weights)
+    path = export_model(model, weights, TORCHSCRIPT)
+
+    path.write_bytes(b"not a torchscript archive")
+    assert load_exported_model(TORCHSCRIPT, weights, torch.device("cpu")) is None
@@ -0,0 +1,65 @@
+from rest_framework.test import APIClient
+
+from cropsight.users import metrics
+from cropsight.users.metrics import StageMetrics
+from cropsight.users.metrics import merge_snapshots
+from cropsight.users.metrics import render_prometheus
+from cropsight.users.metrics import write_snapshot
+
+BUCKETS = (0.01, 0.1, 1.0)
+
+
+def test_histograms_render_cumulative_buckets():
+    stage_metrics = StageMetrics(BUCKETS)
+    for seconds in (0.005, 0.01, 0.05, 2.0):
+        stage_metrics.observe("forward", seconds, "potato", "v1-abc")
+
+    text = render_prometheus(stage_metrics.snapshot(), BUCKETS)
+    labels = 'stage="forward",crop="potato",model_version="v1-abc"'
+    assert "# TYPE cropsight_prediction_stage_seconds histogram" in text
+    assert f'cropsight_prediction_stage_seconds_bucket{{{labels},le="0.01"}} 2' in text
+    assert f'cropsight_prediction_stage_seconds_bucket{{{labels},le="1.0"}} 3' in text
+    assert f'cropsight_prediction_stage_seconds_bucket{{{labels},le="+Inf"}} 4' in text
+    assert f"cropsight_prediction_stage_seconds_count{{{labels}}} 4" in text
+
+
+def test_worker_files_are_summed(tmp_path):
+    for pid, seconds in ((101, 0.05), (102, 0.5)):
+        stage_metrics = StageMetrics(BUCKETS)
+        stage_metrics.observe("decode", seconds, "wheat", "v2")
+        write_snapshot(tmp_path / f"{pid}.json", stage_metrics.snapshot(), BUCKETS)
+    (tmp_path / "103.json").write_text("{truncated")
+
+    merged = merge_snapshots(tmp_path, BUCKETS)
+    assert merged == {("decode", "wheat", "v2"): [0, 1, 1, 0, 0.55]}
+
+
+def test_scrape_includes_this_process(settings, tmp_path, monkeypatch):
+    settings.PREDICTION_METRICS_DIR = str(tmp_path)
+    settings.PREDICTION_METRICS_TOKEN = "secret"
+    monkeypatch.setattr(metrics, "_metrics", StageMetrics())
+    monkeypatch.setattr(metrics, "_ensure_writer", lambda: None)
+    metrics.observe_stage("serialization", 0.002, "cotton", "v3")
+    client = APIClient()
+
+    assert client.get("/api/users/metrics/").status_code == 401  # noqa: PLR2004
+    response = client.get("/api/users/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+    assert response.status_code == 200  # noqa: PLR2004
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert 'stage="serialization",crop="cotton",model_version="v3"' in response.content.decode()
+
+
+def test_a_reused_pid_writes_its_own_file(settings, tmp_path, monkeypatch):
+    settings.PREDICTION_METRICS_DIR = str(tmp_path)
+    monkeypatch.setattr(metrics, "_ensure_writer", lambda: None)
+    for seconds in (0.05, 0.5):
+        # A new process, which happens to get the same pid as the one before it.
+        monkeypatch.setattr(metrics, "_snapshot_name", None)
+        monkeypatch.setattr(metrics, "_metrics", StageMetrics())
+        metrics.observe_stage("forward", seconds, "rice", "v1")
+        metrics.write_stage_metrics()
+        metrics.write_stage_metrics()
+
+    assert len(list(tmp_path.glob("*.json"))) == 2  # noqa: PLR2004
+    (histogram,) = merge_snapshots(tmp_path).values()
+    assert sum(histogram[:-1]) == 2  # noqa: PLR2004
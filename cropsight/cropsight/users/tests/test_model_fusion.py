@@ -0,0 +1,37 @@
+import pytest
+import torch
+from torch import nn
+
+from cropsight.users.exceptions import ModelFusionError
+from cropsight.users.model_fusion import fuse_for_inference
+from cropsight.users.model_fusion import verify_fusion
+from cropsight.users.prediction_service import CNNModel
+
+
+@pytest.fixture
+def trained_model():
+    torch.manual_seed(0)
+    model = CNNModel(n_classes=3)
+    # A training-mode pass gives the BatchNorm layers non-trivial running statistics.
+    model.train()
+    model(torch.randn(4, 3, 64, 64))
+    return model.eval()
+
+
+def test_fused_model_has_no_batchnorm_or_dropout(trained_model):
+    fused = fuse_for_inference(trained_model)
+    layer_types = {type(module) for module in fused.modules()}
+    assert not layer_types & {nn.BatchNorm1d, nn.BatchNorm2d, nn.Dropout, nn.Dropout2d}
+
+
+def test_fused_model_matches_original(trained_model):
+    fused = fuse_for_inference(trained_model)
+    verify_fusion(trained_model, fused, torch.randn(2, 3, 64, 64))
+
+
+def test_verify_fusion_rejects_diverging_models(trained_model):
+    fused = fuse_for_inference(trained_model)
+    with torch.no_grad():
+        fused.fc_layers[-1].bias.add_(1.0)
+    with pytest.raises(ModelFusionError):
+        verify_fusion(trained_model, fused, torch.randn(2, 3, 64, 64))
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from cropsight.users.exceptions import ModelClassesError
+from cropsight.users.exceptions import UnsupportedCropError
+from cropsight.users.model_registry import ModelRegistry
+
+
+@pytest.fixture(autouse=True)
+def _fake_models(settings, loaded_models):
+    settings.PREDICTION_MODELS = {
+        "potato": {"path": "potato.pth", "class_names": ["a", "b"]},
+        "wheat": {"path": "wheat.pth", "class_names": ["c", "d"]},
+        "cotton": {"path": "cotton.pth", "class_names": ["e", "f"]},
+    }
+
+
+def test_get_loads_once_and_reuses(loaded_models):
+    registry = ModelRegistry(max_size=3)
+    first = registry.get("potato")
+    second = registry.get("potato")
+    assert first is second
+    assert len(loaded_models) == 1
+    assert registry.stats()["loads"] == 1
+    assert registry.stats()["hits"] == 1
+
+
+def test_least_recently_used_model_is_evicted():
+    registry = ModelRegistry(max_size=2)
+    registry.get("potato")
+    wheat = registry.get("wheat")
+    registry.get("potato")
+    registry.get("cotton")
+    stats = registry.stats()
+    assert stats["evictions"] == 1
+    assert stats["resident"] == ["potato", "cotton"]
+    assert wheat.closed
+
+
+def test_unknown_crop_raises():
+    registry = ModelRegistry(max_size=2)
+    with pytest.raises(UnsupportedCropError):
+        registry.get("rice")
+
+
+def test_concurrent_gets_load_once(loaded_models):
+    registry = ModelRegistry(max_size=3)
+    services = []
+    threads = [threading.Thread(target=lambda: services.append(registry.get("wheat"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loaded_models) == 1
+    assert all(service is services[0] for service in services)
+
+
+def test_preload_loads_every_crop_into_shared_memory():
+    registry = ModelRegistry(max_size=3)
+    loaded = registry.preload()
+    assert loaded == ["potato", "wheat", "cotton"]
+    assert registry.stats()["resident"] == loaded
+    assert all(registry.get(crop).shared for crop in loaded)
+
+
+def test_preload_skips_crops_that_fail_to_load(settings):
+    settings.PREDICTION_MODELS["rice"] = {"path": "missing.pth", "class_names": ["g"]}
+    registry = ModelRegistry(max_size=4)
+    original = registry._load
+
+    def load(crop):
+        if crop == "rice":
+            raise FileNotFoundError(crop)
+        return original(crop)
+
+    registry._load = load
+    assert registry.preload() == ["potato", "wheat", "cotton"]
+
+
+@pytest.mark.parametrize(("class_names", "error"), [
+    (["potato", "rice", "wheat"], "rice are not served"),
+    (["wheat", "potato"], "sorted order"),
+])
+def test_crop_only_combined_model_must_route_to_served_crops(settings, class_names, error):
+    settings.PREDICTION_MODELS["combined"] = {
+        "path": "combined.pth", "class_names": class_names, "architecture": "combined",
+    }
+    with pytest.raises(ModelClassesError, match=error):
+        ModelRegistry(max_size=4).get("combined")
+    assert ModelRegistry(max_size=4).check_crop_classes("combined", ["potato/Healthy", "rice/Blast"]) is None
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from cropsight.users import model_reload
+from cropsight.users.exceptions import ModelManifestError
+from cropsight.users.model_manifest import load_manifest
+from cropsight.users.model_registry import ModelRegistry
+from cropsight.users.model_reload import ModelManifestWatcher
+from cropsight.users.model_reload import apply_model_configs
+
+
+def write_model(directory, name, content):
+    path = directory / name
+    path.write_bytes(content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def write_manifest(directory, version, models):
+    path = directory / "manifest.json"
+    path.write_text(json.dumps({"version": version, "models": models}))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def _fake_models(loaded_models, monkeypatch):
+    monkeypatch.setattr(model_reload, "warm_up_service", lambda service: None)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    checksum = write_model(tmp_path, "potato-v1.pth", b"v1")
+    return write_manifest(tmp_path, "1", {
+        "potato": {"path": "potato-v1.pth", "sha256": checksum, "class_names": ["a", "b"], "version": "v1"},
+    })
+
+
+def test_manifest_paths_are_relative_to_the_manifest(manifest, tmp_path):
+    version, configs = load_manifest(manifest)
+    assert version == "1"
+    assert configs["potato"]["path"] == str(tmp_path / "potato-v1.pth")
+
+
+def test_incomplete_manifest_is_rejected(tmp_path):
+    path = write_manifest(tmp_path, "1", {"potato": {"path": "potato.pth", "class_names": ["a"]}})
+    with pytest.raises(ModelManifestError, match="sha256, version"):
+        load_manifest(path)
+
+
+def test_overlong_model_version_is_rejected(tmp_path):
+    checksum = write_model(tmp_path, "potato.pth", b"v1")
+    path = write_manifest(tmp_path, "1", {
+        "potato": {"path": "potato.pth", "sha256": checksum, "class_names": ["a"], "version": "v" * 201},
+    })
+    with pytest.raises(ModelManifestError, match="over 200 characters"):
+        load_manifest(path)
+
+
+def test_new_version_is_swapped_in_while_the_old_one_finishes(manifest, tmp_path):
+    _, configs = load_manifest(manifest)
+    registry = ModelRegistry(max_size=2, configs=configs)
+    in_flight = registry.get("potato")
+
+    checksum = write_model(tmp_path, "potato-v2.pth", b"v2")
+    _, configs = load_manifest(write_manifest(tmp_path, "2", {
+        "potato": {"path": "potato-v2.pth", "sha256": checksum, "class_names": ["a", "b"], "version": "v2"},
+    }))
+    assert apply_model_configs(configs, registry) == ["potato"]
+
+    assert registry.get("potato").version == "v2"
+    assert in_flight.version == "v1"
+    assert in_flight.closed
+    assert registry.stats()["swaps"] == 1
+
+
+def test_model_failing_its_checksum_is_not_swapped_in(manifest, tmp_path):
+    _, configs = load_manifest(manifest)
+    registry = ModelRegistry(max_size=2, configs=configs)
+    current = registry.get("potato")
+
+    write_model(tmp_path, "potato-v2.pth", b"v2")
+    bad = {**configs["potato"], "path": str(tmp_path / "potato-v2.pth"), "version": "v2"}
+    assert apply_model_configs({"potato": bad}, registry) == []
+    assert registry.get("potato") is current
+    assert not current.closed
+
+
+def test_watcher_reloads_only_when_the_manifest_changes(manifest, tmp_path):
+    _, configs = load_manifest(manifest)
+    registry = ModelRegistry(max_size=2, configs=configs)
+    registry.get("potato")
+    watcher = ModelManifestWatcher(manifest, registry=registry)
+    assert watcher.check() == []
+    assert watcher.version == "1"
+
+    checksum = write_model(tmp_path, "potato-v2.pth", b"v2")
+    new_manifest = tmp_path / "manifest.json.new"
+    new_manifest.write_text(json.dumps({"version": "2", "models": {
+        "potato": {"path": "potato-v2.pth", "sha256": checksum, "class_names": ["a", "b"], "version": "v2"},
+    }}))
+    os.replace(new_manifest, manifest)
+
+    assert watcher.check() == ["potato"]
+    assert watcher.check() == []
+    assert registry.get("potato").version == "v2"
@@ -0,0 +1,44 @@
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIRequestFactory
+
+from cropsight.users.prediction_cache import PredictionResultCache
+from cropsight.users.user_service import UserService
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+
+
+def test_image_digest_rewinds_file():
+    upload = SimpleUploadedFile("leaf.jpg", b"image-bytes")
+    digest = PredictionResultCache.image_digest(upload)
+    assert upload.read() == b"image-bytes"
+    assert digest == PredictionResultCache.image_digest(SimpleUploadedFile("other.jpg", b"image-bytes"))
+
+
+def test_key_depends_on_model_version():
+    result_cache = PredictionResultCache(timeout=60)
+    assert result_cache.make_key("digest", "v1") != result_cache.make_key("digest", "v2")
+
+
+def test_disabled_cache_stores_nothing():
+    result_cache = PredictionResultCache(timeout=0)
+    result_cache.set("key", "value")
+    assert result_cache.get("key") is None
+
+
+def test_resubmitted_image_is_served_from_cache(fake_registry):
+    service = fake_registry.add("potato")
+    factory = APIRequestFactory()
+
+    results = []
+    for _ in range(2):
+        request = factory.post("/predict/", {"image": SimpleUploadedFile("leaf.jpg", b"same-photo")})
+        results.append(UserService().predict_disease(request, "potato"))
+
+    assert [cache_hit for _, cache_hit in results] == [False, True]
+    assert results[1][0] == results[0][0]
+    assert service.predictions == 1
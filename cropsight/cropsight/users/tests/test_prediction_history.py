@@ -0,0 +1,75 @@
+import json
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cropsight.users.exceptions import InvalidCursorError
+from cropsight.users.models import CropPrediction
+from cropsight.users.prediction_history import decode_cursor
+from cropsight.users.prediction_history import get_prediction_history
+from cropsight.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def create_predictions(user, count, predicted_at=None):
+    predicted_at = predicted_at or timezone.now()
+    return CropPrediction.objects.bulk_create(
+        CropPrediction(
+            user=user, predicted_crop="potato", disease_class="Healthy", confidence=90,
+            predicted_at=predicted_at - timedelta(minutes=index // 2),
+        )
+        for index in range(count)
+    )
+
+
+def test_pages_cover_every_prediction_newest_first():
+    user = UserFactory()
+    create_predictions(user, 7)
+    expected = list(CropPrediction.objects.filter(user=user).order_by("-predicted_at", "-id").values_list("id", flat=True))
+
+    seen, cursor = [], None
+    while True:
+        page = get_prediction_history(user, cursor=cursor, limit=2)
+        seen.extend(item.id for item in page.results)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert seen == expected
+
+
+def test_history_only_holds_the_users_predictions():
+    user = UserFactory(phone_number="+15550000001")
+    create_predictions(user, 1)
+    create_predictions(UserFactory(phone_number="+15550000002"), 3)
+
+    page = get_prediction_history(user)
+    assert len(page.results) == 1
+    assert page.next_cursor is None
+    assert page.results[0].thumbnail_url is None
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor")
+
+
+def test_history_endpoint_pages_with_cursor():
+    user = UserFactory()
+    create_predictions(user, 3)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    first = json.loads(client.get("/api/users/predictions/history/", {"limit": 2}).content)
+    assert len(first["data"]["results"]) == 2  # noqa: PLR2004
+    second = json.loads(
+        client.get("/api/users/predictions/history/", {"limit": 2, "cursor": first["data"]["next_cursor"]}).content
+    )
+    assert len(second["data"]["results"]) == 1
+    assert second["data"]["next_cursor"] is None
+
+    response = client.get("/api/users/predictions/history/", {"cursor": "bogus"})
+    assert response.status_code == 400  # noqa: PLR2004
@@ -0,0 +1,83 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from rest_framework.test import APIRequestFactory
+
+from cropsight.users import user_service
+from cropsight.users.models import CropPrediction
+from cropsight.users.prediction_cache import PredictionResultCache
+from cropsight.users.prediction_log import PredictionRecorder
+from cropsight.users.tests.factories import UserFactory
+from cropsight.users.user_service import UserService
+
+pytestmark = pytest.mark.django_db
+
+
+def make_recorder(**kwargs):
+    # Tests flush explicitly, in the test's own transaction, so no writer thread is started.
+    recorder = PredictionRecorder(**kwargs)
+    recorder._ensure_worker = lambda: None  # noqa: SLF001
+    return recorder
+
+
+def prediction_fields(**overrides):
+    fields = {"predicted_crop": "potato", "disease_class": "Healthy", "confidence": 97.5, "model_version": "v1"}
+    fields.update(overrides)
+    return fields
+
+
+def test_records_are_written_in_batches_on_flush(monkeypatch):
+    recorder = make_recorder(batch_size=2)
+    batches = []
+    bulk_create = CropPrediction.objects.bulk_create
+    monkeypatch.setattr(CropPrediction.objects, "bulk_create", lambda rows: batches.append(len(rows)) or bulk_create(rows))
+
+    for _ in range(3):
+        assert recorder.record(**prediction_fields())
+    assert CropPrediction.objects.count() == 0
+
+    recorder.flush()
+    assert batches == [2, 1]
+    assert CropPrediction.objects.count() == 3  # noqa: PLR2004
+    assert recorder.stats()["written"] == 3  # noqa: PLR2004
+
+
+def test_full_queue_drops_records():
+    recorder = make_recorder(max_queue_size=1)
+    assert recorder.record(**prediction_fields())
+    assert not recorder.record(**prediction_fields())
+
+    recorder.flush()
+    assert CropPrediction.objects.count() == 1
+    assert recorder.stats()["dropped"] == 1
+
+
+def test_failed_batch_is_discarded(monkeypatch):
+    recorder = make_recorder()
+    recorder.record(**prediction_fields())
+
+    def fail(rows):
+        raise DatabaseError("database is down")
+
+    monkeypatch.setattr(CropPrediction.objects, "bulk_create", fail)
+    recorder.flush()
+    assert recorder.stats() == {"queued": 0, "written": 0, "dropped": 0, "failed": 1}
+
+
+def test_prediction_is_recorded_for_the_signed_in_user(fake_registry, monkeypatch):
+    fake_registry.add("potato", label="Late_Blight", confidence=91.0, model_version="abc123-eager")
+    recorded = []
+    monkeypatch.setattr(user_service, "record_prediction", lambda **fields: recorded.append(fields))
+    user = UserFactory()
+    request = APIRequestFactory().post("/predict/", {"image": SimpleUploadedFile("leaf.jpg", b"leaf-photo")})
+    request.user = user
+
+    UserService().predict_disease(request, "potato")
+
+    [fields] = recorded
+    assert fields["user"] == user
+    assert fields["image_sha256"] == PredictionResultCache.image_digest(SimpleUploadedFile("leaf.jpg", b"leaf-photo"))
+    assert fields["predicted_crop"] == "potato"
+    assert fields["disease_class"] == "Late_Blight"
+    assert fields["model_version"] == "abc123-eager"
+    assert fields["latency_ms"] >= 0
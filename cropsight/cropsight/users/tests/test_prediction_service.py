@@ -0,0 +1,97 @@
+import io
+
+import pytest
+import torch
+from PIL import Image
+
+from cropsight.users.exceptions import ImageQualityError
+from cropsight.users.exceptions import ModelClassesError
+from cropsight.users.inference_backends import TORCHSCRIPT
+from cropsight.users.inference_backends import export_model
+from cropsight.users.prediction_service import CNNModel
+from cropsight.users.prediction_service import PredictionService
+
+CLASS_NAMES = ["Early_Blight", "Healthy", "Late_Blight"]
+
+
+@pytest.fixture
+def prediction_service(tmp_path):
+    torch.manual_seed(0)
+    weights = tmp_path / "model.pth"
+    torch.save(CNNModel(n_classes=len(CLASS_NAMES)).state_dict(), weights)
+    return PredictionService(weights, CLASS_NAMES, device=torch.device("cpu"))
+
+
+def encode(image, image_format="JPEG", **params):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **params)
+    buffer.seek(0)
+    return buffer
+
+
+def test_large_jpeg_is_decoded_near_input_size(prediction_service):
+    image = prediction_service._decode_image(encode(Image.new("RGB", (4000, 3000), (60, 140, 40))))  # noqa: SLF001
+    assert image.mode == "RGB"
+    assert 224 <= min(image.size) < 448
+
+
+def test_exif_orientation_is_applied(prediction_service):
+    image = Image.new("RGB", (800, 400))
+    exif = image.getexif()
+    exif[0x0112] = 6  # rotated 90 degrees clockwise
+    decoded = prediction_service._decode_image(encode(image, exif=exif))  # noqa: SLF001
+    assert decoded.size == (400, 800)
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "L", "P"])
+def test_non_rgb_images_are_converted(prediction_service, mode):
+    timings = {}
+    batch = prediction_service._preprocess_image(encode(Image.new(mode, (300, 300)), "PNG"), timings)  # noqa: SLF001
+    assert batch.shape == (1, 3, 224, 224)
+    assert set(timings) == {"decode", "quality", "transform"}
+
+
+def test_predict_batch_reports_every_image(prediction_service):
+    images = [encode(Image.new("RGB", (300, 300), (index * 50, 120, 40))) for index in range(5)]
+    images.insert(2, io.BytesIO(b"not an image"))
+
+    results = list(prediction_service.predict_batch(images, batch_size=2, decode_workers=2))
+
+    assert sorted(index for index, *_ in results) == list(range(6))
+    errors = {index: error for index, _, _, error in results if error}
+    assert list(errors) == [2]
+    assert all(name in CLASS_NAMES for _, name, _, error in results if not error)
+
+
+def test_quality_check_rejects_before_inference(prediction_service, monkeypatch):
+    prediction_service.check_quality = True
+    monkeypatch.setattr(prediction_service, "_forward", lambda batch: pytest.fail("inference ran"))
+    with pytest.raises(ImageQualityError, match="too dark"):
+        prediction_service.classify(encode(Image.new("RGB", (300, 300), (5, 10, 5))))
+
+    results = list(prediction_service.predict_batch([encode(Image.new("RGB", (300, 300), (5, 10, 5)))]))
+    assert results == [(0, None, None, "Image is too dark, please retake the photo in better light")]
+
+
+def test_embedding_is_the_input_of_the_last_layer(prediction_service):
+    image = encode(Image.new("RGB", (300, 300), (60, 140, 40)))
+    predicted_class, confidence, embedding = prediction_service.classify_with_embedding(image)
+
+    image.seek(0)
+    assert (predicted_class, confidence) == prediction_service.classify(image)
+    image.seek(0)
+    batch = prediction_service._preprocess_image(image)  # noqa: SLF001
+    with torch.inference_mode():
+        expected = prediction_service.model.fc_layers[:-1](prediction_service.model.conv_layers(batch))
+    assert embedding.shape == (256,)
+    assert torch.allclose(torch.from_numpy(embedding), expected[0], atol=1e-5)
+
+
+def test_exported_model_must_match_its_class_names(tmp_path):
+    model = CNNModel(n_classes=len(CLASS_NAMES)).eval()
+    weights = tmp_path / "model.pth"
+    torch.save(model.state_dict(), weights)
+    export_model(model, weights, TORCHSCRIPT)
+
+    with pytest.raises(ModelClassesError, match="3 outputs for 2 class names"):
+        PredictionService(weights, CLASS_NAMES[:2], device=torch.device("cpu"), backend=TORCHSCRIPT)
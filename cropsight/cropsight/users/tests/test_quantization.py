@@ -0,0 +1,38 @@
+import pytest
+import torch
+from PIL import Image
+
+from cropsight.users.prediction_service import CNNModel
+from cropsight.users.quantization import load_calibration_batches
+from cropsight.users.quantization import quantize_model
+
+
+def test_load_calibration_batches(tmp_path):
+    for index in range(5):
+        Image.new("RGB", (40, 30), (index * 40, 120, 60)).save(tmp_path / f"{index}.jpg")
+    (tmp_path / "notes.txt").write_text("not an image")
+
+    batches = load_calibration_batches(tmp_path, lambda image: torch.zeros(3, 8, 8), batch_size=2)
+
+    assert [batch.shape[0] for batch in batches] == [2, 2, 1]
+
+
+def test_missing_calibration_dir_returns_no_batches(tmp_path):
+    assert load_calibration_batches(tmp_path / "missing", lambda image: image) == []
+
+
+def test_quantize_model_returns_class_logits():
+    torch.manual_seed(0)
+    model = CNNModel(n_classes=3).eval()
+    calibration = [torch.randn(4, 3, 64, 64) for _ in range(2)]
+
+    quantized = quantize_model(model, calibration)
+
+    with torch.no_grad():
+        logits = quantized(calibration[0])
+    assert logits.shape == (4, 3)
+
+
+def test_quantize_model_requires_calibration():
+    with pytest.raises(ValueError, match="calibration"):
+        quantize_model(CNNModel(n_classes=3), [])
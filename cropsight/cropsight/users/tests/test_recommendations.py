@@ -0,0 +1,83 @@
+import pytest
+from django.core.cache import cache
+
+from cropsight.users import signals
+from cropsight.users.dtos.response.response_dataclass import ProductData
+from cropsight.users.models import Categories
+from cropsight.users.models import Products
+from cropsight.users.recommendations import build_product_pool
+from cropsight.users.recommendations import recommend_products
+from cropsight.users.recommendations import refresh_product_pools
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+
+
+def add_products(category_name, count):
+    category, _ = Categories.objects.get_or_create(name=category_name, defaults={"description": ""})
+    return [
+        Products.objects.create(
+            name=f"{category_name} {index}", description="", price=10, category=category, image="products/p.jpg",
+        )
+        for index in range(count)
+    ]
+
+
+def test_recommendations_are_sampled_from_the_cached_pool(django_assert_num_queries):
+    add_products("Late_Blight", 15)
+    add_products("Healthy", 3)
+    refresh_product_pools()
+
+    with django_assert_num_queries(0):
+        products = recommend_products("Late_Blight")
+    assert len(products) == 10
+    assert len({product.id for product in products}) == 10
+    assert all(isinstance(product, ProductData) and product.category == "Late_Blight" for product in products)
+    assert len(recommend_products("Healthy")) == 3
+
+
+def test_missing_pool_is_built_on_demand():
+    add_products("Early_Blight", 2)
+    cache.clear()
+    assert {product.name for product in recommend_products("Early_Blight")} == {"Early_Blight 0", "Early_Blight 1"}
+    assert recommend_products("Unknown") == []
+
+
+def test_pools_refresh_when_products_change(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        add_products("Yellow_Rust", 1)
+    with django_capture_on_commit_callbacks(execute=True):
+        (removed,) = Products.objects.filter(category__name="Yellow_Rust")
+        removed.delete()
+        add_products("Yellow_Rust", 2)
+    assert len(recommend_products("Yellow_Rust")) == 2
+
+
+def test_only_changed_categories_are_refreshed_once_per_transaction(django_capture_on_commit_callbacks, monkeypatch):
+    with django_capture_on_commit_callbacks(execute=True):
+        (moved,) = add_products("Leaf_Spot", 1)
+        add_products("Rust", 1)
+        add_products("Healthy", 1)
+    refreshed = []
+    monkeypatch.setattr(signals, "refresh_product_pool", refreshed.append)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        add_products("Rust", 2)
+        moved.category = Categories.objects.get(name="Rust")
+        moved.save()
+    assert sorted(refreshed) == ["Leaf_Spot", "Rust"]
+
+
+def test_large_categories_are_sampled(settings):
+    settings.PRODUCT_POOL_MAX_SIZE = 5
+    add_products("Mosaic", 20)
+    seen = set()
+    for _ in range(10):
+        pool = build_product_pool("Mosaic")
+        assert len(pool) == 5  # noqa: PLR2004
+        seen.update(product.id for product in pool)
+    assert len(seen) > 5  # noqa: PLR2004
@@ -1,7 +1,16 @@
+import io
+
 import pytest
 from celery.result import EagerResult
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework.test import APIClient
 
 from cropsight.users.tasks import get_users_count
+from cropsight.users.image_store import stage_job_image
+from cropsight.users.tasks import predict_disease_task
 from cropsight.users.tests.factories import UserFactory
 
 pytestmark = pytest.mark.django_db
@@ -15,3 +24,64 @@ def test_user_count(settings):
     task_result = get_users_count.delay()
     assert isinstance(task_result, EagerResult)
     assert task_result.result == batch_size
+
+
+def test_predict_disease_task(settings, fake_registry):
+    """The queued prediction returns the serialized PredictionResponseData and drops the staged image."""
+    service = fake_registry.add("potato", confidence=97.5)
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    image_name = stage_job_image(ContentFile(b"leaf-photo"))
+    task_result = predict_disease_task.delay("potato", image_name)
+    assert isinstance(task_result, EagerResult)
+    assert task_result.result["disease_class"] == "Healthy"
+    assert task_result.result["confidence"] == 97.5  # noqa: PLR2004
+    assert service.images == [b"leaf-photo"]
+    assert not default_storage.exists(image_name)
+
+
+@pytest.fixture
+def eager_jobs(settings, monkeypatch):
+    """Run queued predictions eagerly and look their results up without a result backend."""
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    results = {}
+    delay = predict_disease_task.delay
+
+    def record(*args):
+        result = delay(*args)
+        results[result.id] = result
+        return result
+
+    monkeypatch.setattr(predict_disease_task, "delay", record)
+    monkeypatch.setattr("cropsight.users.user_service.AsyncResult", results.__getitem__)
+    return results
+
+
+def submit_job(client):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (60, 140, 40)).save(buffer, "JPEG")
+    response = client.post(
+        "/api/users/potato/predict/?async=true", {"image": SimpleUploadedFile("leaf.jpg", buffer.getvalue())},
+    )
+    assert response.status_code == 202  # noqa: PLR2004
+    return response.json()["data"]["job_id"]
+
+
+def test_prediction_job_is_only_readable_by_its_submitter(eager_jobs, fake_registry):
+    fake_registry.add("potato")
+    owner, other = APIClient(), APIClient()
+    owner.force_authenticate(UserFactory(phone_number="+15550000001"))
+    other.force_authenticate(UserFactory(phone_number="+15550000002"))
+    job_id = submit_job(owner)
+
+    response = owner.get(f"/api/users/predict/jobs/{job_id}/")
+    assert response.status_code == 200  # noqa: PLR2004
+    assert response.json()["data"]["result"]["disease_class"] == "Healthy"
+    assert other.get(f"/api/users/predict/jobs/{job_id}/").status_code == 404  # noqa: PLR2004
+    assert APIClient().get(f"/api/users/predict/jobs/{job_id}/").status_code == 404  # noqa: PLR2004
+    assert owner.get(f"/api/users/predict/jobs/{job_id}x/").status_code == 404  # noqa: PLR2004
+
+
+def test_anonymous_prediction_job_is_readable_with_its_id(eager_jobs, fake_registry):
+    fake_registry.add("potato")
+    job_id = submit_job(APIClient())
+    assert APIClient().get(f"/api/users/predict/jobs/{job_id}/").status_code == 200  # noqa: PLR2004
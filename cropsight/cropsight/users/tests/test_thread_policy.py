@@ -0,0 +1,67 @@
+import json
+
+import pytest
+import torch
+from rest_framework.test import APIRequestFactory
+from rest_framework.test import force_authenticate
+
+from cropsight.users import thread_policy
+from cropsight.users.api.views import ThreadDiagnosticsApiView
+from cropsight.users.thread_policy import apply_thread_policy
+from cropsight.users.thread_policy import threads_per_worker
+
+
+@pytest.fixture(autouse=True)
+def _restore_threads(monkeypatch):
+    num_threads = torch.get_num_threads()
+    monkeypatch.setattr(thread_policy, "_applied_workers", None)
+    yield
+    torch.set_num_threads(num_threads)
+
+
+def test_threads_per_worker_splits_cores():
+    assert threads_per_worker(4, cores=16) == 4
+    assert threads_per_worker(3, cores=8) == 2
+    assert threads_per_worker(16, cores=8) == 1
+
+
+def test_apply_thread_policy_divides_cores(settings, monkeypatch):
+    settings.TORCH_NUM_THREADS = 0
+    monkeypatch.setattr(thread_policy, "available_cores", lambda: 8)
+    apply_thread_policy(workers=4)
+    assert torch.get_num_threads() == 2
+    config = thread_policy.get_thread_config()
+    assert config.policy_applied
+    assert config.workers == 4
+
+
+def test_request_threads_share_the_cores_without_batching(settings, monkeypatch):
+    settings.TORCH_NUM_THREADS = 0
+    monkeypatch.setattr(thread_policy, "available_cores", lambda: 16)
+    settings.PREDICTION_BATCH_MAX_SIZE = 8
+    apply_thread_policy(workers=2, request_threads=4)
+    assert torch.get_num_threads() == 8
+
+    settings.PREDICTION_BATCH_MAX_SIZE = 1
+    apply_thread_policy(workers=2, request_threads=4)
+    assert torch.get_num_threads() == 2
+
+
+def test_apply_thread_policy_uses_configured_threads(settings):
+    settings.TORCH_NUM_THREADS = 1
+    apply_thread_policy(workers=2)
+    assert torch.get_num_threads() == 1
+
+
+@pytest.mark.django_db
+def test_thread_diagnostics_requires_admin(user):
+    request = APIRequestFactory().get("/api/users/diagnostics/threads/")
+    force_authenticate(request, user=user)
+    assert ThreadDiagnosticsApiView.as_view()(request).status_code == 403
+
+    user.is_staff = True
+    request = APIRequestFactory().get("/api/users/diagnostics/threads/")
+    force_authenticate(request, user=user)
+    response = ThreadDiagnosticsApiView.as_view()(request)
+    assert response.status_code == 200
+    assert json.loads(response.content)["data"]["num_threads"] == torch.get_num_threads()
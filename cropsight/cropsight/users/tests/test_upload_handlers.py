@@ -0,0 +1,128 @@
+import io
+import json
+import random
+import struct
+import zlib
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.test import APIClient
+from rest_framework.test import APIRequestFactory
+
+from cropsight.users.api.views import BatchPredictionApiView
+from cropsight.users.api.views import PotatoPredictionApiView
+from cropsight.users.exceptions import ImageUploadError
+from cropsight.users.upload_handlers import MAX_HEADER_BYTES
+from cropsight.users.upload_handlers import validate_image_header
+
+
+def jpeg(size=(300, 200)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (60, 140, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def png_header(width, height):
+    """A PNG declaring the given dimensions, with almost no pixel data behind them."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"\x00" * 100))
+
+
+@pytest.fixture
+def service(fake_registry):
+    return fake_registry.add("potato")
+
+
+def post_image(data, name="leaf.jpg"):
+    request = APIRequestFactory().post(
+        "/api/users/potato/predict/", {"image": SimpleUploadedFile(name, data)}, format="multipart",
+    )
+    response = PotatoPredictionApiView.as_view()(request)
+    return response.status_code, json.loads(response.content)
+
+
+def test_header_dimensions_are_read_without_decoding():
+    assert validate_image_header(jpeg(), max_pixels=1_000_000) == (300, 200)
+    assert validate_image_header(jpeg()[:10], max_pixels=1_000_000) is None
+
+
+def test_decompression_bomb_is_rejected_from_its_header():
+    with pytest.raises(ImageUploadError, match="megapixels"):
+        validate_image_header(png_header(100_000, 100_000), max_pixels=50_000_000)
+
+
+def test_valid_image_reaches_the_model(service):
+    status_code, _ = post_image(jpeg())
+    assert status_code == 200
+    assert service.predictions == 1
+
+
+@pytest.mark.parametrize("options", [
+    {"quality": 100},
+    {"lossless": True},
+    {"quality": 100, "exif": b"Exif\x00\x00II*\x00"},
+])
+def test_webp_larger_than_the_header_limit_reaches_the_model(service, options):
+    buffer = io.BytesIO()
+    # Noise barely compresses, so the file runs well past the header limit.
+    pixels = random.Random(0).randbytes(768 * 768 * 3)  # noqa: S311
+    noise = Image.frombytes("RGB", (768, 768), pixels)
+    noise.save(buffer, "WEBP", **options)
+    assert buffer.tell() > MAX_HEADER_BYTES
+    assert validate_image_header(buffer.getvalue()[:64], max_pixels=1_000_000) == (768, 768)
+
+    status_code, _ = post_image(buffer.getvalue(), name="leaf.webp")
+    assert status_code == 200
+    assert service.predictions == 1
+
+
+@pytest.mark.parametrize(("data", "error"), [
+    (b"GIF89a" + b"\x00" * 100, "Unsupported file type"),
+    (jpeg()[:200], "corrupt or truncated"),
+    (png_header(20_000, 20_000), "megapixels"),
+])
+def test_bad_uploads_are_rejected_before_inference(service, data, error):
+    status_code, body = post_image(data)
+    assert status_code == 400
+    assert error in body["error"]
+    assert service.predictions == 0
+
+
+def test_oversized_upload_is_rejected(service, settings):
+    settings.PREDICTION_UPLOAD_MAX_BYTES = 1024
+    status_code, body = post_image(jpeg(size=(1200, 900)))
+    assert status_code == 400
+    assert "larger than" in body["error"]
+    assert service.predictions == 0
+
+
+def test_batch_archive_field_must_be_a_zip(service):
+    request = APIRequestFactory().post(
+        "/api/users/potato/predict/batch/",
+        {"archive": SimpleUploadedFile("plot.zip", jpeg())},
+        format="multipart",
+    )
+    response = BatchPredictionApiView.as_view()(request, crop="potato")
+    assert response.status_code == 400
+    assert "not a zip archive" in json.loads(response.content)["error"]
+
+
+@pytest.mark.django_db
+def test_upload_rejected_by_the_csrf_check_of_a_session_is_a_bad_request(service, user, monkeypatch):
+    # Session authentication parses the body for the CSRF token before the view runs.
+    monkeypatch.setattr(PotatoPredictionApiView, "authentication_classes", [SessionAuthentication])
+    client = APIClient(enforce_csrf_checks=True)
+    client.force_login(user)
+    client.cookies["csrftoken"] = "a" * 32
+    response = client.post(
+        "/api/users/potato/predict/", {"image": SimpleUploadedFile("leaf.jpg", b"GIF89a" + b"\x00" * 100)},
+        format="multipart",
+    )
+    assert response.status_code == 400
+    assert "Unsupported file type" in json.loads(response.content)["error"]
+    assert service.predictions == 0
@@ -0,0 +1,78 @@
+import json
+import threading
+
+import pytest
+from rest_framework.test import APIRequestFactory
+
+from cropsight.users import metrics
+from cropsight.users import warmup
+from cropsight.users.api.views import ReadinessApiView
+
+# Warm-up predictions take the request path, which closes stale database connections.
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def registry(settings, monkeypatch, fake_registry):
+    settings.PREDICTION_BATCH_MAX_SIZE = 8
+    settings.PREDICTION_WARMUP_ITERATIONS = 2
+    fake_registry.add("potato")
+    fake_registry.add("wheat")
+    fake_registry.add("rice", FileNotFoundError("rice.pth"))
+    monkeypatch.setattr(warmup, "_ready", threading.Event())
+    monkeypatch.setattr(warmup, "_started", threading.Event())
+    monkeypatch.setattr(warmup, "_warmed", [])
+    monkeypatch.setattr(metrics, "_metrics", metrics.StageMetrics())
+    return fake_registry
+
+
+def readiness():
+    response = ReadinessApiView.as_view()(APIRequestFactory().get("/api/users/health/ready/"))
+    return response.status_code, json.loads(response.content)["data"]
+
+
+def test_warm_up_runs_served_batch_sizes_and_marks_ready(registry):
+    assert not warmup.get_readiness().ready
+    warmup.warm_up_models()
+    readiness_data = warmup.get_readiness()
+    assert readiness_data.ready
+    assert readiness_data.warmed_models == ["potato", "wheat"]
+    assert registry.services["potato"].predictions == 2  # noqa: PLR2004
+    assert registry.services["potato"].forward_batch_sizes == [8, 8]
+    assert not metrics._metrics.snapshot()  # noqa: SLF001
+
+
+def test_crop_failing_to_warm_up_is_skipped(registry):
+    def predict(image_file):
+        raise RuntimeError("database is down")
+
+    registry.services["wheat"].predict = predict
+    warmup.warm_up_models()
+    assert warmup.get_readiness().ready
+    assert warmup.get_readiness().warmed_models == ["potato"]
+
+
+def test_readiness_is_unavailable_until_warm(registry, settings):
+    settings.PREDICTION_WARMUP = True
+    warmup._started.set()  # noqa: SLF001
+    status_code, data = readiness()
+    assert status_code == 503
+    assert not data["ready"]
+
+    warmup.warm_up_models()
+    status_code, data = readiness()
+    assert status_code == 200
+    assert data["warmed_models"] == ["potato", "wheat"]
+
+
+def test_readiness_starts_warm_up_when_no_server_hook_ran(registry, settings):
+    settings.PREDICTION_WARMUP = True
+    readiness()
+    assert warmup._ready.wait(timeout=5)  # noqa: SLF001
+    assert readiness()[0] == 200
+
+
+def test_readiness_is_immediate_with_warm_up_disabled(registry, settings):
+    settings.PREDICTION_WARMUP = False
+    assert readiness()[0] == 200
+    assert registry.services["potato"].predictions == 0
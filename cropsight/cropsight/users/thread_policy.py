@@ -0,0 +1,66 @@
+import logging
+import os
+
+import torch
+from django.conf import settings
+
+from .dtos.response.response_dataclass import ThreadConfigData
+
+logger = logging.getLogger(__name__)
+
+# Worker count the policy was last applied with in this process, None until applied.
+_applied_workers = None
+
+
+def available_cores():
+    """Return the CPU cores this process may run on, honouring affinity masks and cpusets."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def threads_per_worker(workers, cores=None):
+    """Split the available cores evenly across worker processes, giving each at least one thread."""
+    cores = cores or available_cores()
+    return max(1, cores // max(1, workers))
+
+
+def apply_thread_policy(workers, request_threads=1):
+    """Size torch's thread pools for one of ``workers`` processes sharing this machine.
+
+    Call once per worker process, after it is forked and before it runs inference.
+    ``request_threads`` is the number of threads serving requests in each process. With
+    batching on, their forward passes all run on the batcher's thread; with it off
+    (PREDICTION_BATCH_MAX_SIZE of 1) they run side by side and split the worker's cores.
+    TORCH_NUM_THREADS overrides the even split of cores.
+    """
+    global _applied_workers
+    concurrent_forwards = 1 if settings.PREDICTION_BATCH_MAX_SIZE > 1 else max(1, request_threads)
+    num_threads = settings.TORCH_NUM_THREADS or threads_per_worker(workers * concurrent_forwards)
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(settings.TORCH_NUM_INTEROP_THREADS)
+    except RuntimeError:
+        # The inter-op pool can only be sized before its first use in the process.
+        logger.warning("torch inter-op threads already initialised, keeping %d", torch.get_num_interop_threads())
+    _applied_workers = workers
+    logger.info(
+        "Worker %d of %d uses %d intra-op and %d inter-op torch threads",
+        os.getpid(), workers, torch.get_num_threads(), torch.get_num_interop_threads(),
+    )
+
+
+def get_thread_config():
+    """Report the effective torch thread configuration of the current process."""
+    return ThreadConfigData(
+        pid=os.getpid(),
+        cores=available_cores(),
+        workers=_applied_workers,
+        policy_applied=_applied_workers is not None,
+        num_threads=torch.get_num_threads(),
+        num_interop_threads=torch.get_num_interop_threads(),
+        configured_num_threads=settings.TORCH_NUM_THREADS or None,
+        configured_num_interop_threads=settings.TORCH_NUM_INTEROP_THREADS,
+        omp_num_threads=os.environ.get("OMP_NUM_THREADS"),
+        mkl_num_threads=os.environ.get("MKL_NUM_THREADS"),
+    )
@@ -0,0 +1,169 @@
+import io
+import struct
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+
+from .exceptions import ImageUploadError
+
+# Leading bytes identifying each accepted upload type.
+IMAGE_SIGNATURES = {
+    "JPEG": (b"\xff\xd8\xff",),
+    "PNG": (b"\x89PNG\r\n\x1a\n",),
+}
+ZIP_SIGNATURE = b"PK\x03\x04"
+SIGNATURE_BYTES = 12
+# JPEG dimensions follow the EXIF block, which phones keep under 64 KB; give up reading
+# the header well past that.
+MAX_HEADER_BYTES = 256 * 1024
+# A WebP's dimensions are in the header of its first chunk, within the first 30 bytes.
+WEBP_HEADER_BYTES = 30
+# Room for the multipart boundaries and form fields around the files in a request.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def sniff_image_format(header):
+    """Return the image format named by an upload's magic bytes, or None if it isn't an accepted image."""
+    for image_format, signatures in IMAGE_SIGNATURES.items():
+        if header.startswith(signatures):
+            return image_format
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def webp_dimensions(header):
+    """Return the (width, height) declared by a WebP's first chunk header, or None for anything else.
+
+    PIL only opens a WebP once it holds the whole file, so the lossy (VP8), lossless (VP8L)
+    and extended (VP8X) chunk headers are read here instead.
+    """
+    if len(header) < WEBP_HEADER_BYTES:
+        return None
+    chunk = header[12:16]
+    if chunk == b"VP8 " and header[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and header[20:21] == b"\x2f":
+        (bits,) = struct.unpack("<I", header[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(header[24:27], "little") + 1, int.from_bytes(header[27:30], "little") + 1
+    return None
+
+
+def _header_dimensions(header, image_format):
+    if image_format == "WEBP":
+        dimensions = webp_dimensions(header)
+        if dimensions is None:
+            msg = "not a WebP chunk header"
+            raise SyntaxError(msg)
+        return dimensions
+    # Opening is lazy: only the header is parsed.
+    with Image.open(io.BytesIO(header), formats=[image_format]) as image:
+        return image.size
+
+
+def validate_image_header(header, max_pixels, complete=False):
+    """Check an upload's magic bytes and header dimensions without decoding any pixels.
+
+    Returns the (width, height) once the header is readable, or None when more bytes are
+    needed. Raises ImageUploadError for anything that isn't a JPEG, PNG or WebP within
+    ``max_pixels``. ``complete`` means ``header`` holds the whole file.
+    """
+    if len(header) < SIGNATURE_BYTES and not complete:
+        return None
+    image_format = sniff_image_format(header)
+    if image_format is None:
+        msg = "Unsupported file type, please upload a JPEG, PNG or WebP image"
+        raise ImageUploadError(msg)
+    if image_format == "WEBP" and len(header) < WEBP_HEADER_BYTES and not complete:
+        return None
+    try:
+        width, height = _header_dimensions(header, image_format)
+    except Image.DecompressionBombError:
+        width, height = max_pixels + 1, 1
+    except (OSError, SyntaxError, ValueError, EOFError):
+        if not complete and len(header) < MAX_HEADER_BYTES:
+            return None
+        msg = f"Cannot read the {image_format} image, the file is corrupt or truncated"
+        raise ImageUploadError(msg) from None
+    if width * height > max_pixels:
+        msg = f"Image is too large, at most {max_pixels // 1_000_000} megapixels are supported"
+        raise ImageUploadError(msg)
+    return width, height
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Validate image uploads while they stream in, ahead of the handlers that store them.
+
+    Requests over the byte limit are refused from their Content-Length before the body is
+    read, and each file is rejected as soon as its magic bytes, header dimensions or size
+    rule it out, by raising ImageUploadError. Zip archives are accepted for the
+    ``archive_fields`` form fields.
+    """
+
+    def __init__(self, request=None, max_file_bytes=None, max_pixels=None, max_files=1, archive_fields=()):
+        super().__init__(request)
+        self.max_file_bytes = max_file_bytes or settings.PREDICTION_UPLOAD_MAX_BYTES
+        self.max_pixels = max_pixels or settings.PREDICTION_UPLOAD_MAX_PIXELS
+        self.max_files = max_files
+        self.archive_fields = archive_fields
+
+    @property
+    def max_request_bytes(self):
+        return self.max_file_bytes * self.max_files + MULTIPART_OVERHEAD_BYTES
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > self.max_request_bytes:
+            msg = f"Upload is larger than {self.max_request_bytes // (1024 * 1024)} MB"
+            raise ImageUploadError(msg)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.is_archive = field_name in self.archive_fields
+        self.header = b""
+        self.validated = False
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        # An archive holds up to max_files images, each within max_file_bytes.
+        limit = self.max_file_bytes * self.max_files if self.is_archive else self.max_file_bytes
+        if self.received > limit:
+            msg = f"{self.file_name} is larger than {limit // (1024 * 1024)} MB"
+            raise ImageUploadError(msg)
+        if not self.validated:
+            self.header += raw_data
+            self._validate()
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not self.validated:
+            self._validate(complete=True)
+        # The next handler in the chain builds the uploaded file.
+        return None
+
+    def _validate(self, complete=False):
+        if self.is_archive:
+            if len(self.header) < len(ZIP_SIGNATURE) and not complete:
+                return
+            if not self.header.startswith(ZIP_SIGNATURE):
+                msg = f"{self.file_name} is not a zip archive"
+                raise ImageUploadError(msg)
+        else:
+            try:
+                if validate_image_header(self.header, self.max_pixels, complete=complete) is None:
+                    return
+            except ImageUploadError as e:
+                if self.max_files > 1:
+                    raise ImageUploadError(f"{self.file_name}: {e}") from None
+                raise
+        self.validated = True
+        self.header = b""
+
+
+def add_image_upload_handler(request, **limits):
+    """Put an ImageUploadHandler in front of a request's upload handlers; call before the body is parsed."""
+    request.upload_handlers.insert(0, ImageUploadHandler(request, **limits))
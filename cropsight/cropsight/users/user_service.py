@@ -1,22 +1,43 @@
+import io
 import os
+import zipfile
+from collections import Counter, defaultdict
+from django.core import signing
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 import re
-from typing import Tuple
+import time
+from typing import Iterator, Tuple, Union
 from django.conf import settings
 from requests import Request
-from .dtos.response.response_dataclass import CartItemData, HomeScreenData, ProductDetailResponse, ProductListingResponse, UserProfileData, OTPData, LoginResponseData
+from .dtos.response.response_dataclass import CartItemData, HomeScreenData, BatchPredictionItemData, PlotVerdictData, PredictionExplanationData, PredictionHistoryPageData, PredictionJobData, PredictionResponseData, ProductDetailResponse, SimilarCaseData, ProductListingResponse, UserProfileData, OTPData, LoginResponseData
 from .dtos.request.request_dataclass import UserUpdateData
-from .exceptions import InvalidPhoneNumberError, OTPValidationError, ProductNotFoundError, UserNotFoundError
+from .exceptions import ImageUploadError, InvalidPhoneNumberError, OTPValidationError, PredictionNotFoundError, ProductNotFoundError, UnsupportedCropError, UserNotFoundError
 import random
-from .models import Cart, CartItem, Products, User, UserProfile
+from .models import Cart, CartItem, CropPrediction, Products, User, UserProfile
 from datetime import datetime
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from .exceptions import EmailAlreadyExistsError, InvalidDateFormatError
 from rest_framework.authtoken.models import Token
-from .prediction_service import PredictionService
+from celery.result import AsyncResult
+from .combined_prediction import COMBINED_MODEL, predict_any_crop
+from .explanations import explain_prediction
+from .image_store import stage_job_image, store_prediction_image
+from .metrics import observe_stage
+from .model_registry import get_model_registry
+from .prediction_cache import PredictionResultCache, predict_with_cache
+from .prediction_history import get_prediction_history
+from .prediction_log import record_prediction
+from .prediction_service import CONFIDENCE_THRESHOLD
+from .similar_cases import find_similar_cases
+from .tasks import predict_disease_task
+from .upload_handlers import validate_image_header
 from django.conf import settings
 
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+PREDICTION_JOB_SALT = 'cropsight.users.prediction-job'
+
 class UserService:
     @staticmethod
     def validate_phone_number(phone_number: str) -> bool:
@@ -129,22 +150,199 @@ class UserService:
             raise UserNotFoundError("User not found")
 
 
-    def predict_disease(self, request: Request, plant: str):
+    def predict_disease(self, request: Request, plant: str) -> Tuple[PredictionResponseData, bool]:
+        """Predict the disease in the uploaded image, returning the result and whether it came from the cache."""
+        start = time.perf_counter()
+        # Parsing the upload reads the request body; hashing then reads the stored file.
         image = request.FILES.get('image')
         if not image:
             raise ValueError("Image not found")
-        if plant.lower() == 'potato':
-            model_path = os.path.join(settings.BASE_DIR, "Potato_cnn_model_state_dict.pth")
-            service = PredictionService(model_path=model_path, class_names=['Early_Blight', 'Healthy', 'Late_Blight'])
-        elif plant.lower() == 'wheat':
-            model_path = os.path.join(settings.BASE_DIR, "Wheat_cnn_model_state_dict.pth")
-            service = PredictionService(model_path=model_path, class_names=['Brown_Rust', 'Healthy', 'Yellow_Rust'])
-        elif plant.lower() == 'cotton':
-            model_path = os.path.join(settings.BASE_DIR, "Cotton_cnn_model_state_dict.pth")
-            service = PredictionService(model_path=model_path, class_names=['bacterial_blight', 'curl_virus', 'fussarium_wilt', 'healthy'])
-        result = service.predict(image)
-        return result
-    
+        image_digest = PredictionResultCache.image_digest(image)
+        upload_read = time.perf_counter() - start
+        start = time.perf_counter()
+        if plant.lower() == COMBINED_MODEL:
+            result, cache_hit = predict_any_crop(image, image_digest)
+        else:
+            service = get_model_registry().get(plant.lower())
+            result, cache_hit = predict_with_cache(service, image, image_digest=image_digest)
+        record_prediction(
+            user=self._prediction_user(request),
+            image_sha256=image_digest,
+            predicted_crop=result.crop or plant.lower(),
+            disease_class=result.disease_class,
+            confidence=result.confidence,
+            model_version=result.model_version or '',
+            latency_ms=(time.perf_counter() - start) * 1000,
+        )
+        observe_stage('upload_read', upload_read, plant.lower(), result.model_version)
+        store_prediction_image(image_digest, image)
+        return result, cache_hit
+
+    @staticmethod
+    def _prediction_user(request):
+        user = getattr(request, 'user', None)
+        return user if user is not None and user.is_authenticated else None
+
+    def predict_batch(self, request: Request, plant: str) -> Iterator[Union[BatchPredictionItemData, PlotVerdictData]]:
+        """Validate a multi-image upload and return a generator of per-image results ending with the plot verdict."""
+        if plant.lower() == COMBINED_MODEL:
+            # Combined predictions identify the crop first, one image at a time; a plot is of one crop.
+            raise UnsupportedCropError(f"Batch prediction needs the crop, not '{COMBINED_MODEL}'")
+        images = self._get_batch_images(request)
+        service = get_model_registry().get(plant.lower())
+        return self._stream_batch_predictions(service, images, plant.lower(), self._prediction_user(request))
+
+    def _get_batch_images(self, request: Request):
+        images = [(image.name, image) for image in request.FILES.getlist('images')]
+        archive = request.FILES.get('archive')
+        if archive:
+            images.extend(self._read_zip_images(archive))
+        if not images:
+            raise ValueError("Images not found")
+        if len(images) > settings.PREDICTION_BATCH_UPLOAD_MAX_IMAGES:
+            raise ValueError(f"At most {settings.PREDICTION_BATCH_UPLOAD_MAX_IMAGES} images can be uploaded at once")
+        return images
+
+    def _read_zip_images(self, archive):
+        try:
+            zip_file = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile:
+            raise ValueError("Archive is not a valid zip file")
+        images = []
+        with zip_file:
+            entries = [
+                info for info in zip_file.infolist()
+                if not info.is_dir() and os.path.splitext(info.filename)[1].lower() in IMAGE_EXTENSIONS
+            ]
+            if len(entries) > settings.PREDICTION_BATCH_UPLOAD_MAX_IMAGES:
+                raise ValueError(f"At most {settings.PREDICTION_BATCH_UPLOAD_MAX_IMAGES} images can be uploaded at once")
+            # Reads stop at the declared sizes, so checking them first bounds what is decompressed.
+            for info in entries:
+                if info.file_size > settings.PREDICTION_UPLOAD_MAX_BYTES:
+                    raise ValueError(f"{info.filename} is larger than {settings.PREDICTION_UPLOAD_MAX_BYTES} bytes")
+            if sum(info.file_size for info in entries) > settings.PREDICTION_BATCH_UPLOAD_MAX_BYTES:
+                raise ValueError(f"The archive's images are larger than {settings.PREDICTION_BATCH_UPLOAD_MAX_BYTES} bytes in total")
+            for info in entries:
+                data = zip_file.read(info)
+                try:
+                    validate_image_header(data, settings.PREDICTION_UPLOAD_MAX_PIXELS, complete=True)
+                except ImageUploadError as e:
+                    raise ValueError(f"{info.filename}: {e}")
+                images.append((info.filename, io.BytesIO(data)))
+        return images
+
+    def _stream_batch_predictions(self, service, images, crop, user=None):
+        names = [name for name, _ in images]
+        class_counts = Counter()
+        confidences = defaultdict(list)
+        predictions = service.predict_batch(
+            [image for _, image in images],
+            batch_size=max(settings.PREDICTION_BATCH_MAX_SIZE, 1),
+            decode_workers=settings.PREDICTION_DECODE_WORKERS,
+        )
+        for index, predicted_class, confidence, error in predictions:
+            if error is None and confidence < CONFIDENCE_THRESHOLD:
+                predicted_class, confidence, error = None, None, "Cannot classify, please upload a clear image"
+            if error is None:
+                class_counts[predicted_class] += 1
+                confidences[predicted_class].append(confidence)
+                if settings.PREDICTION_LOG_ENABLED:
+                    self._record_batch_prediction(service, images[index][1], crop, predicted_class, confidence, user)
+            yield BatchPredictionItemData(index=index, name=names[index], disease_class=predicted_class, confidence=confidence, error=error)
+
+        verdict = None
+        if class_counts:
+            # The most frequent class wins; on a tie a disease outranks healthy.
+            verdict_class = max(class_counts, key=lambda name: (class_counts[name], not name.lower().endswith('healthy')))
+            verdict = service.build_response(verdict_class, sum(confidences[verdict_class]) / len(confidences[verdict_class]))
+        yield PlotVerdictData(
+            total_images=len(images),
+            classified_images=sum(class_counts.values()),
+            class_counts=dict(class_counts),
+            verdict=verdict,
+        )
+
+    @staticmethod
+    def _record_batch_prediction(service, image, crop, predicted_class, confidence, user):
+        class_crop, _, disease_class = predicted_class.rpartition('/')
+        image_digest = PredictionResultCache.image_digest(image)
+        record_prediction(
+            user=user,
+            image_sha256=image_digest,
+            predicted_crop=class_crop or crop,
+            disease_class=disease_class,
+            confidence=confidence,
+            model_version=service.model_version,
+        )
+        store_prediction_image(image_digest, image)
+
+    def enqueue_prediction(self, request: Request, plant: str) -> PredictionJobData:
+        """Stage the uploaded image for the inference workers and return the queued job.
+
+        The job id is signed with the submitter's user id, so only that user can poll an
+        authenticated submission; an anonymous submission is readable by whoever holds its id.
+        """
+        image = request.FILES.get('image')
+        if not image:
+            raise ValueError("Image not found")
+        crop = plant.lower()
+        if crop not in get_model_registry().crops():
+            raise UnsupportedCropError(f"Prediction is not supported for '{crop}'")
+        user = self._prediction_user(request)
+        user_id = user.pk if user else None
+        image_name = stage_job_image(image)
+        try:
+            job = predict_disease_task.delay(crop, image_name, user_id)
+        except Exception:
+            default_storage.delete(image_name)
+            raise
+        job_id = signing.dumps({'task': job.id, 'user': user_id}, salt=PREDICTION_JOB_SALT)
+        return PredictionJobData(job_id=job_id, status=job.status)
+
+    def get_prediction_job(self, request: Request, job_id: str) -> PredictionJobData:
+        """Return a queued prediction's state, as if it did not exist to anyone but its submitter."""
+        try:
+            signed = signing.loads(job_id, salt=PREDICTION_JOB_SALT)
+        except signing.BadSignature:
+            raise PredictionNotFoundError("Prediction job not found")
+        user = self._prediction_user(request)
+        if signed['user'] is not None and (user is None or user.pk != signed['user']):
+            raise PredictionNotFoundError("Prediction job not found")
+        job = AsyncResult(signed['task'])
+        if job.successful():
+            return PredictionJobData(job_id=job_id, status=job.status, result=job.result)
+        if job.failed():
+            return PredictionJobData(job_id=job_id, status=job.status, error=str(job.result))
+        return PredictionJobData(job_id=job_id, status=job.status)
+
+    def get_prediction_history(self, request: Request) -> PredictionHistoryPageData:
+        """Return a page of the signed-in user's predictions, starting after the ``cursor`` query parameter."""
+        try:
+            limit = int(request.GET.get('limit', settings.PREDICTION_HISTORY_PAGE_SIZE))
+        except ValueError:
+            raise ValueError("limit must be a number")
+        limit = min(max(limit, 1), settings.PREDICTION_HISTORY_MAX_PAGE_SIZE)
+        return get_prediction_history(request.user, cursor=request.GET.get('cursor'), limit=limit)
+
+    def get_similar_cases(self, request: Request, prediction_id: int) -> list[SimilarCaseData]:
+        """Return past predictions of the same crop that look like one of the signed-in user's predictions."""
+        try:
+            limit = int(request.GET.get('limit', settings.PREDICTION_SIMILAR_CASES_LIMIT))
+        except ValueError:
+            raise ValueError("limit must be a number")
+        limit = min(max(limit, 1), settings.PREDICTION_SIMILAR_CASES_MAX_LIMIT)
+        prediction = CropPrediction.objects.filter(id=prediction_id, user=request.user).first()
+        if prediction is None:
+            raise PredictionNotFoundError("Prediction not found")
+        return find_similar_cases(prediction, limit=limit)
+
+    def get_prediction_explanation(self, request: Request, prediction_id: int) -> PredictionExplanationData:
+        """Return the Grad-CAM overlay of one of the signed-in user's predictions, computing it on first request."""
+        prediction = CropPrediction.objects.filter(id=prediction_id, user=request.user).first()
+        if prediction is None:
+            raise PredictionNotFoundError("Prediction not found")
+        name = explain_prediction(prediction)
+        return PredictionExplanationData.generate_response(prediction, default_storage.url(name))
 
     def get_home_data(self, request: Request):
         user_profile, _ = UserProfile.objects.get_or_create(user=request.user)
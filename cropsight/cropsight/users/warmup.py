@@ -0,0 +1,97 @@
+import io
+import logging
+import threading
+import time
+
+import torch
+from django.conf import settings
+from django.db import close_old_connections
+
+from .benchmark import synthetic_images
+from .dtos.response.response_dataclass import ReadinessData
+from .exceptions import UndefinedDiseaseError
+from .metrics import metrics_paused
+from .model_registry import get_model_registry
+from .prediction_service import INPUT_SIZE
+
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+_started = threading.Event()
+_lock = threading.Lock()
+_warmed = []
+_duration = None
+
+
+def warm_up_service(service):
+    """Run PREDICTION_WARMUP_ITERATIONS predictions of a synthetic image, then as many full-size batched passes.
+
+    Predictions take the path a request takes (batcher thread, embedding forward, product
+    lookup), so the first real request finds all of it started. Their timings are left out
+    of the stage metrics.
+    """
+    (sample,) = synthetic_images(1, size=(640, 480))
+    close_old_connections()
+    try:
+        with metrics_paused():
+            for _ in range(settings.PREDICTION_WARMUP_ITERATIONS):
+                try:
+                    service.predict(io.BytesIO(sample))
+                except UndefinedDiseaseError:
+                    # Noise is rarely classified confidently; the forward pass ran all the same.
+                    pass
+    finally:
+        # Warm-up may run on the manifest watcher thread, which would otherwise hold its connection.
+        close_old_connections()
+    if settings.PREDICTION_BATCH_MAX_SIZE > 1:
+        batch = torch.zeros(settings.PREDICTION_BATCH_MAX_SIZE, 3, *INPUT_SIZE)
+        for _ in range(settings.PREDICTION_WARMUP_ITERATIONS):
+            service._request_forward(batch)  # noqa: SLF001
+
+
+def warm_up_models(crops=None):
+    """Load every configured crop model and run dummy predictions at the batch sizes we serve.
+
+    This pays model loading, allocator growth and first-call kernel selection before the
+    process takes traffic, then marks it ready. A crop that fails to load or to warm up is
+    logged and left to load on first use; the process is marked ready regardless, so one bad
+    model can't keep a worker from serving the others.
+    """
+    global _duration
+    _started.set()
+    start = time.perf_counter()
+    try:
+        registry = get_model_registry()
+        crops = registry.crops() if crops is None else list(crops)
+        for crop in crops:
+            try:
+                service = registry.get(crop)
+            except Exception:
+                logger.exception("Could not load the %s model for warm-up", crop)
+                continue
+            try:
+                warm_up_service(service)
+            except Exception:
+                logger.exception("Could not warm up the %s model", crop)
+                continue
+            _warmed.append(crop)
+    finally:
+        _duration = time.perf_counter() - start
+        _ready.set()
+    logger.info("Warmed up %s in %.1f s", ", ".join(_warmed) or "no models", _duration)
+
+
+def ensure_warmup_started():
+    """Start warm-up in a background thread unless it already ran, e.g. when not served by gunicorn."""
+    with _lock:
+        if _started.is_set():
+            return
+        _started.set()
+    if settings.PREDICTION_WARMUP:
+        threading.Thread(target=warm_up_models, name="model-warmup", daemon=True).start()
+    else:
+        _ready.set()
+
+
+def get_readiness():
+    return ReadinessData(ready=_ready.is_set(), warmed_models=list(_warmed), warmup_seconds=_duration)